@@ -12,12 +12,13 @@ from telegram.ext import (
     filters, CallbackQueryHandler
 )
 
-from handlers.audit import start_audit, handle_response, button_click
+from handlers.audit import start_audit, handle_response, button_click, evict_expired_sessions
 from handlers.admin import (
     upload_audit, handle_document, handle_template_name,
-    list_templates, select_template, current_template
+    list_templates, select_template, current_template, worker_stats
 )
 from utils.utils import my_id
+from utils.workers import io_pool, shutdown_workers
 
 # Configure logging
 logging.basicConfig(
@@ -25,8 +26,38 @@ logging.basicConfig(
     level=logging.INFO
 )
 
+# Import the upload and report dependencies in the background once polling has started
+# (set to 0 to load them only when first used)
+WARM_UP_IMPORTS = os.getenv("WARM_UP_IMPORTS", "1") == "1"
+
+def warm_up_heavy_imports():
+    from utils.audit_parser import warm_up
+    from utils.pdf_generator import register_fonts
+    try:
+        register_fonts()
+        warm_up()
+    except Exception as e:
+        # A missing optional dependency surfaces again when the feature is used
+        logging.getLogger(__name__).warning(f"Background warm-up failed: {e}")
+
+async def start_background_tasks(application):
+    application.create_task(evict_expired_sessions())
+    if WARM_UP_IMPORTS:
+        application.create_task(io_pool.run(warm_up_heavy_imports))
+
 def main():
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    # Creates missing tables and indexes on existing databases
+    init_db()
+
+    # Updates are handled concurrently so one user's pending job does not hold up the others
+    app = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(True)
+        .post_init(start_background_tasks)
+        .post_shutdown(shutdown_workers)
+        .build()
+    )
 
     # Commands
     app.add_handler(CommandHandler("start", start_audit))
@@ -37,6 +68,7 @@ def main():
     app.add_handler(CommandHandler("list_templates", list_templates))
     app.add_handler(CommandHandler("select_template", select_template))
     app.add_handler(CommandHandler("current_template", current_template))
+    app.add_handler(CommandHandler("worker_stats", worker_stats))
 
     # Callbacks
     app.add_handler(CallbackQueryHandler(button_click))
@@ -0,0 +1,108 @@
+# database/ai_context.py
+# Bounded data context and chat history for the dashboard's AI assistant.
+# The context summarises the filtered data with a fixed number of sites and
+# engineers, so the prompt stays the same size however large the fleet grows.
+import json
+import os
+
+# Chat completion settings of the assistant; all of them are part of the answer cache key
+AI_MODEL = "gpt-4o-mini"
+AI_TEMPERATURE = 0.5
+AI_MAX_TOKENS = 800
+
+# Sites and engineers listed with the most non-compliant answers, and with the best compliance
+AI_CONTEXT_TOP_N = int(os.getenv("AI_CONTEXT_TOP_N", "10"))
+AI_CONTEXT_BEST_N = int(os.getenv("AI_CONTEXT_BEST_N", "3"))
+
+# Tokens sent per question: system prompt plus as much recent chat history as fits
+AI_PROMPT_TOKEN_BUDGET = int(os.getenv("AI_PROMPT_TOKEN_BUDGET", "6000"))
+
+# Rough characters per token, used when tiktoken is not installed
+CHARS_PER_TOKEN = 4
+
+# Tokens added per chat message for the role and separators
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoding = []
+
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken when installed, otherwise a character-based estimate."""
+    if not _encoding:
+        try:
+            import tiktoken
+            _encoding.append(tiktoken.get_encoding("o200k_base"))
+        except Exception:
+            _encoding.append(None)
+    if _encoding[0] is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(_encoding[0].encode(text))
+
+
+def rank_compliance(table, top_n: int = AI_CONTEXT_TOP_N, best_n: int = AI_CONTEXT_BEST_N) -> dict:
+    """Summary of a compliance_table: the entries with the most non-compliant answers, the best ones and the rest as counts.
+
+    Ranking by non-compliant answers rather than by rate keeps a single bad
+    audit from outranking a site that fails the same checks every week.
+    """
+    def describe(rows):
+        return {
+            str(name): {"compliance": f"{row.compliance_rate:.1f}%", "audits": int(row.audits)}
+            for name, row in rows.iterrows()
+        }
+
+    issues = table["responses"] - table["yes"]
+    worst = table.loc[issues.nlargest(top_n).index]
+    rest = table.drop(worst.index)
+    best = rest.sort_values(["compliance_rate", "audits"], ascending=False).head(best_n)
+    return {
+        "count": len(table),
+        "median_compliance": f"{table['compliance_rate'].median():.1f}%" if len(table) else None,
+        "most_issues": describe(worst),
+        "best": describe(best),
+        "not_listed": len(table) - len(worst) - len(best),
+    }
+
+
+def build_data_context(template, start_date, end_date, total_audits, global_counts, global_percent,
+                       site_compliance, engineer_compliance, top_n: int = AI_CONTEXT_TOP_N) -> dict:
+    """Data context for the assistant's system prompt from the dashboard's aggregates."""
+    responses = int(global_counts.to_numpy().sum())
+    return {
+        "template_name": template,
+        "date_range": f"{start_date} to {end_date}",
+        "total_audits": int(total_audits),
+        "total_engineers": len(engineer_compliance),
+        "total_sites": len(site_compliance),
+        "overall_compliance": f"{global_counts['Yes'].sum() / responses * 100:.1f}%" if responses else None,
+        "top_issues": {k: int(v) for k, v in global_counts["No"].nlargest(5).items() if v > 0},
+        "best_performing_keywords": global_percent["Yes"].nlargest(5).round(1).to_dict(),
+        "worst_performing_keywords": global_percent["Yes"].nsmallest(5).round(1).to_dict(),
+        "site_performance": rank_compliance(site_compliance, top_n),
+        "engineer_performance": rank_compliance(engineer_compliance, top_n),
+    }
+
+
+def system_prompt(context: dict) -> str:
+    return f"""You are SafetyBot, a professional safety audit analyst. Use the data context below:
+
+{json.dumps(context, indent=2, ensure_ascii=False, default=str)}
+
+Sites and engineers not listed individually are only included in the totals and medians.
+Answer concisely, cite metrics, prioritize critical issues, and provide actionable recommendations."""
+
+
+def build_messages(system: str, history: list, budget: int = AI_PROMPT_TOKEN_BUDGET):
+    """(messages, prompt tokens) with the oldest history dropped until the prompt fits the budget.
+
+    The latest message is always kept, even if it alone exceeds the budget.
+    """
+    used = count_tokens(system) + MESSAGE_OVERHEAD_TOKENS
+    kept = []
+    for message in reversed(history):
+        tokens = count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+        if kept and used + tokens > budget:
+            break
+        kept.append({"role": message["role"], "content": message["content"]})
+        used += tokens
+    return [{"role": "system", "content": system}] + kept[::-1], used
@@ -0,0 +1,221 @@
+# database/analytics.py
+# Optional DuckDB backend for the dashboard aggregates (ANALYTICS_BACKEND=duckdb).
+# Reads safetyhub.db through DuckDB's sqlite extension, or a Parquet snapshot
+# written by write_snapshot(), and returns the same frames as the pandas path.
+# A snapshot is static: audits saved after it was written are missing from its
+# aggregates while the rest of the dashboard reads the live database.
+import glob
+import os
+from datetime import datetime
+import pandas as pd
+from sqlalchemy import text
+from queries import RESPONSES_QUERY, ROLLUP_RESPONSES, CHUNK_SIZE
+
+# "pandas" (default) or "duckdb"
+ANALYTICS_BACKEND = os.getenv("ANALYTICS_BACKEND", "pandas")
+
+# safetyhub.db path or Parquet snapshot (file or glob); defaults to the dashboard's database
+ANALYTICS_SOURCE = os.getenv("ANALYTICS_SOURCE")
+
+# DuckDB worker threads; 0 lets DuckDB use every core
+ANALYTICS_THREADS = int(os.getenv("ANALYTICS_THREADS", "0"))
+
+# One row per response with the columns the aggregates filter and group on
+SQLITE_RESPONSES_VIEW = """
+CREATE OR REPLACE VIEW responses_flat AS
+SELECT a.id                    AS audit_id,
+       CAST(a.timestamp AS TIMESTAMP) AS timestamp,
+       a.title                 AS title,
+       a.site_id               AS site_id,
+       u.full_name             AS full_name,
+       q.keyword               AS keyword,
+       ao.label                AS response
+FROM safetyhub.audits a
+JOIN safetyhub.users u ON u.telegram_id = a.user_id
+JOIN safetyhub.responses r ON r.audit_id = a.id
+JOIN safetyhub.questions q ON q.id = r.question_id
+JOIN safetyhub.answer_options ao ON ao.code = r.answer
+"""
+
+PARQUET_RESPONSES_VIEW = """
+CREATE OR REPLACE VIEW responses_flat AS
+SELECT * FROM read_parquet({source})
+"""
+
+# Dashboard column name -> responses_flat column
+GROUP_COLUMNS = {"Keyword": "keyword", "site_id": "site_id", "full_name": "full_name"}
+
+# Same bucketing as the compliance rollups: anything but Yes/No counts as N/A
+COUNT_COLUMNS = """
+SUM(CASE WHEN response = 'Yes' THEN 1 ELSE 0 END) AS "Yes",
+SUM(CASE WHEN response = 'No' THEN 1 ELSE 0 END) AS "No",
+SUM(CASE WHEN response IS NULL OR response NOT IN ('Yes', 'No') THEN 1 ELSE 0 END) AS "N/A"
+"""
+
+
+def write_snapshot(engine, path, chunk_size=CHUNK_SIZE):
+    """Write the responses_flat columns of every response to a Parquet file for the DuckDB backend."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    columns = {
+        "Audit ID": "audit_id", "Timestamp": "timestamp", "title": "title", "site_id": "site_id",
+        "full_name": "full_name", "Keyword": "keyword", "Response": "response",
+    }
+    # Explicit, so a chunk whose title or site_id is all NULL keeps the file's column types
+    schema = pa.schema([
+        ("audit_id", pa.int64()),
+        ("timestamp", pa.timestamp("us")),
+        ("title", pa.string()),
+        ("site_id", pa.string()),
+        ("full_name", pa.string()),
+        ("keyword", pa.string()),
+        ("response", pa.string()),
+    ])
+    writer = None
+    rows = 0
+    with engine.connect() as conn:
+        conn = conn.execution_options(stream_results=True)
+        for chunk in pd.read_sql_query(text(RESPONSES_QUERY), conn, params={"since_audit_id": 0}, chunksize=chunk_size):
+            chunk = chunk[list(columns)].rename(columns=columns)
+            chunk["timestamp"] = pd.to_datetime(chunk["timestamp"])
+            table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, schema, compression="zstd")
+            writer.write_table(table)
+            rows += len(chunk)
+    if writer is not None:
+        writer.close()
+    return rows
+
+
+class DuckDBAnalytics:
+    """Dashboard aggregates computed by DuckDB over safetyhub.db or a Parquet snapshot.
+
+    Filters are the ResponseStore.select() arguments: title, site_id,
+    full_name, start_date and end_date (None = no filter; dates inclusive).
+    """
+
+    def __init__(self, source, threads=ANALYTICS_THREADS):
+        try:
+            import duckdb
+        except ImportError:
+            raise RuntimeError("ANALYTICS_BACKEND=duckdb requires the duckdb package: pip install duckdb")
+
+        self.source = source
+        self.is_snapshot = not source.endswith(".db")
+        self.conn = duckdb.connect()
+        if threads:
+            self.conn.execute(f"SET threads = {int(threads)}")
+        # Views cannot take parameters, so the path is inlined as a quoted literal
+        quoted_source = "'" + source.replace("'", "''") + "'"
+        if source.endswith(".db"):
+            self.conn.execute("INSTALL sqlite")
+            self.conn.execute("LOAD sqlite")
+            self.conn.execute(f"ATTACH {quoted_source} AS safetyhub (TYPE sqlite, READ_ONLY)")
+            self.conn.execute(SQLITE_RESPONSES_VIEW)
+        else:
+            self.conn.execute(PARQUET_RESPONSES_VIEW.format(source=quoted_source))
+
+    def snapshot_written_at(self):
+        """Modification time of the newest Parquet file of a snapshot source, or None for the live database."""
+        if not self.is_snapshot:
+            return None
+        files = glob.glob(self.source)
+        return datetime.fromtimestamp(max(os.path.getmtime(f) for f in files)) if files else None
+
+    def _query(self, sql, params) -> pd.DataFrame:
+        # The connection is not thread-safe; each Streamlit session gets its own cursor
+        return self.conn.cursor().execute(sql, params).df()
+
+    @staticmethod
+    def _where(title=None, site_id=None, full_name=None, start_date=None, end_date=None):
+        clauses = []
+        params = {}
+        if title is not None:
+            clauses.append("title = $title")
+            params["title"] = title
+        if site_id is not None:
+            clauses.append("site_id = $site_id")
+            params["site_id"] = site_id
+        if full_name is not None:
+            clauses.append("full_name = $full_name")
+            params["full_name"] = full_name
+        if start_date is not None:
+            clauses.append("timestamp >= $start")
+            params["start"] = pd.Timestamp(start_date).to_pydatetime()
+        if end_date is not None:
+            # Inclusive end date
+            clauses.append("timestamp < $end")
+            params["end"] = (pd.Timestamp(end_date) + pd.Timedelta(days=1)).to_pydatetime()
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def response_counts(self, keys, **filters) -> pd.DataFrame:
+        """Yes/No/N/A counts grouped by keys, shaped like queries.sum_rollups."""
+        where, params = self._where(**filters)
+        group = ", ".join(f'{GROUP_COLUMNS[key]} AS "{key}"' for key in keys)
+        counts = self._query(
+            f"SELECT {group}, {COUNT_COLUMNS} FROM responses_flat{where} "
+            f"GROUP BY ALL ORDER BY {', '.join(str(i + 1) for i in range(len(keys)))}",
+            params
+        ).set_index(keys)
+        counts = counts[ROLLUP_RESPONSES].astype("int64")
+        counts.columns.name = "Response"
+        return counts
+
+    def filtered_stats(self, **filters):
+        global_counts = self.response_counts(["Keyword"], **filters)
+        global_percent = global_counts.div(global_counts.sum(axis=1), axis=0) * 100
+        return global_counts, global_percent
+
+    def site_stats(self, **filters):
+        site_counts = self.response_counts(["site_id", "Keyword"], **filters)
+        site_percent = site_counts.div(site_counts.sum(axis=1), axis=0) * 100
+        return site_counts, site_percent
+
+    def engineer_stats(self, **filters):
+        where, params = self._where(**filters)
+        engineer_metrics = self._query(f"""
+            SELECT full_name,
+                   COUNT(DISTINCT audit_id) AS total_audits,
+                   COUNT(DISTINCT site_id) AS sites_visited,
+                   LIST(DISTINCT site_id) AS unique_sites
+            FROM responses_flat{where}
+            GROUP BY full_name
+            ORDER BY full_name
+        """, params)
+        engineer_metrics["unique_sites"] = engineer_metrics["unique_sites"].map(list)
+
+        engineer_site_visits = self._query(f"""
+            SELECT full_name, site_id, COUNT(*) AS visits
+            FROM responses_flat{where}
+            GROUP BY full_name, site_id
+            ORDER BY full_name, site_id
+        """, params)
+
+        engineer_kw = self.response_counts(["full_name", "Keyword"], **filters)
+        engineer_kw_percent = engineer_kw.div(engineer_kw.sum(axis=1), axis=0) * 100
+        return engineer_metrics, engineer_site_visits, engineer_kw, engineer_kw_percent
+
+    def monthly(self, full_names=None, **filters) -> pd.DataFrame:
+        """Yes/No/N/A per month, like the dashboard's monthly_rollups; full_names narrows to several engineers."""
+        where, params = self._where(**filters)
+        if full_names is not None:
+            where += (" AND " if where else " WHERE ") + "list_contains($full_names, full_name)"
+            params["full_names"] = list(full_names)
+        monthly = self._query(
+            f"SELECT date_trunc('month', timestamp) AS day, {COUNT_COLUMNS} "
+            f"FROM responses_flat{where} GROUP BY 1 ORDER BY 1",
+            params
+        )
+        monthly["day"] = pd.to_datetime(monthly["day"]).dt.to_period("M")
+        return monthly.set_index("day")[ROLLUP_RESPONSES].astype("int64")
+
+
+if __name__ == "__main__":
+    # Run from database/: python analytics.py [output.parquet]
+    import sys
+    from models import engine
+
+    output = sys.argv[1] if len(sys.argv) > 1 else "analytics_snapshot.parquet"
+    print("Wrote", write_snapshot(engine, output), "responses to", output)
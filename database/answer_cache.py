@@ -0,0 +1,130 @@
+# database/answer_cache.py
+# Persistent cache of AI assistant answers, so repeated questions against the
+# same data context (the quick-action buttons) are not sent to the API again.
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Cached answers expire after this many seconds; 0 disables the cache
+AI_CACHE_TTL = int(os.getenv("AI_CACHE_TTL", str(24 * 3600)))
+
+# Least recently used answers beyond this count are evicted
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "500"))
+
+AI_CACHE_PATH = os.getenv("AI_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ai_answers.db"))
+
+# Characters per chunk when a cached answer is replayed through the chat placeholder
+REPLAY_CHUNK_CHARS = 40
+
+
+def answer_key(model: str, messages: list, **params) -> str:
+    """SHA-256 of the model, request parameters and every message, system context included."""
+    payload = json.dumps({"model": model, "messages": messages, "params": params},
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def replay(answer: str, chunk_chars: int = REPLAY_CHUNK_CHARS):
+    """Yield a cached answer in chunks, like the deltas of a streamed completion."""
+    for start in range(0, len(answer), chunk_chars):
+        yield answer[start:start + chunk_chars]
+
+
+def stream_answer(client, cache, model: str, messages: list, **params):
+    """Yield the answer's text chunks: replayed from the cache, or streamed from the API and stored once complete.
+
+    client is anything with the OpenAI chat.completions.create() interface;
+    params (temperature, max_tokens, ...) are sent with the request and are part of the key.
+    """
+    key = answer_key(model, messages, **params)
+    cached = cache.get(key)
+    if cached is not None:
+        # Same model, data context and conversation: replay the stored answer
+        yield from replay(cached)
+        return
+
+    stream = client.chat.completions.create(model=model, messages=messages, stream=True, **params)
+    parts = []
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            parts.append(chunk.choices[0].delta.content)
+            yield parts[-1]
+    # Only complete answers are stored; an interrupted stream is asked again next time
+    if parts:
+        cache.put(key, "".join(parts))
+
+
+def write_stream(placeholder, chunks, cursor: str = "▌") -> str:
+    """Show chunks in a Streamlit placeholder as they arrive; returns the full text."""
+    text = ""
+    for content in chunks:
+        text += content
+        placeholder.markdown(text + cursor)
+    placeholder.markdown(text)
+    return text
+
+
+class SQLiteAnswerCache:
+    """Answers in a SQLite table keyed by answer_key(), with TTL and LRU eviction.
+
+    hits and misses count lookups made by this process.
+    """
+
+    def __init__(self, path: str = AI_CACHE_PATH, ttl: int = AI_CACHE_TTL, max_entries: int = AI_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ai_answers (
+                key TEXT PRIMARY KEY,
+                answer TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                used_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_ai_answers_used_at ON ai_answers (used_at)")
+
+    def get(self, key: str):
+        """The cached answer, or None if it is missing or expired."""
+        if not self.ttl:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer FROM ai_answers WHERE key = ? AND created_at >= ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE ai_answers SET used_at = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def put(self, key: str, answer: str):
+        if not self.ttl:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ai_answers (key, answer, created_at, used_at) VALUES (?, ?, ?, ?)",
+                (key, answer, now, now)
+            )
+            self._conn.execute("DELETE FROM ai_answers WHERE created_at < ?", (now - self.ttl,))
+            self._conn.execute("""
+                DELETE FROM ai_answers WHERE key IN (
+                    SELECT key FROM ai_answers ORDER BY used_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM ai_answers").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
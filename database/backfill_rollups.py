@@ -0,0 +1,7 @@
+# backfill_rollups.py
+# Rebuild the compliance rollup tables from existing audits.
+# Run from the project root: python -m database.backfill_rollups
+from database.models import init_db, rebuild_rollups
+
+init_db()
+print("Rebuilt", rebuild_rollups(), "rollup rows")
@@ -0,0 +1,67 @@
+# database/charts.py
+import io
+import os
+import threading
+from collections import OrderedDict
+import matplotlib.pyplot as plt
+
+# Rendered charts kept per dashboard process; each entry is one PNG
+FIGURE_CACHE_SIZE = int(os.getenv("FIGURE_CACHE_SIZE", "64"))
+
+# Same resolution st.pyplot renders at
+FIGURE_DPI = 200
+
+
+def figure_png(fig) -> bytes:
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=FIGURE_DPI, bbox_inches="tight")
+    return buffer.getvalue()
+
+
+class FigureCache:
+    """LRU cache of rendered chart PNGs.
+
+    Keys identify everything a chart depends on (chart name, filter state,
+    data watermark and chart-specific selections), so an unchanged chart is
+    served without running matplotlib. Figures are closed as soon as they
+    are rendered, so pyplot does not accumulate them across reruns.
+    """
+
+    def __init__(self, max_entries: int = FIGURE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key, draw) -> bytes:
+        """PNG bytes for key, calling draw() to build the figure on a miss."""
+        with self._lock:
+            png = self._entries.get(key)
+            if png is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return png
+            self.misses += 1
+
+        fig = draw()
+        try:
+            png = figure_png(fig)
+        finally:
+            plt.close(fig)
+
+        with self._lock:
+            self._entries[key] = png
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return png
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(len(png) for png in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -1,18 +1,24 @@
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
-from models import User, Audit, Response, Base
+from models import create_sqlite_engine
+from queries import (
+    ResponseStore, load_rollups, sum_rollups, rollups_from_responses, compliance_table, ROLLUP_RESPONSES,
+    load_filter_options, load_audit_list, load_audit_responses, latest_audit_id
+)
+from analytics import ANALYTICS_BACKEND, ANALYTICS_SOURCE, DuckDBAnalytics
+from charts import FigureCache
+from ai_context import (
+    build_data_context, system_prompt, build_messages, count_tokens, AI_MODEL, AI_TEMPERATURE, AI_MAX_TOKENS
+)
+from answer_cache import SQLiteAnswerCache, stream_answer, write_stream
 import seaborn as sns
 import os
 import numpy as np
 from st_aggrid import AgGrid, GridOptionsBuilder
 from datetime import timedelta
-import time
 from dotenv import load_dotenv
 import openai
-import json
 
 load_dotenv()
 api_key = os.getenv("OPENAI_API_KEY")
@@ -27,36 +33,29 @@ client = openai  # You can now use `client.chat.completions.create(...)`
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 db_path = os.path.join(BASE_DIR, "safetyhub.db")
-engine = create_engine(f"sqlite:///{db_path}")
 
-Session = sessionmaker(bind=engine)
-session = Session()
+@st.cache_resource
+def get_engine():
+    # One pooled, read-only engine shared by every session and rerun
+    return create_sqlite_engine(db_path, read_only=True)
 
-audits = session.query(Audit).join(User).order_by(Audit.timestamp.desc()).all()
-users = session.query(User).all()
+engine = get_engine()
 
 st.title("Safetyhub Audit Dashboard")
 
-@st.cache_data
-def load_all_responses():
-    responses = []
-    for audit in audits:
-        rs = session.query(Response).filter_by(audit_id=audit.id).all()
-        for r in rs:
-            responses.append({
-                "Audit ID": r.audit_id,
-                "Category": r.category,
-                "Keyword": r.keyword,
-                "Question": r.question,
-                "Response": r.response,
-                "Timestamp": audit.timestamp,
-                "site_id": audit.site_id,
-                "full_name": audit.user.full_name,
-                "title": audit.title
-            })
-    return pd.DataFrame(responses)
-
-df = load_all_responses()
+@st.cache_resource
+def get_response_store():
+    return ResponseStore(engine)
+
+# Only audits newer than the store's watermark are read on each rerun
+response_store = get_response_store()
+# The store is shared, so another viewer's rerun may already have loaded new audits; each
+# session remembers the newest audit its own page includes. Read before the refresh so an
+# audit landing in between is picked up by the next check. Audits without responses never
+# move the store's watermark, which is why the audits table is asked directly.
+rendered_audit_id = latest_audit_id(engine)
+response_store.refresh()
+st.session_state.rendered_audit_id = rendered_audit_id
 
 st.sidebar.header("🔎 Filter Data")
 
@@ -73,70 +72,197 @@ refresh_interval = st.sidebar.slider(
 enable_auto_refresh = st.sidebar.checkbox(
     "Enable Auto-Refresh",
     value=False,
-    help="Automatically refresh dashboard data at the specified interval"
+    help="Check for new audits at the specified interval and refresh only when there are some"
 )
 
+# Seconds a change probe is shared between viewers, so many open dashboards cost one query
+CHANGE_PROBE_TTL = 5
+
+@st.cache_data(ttl=CHANGE_PROBE_TTL)
+def probe_latest_audit_id():
+    return latest_audit_id(engine)
+
+@st.fragment(run_every=refresh_interval if enable_auto_refresh else None)
+def watch_for_new_audits():
+    # Only this fragment runs on the timer; the page reruns when a new audit has landed,
+    # and the watermark-keyed caches recompute just the data that changed
+    if not enable_auto_refresh:
+        return
+    if probe_latest_audit_id() > st.session_state.get("rendered_audit_id", 0):
+        st.rerun(scope="app")
+    st.caption(f"Checked for new audits at {pd.Timestamp.now():%H:%M:%S}")
+
+with st.sidebar:
+    watch_for_new_audits()
+
+@st.cache_data
+def get_filter_options(watermark):
+    # watermark is only part of the cache key so new audits invalidate the entry
+    return load_filter_options(engine)
+
+filter_options = get_filter_options(response_store.watermark)
+
 selected_template = st.sidebar.selectbox(
     "🔹 **Audit Template** (Required)",
-    ["All"] + sorted(df["title"].dropna().unique().tolist()),
-    index=1 if len(df["title"].dropna().unique().tolist()) > 0 else 0,
+    ["All"] + filter_options["titles"],
+    index=1 if filter_options["titles"] else 0,
     help="Select which audit template to view"
 )
 
-selected_site = st.sidebar.selectbox("Filter by Site ID", ["All"] + sorted(df["site_id"].unique().tolist()))
-selected_name = st.sidebar.selectbox("Filter by Engineer", ["All"] + sorted(df["full_name"].unique().tolist()))
-start_date = st.sidebar.date_input("Start Date", value=df["Timestamp"].min())
-end_date = st.sidebar.date_input("End Date", value=df["Timestamp"].max())
-
-filtered_df = df.copy()
-if selected_template != "All":
-    filtered_df = filtered_df[filtered_df["title"] == selected_template]
-if selected_site != "All":
-    filtered_df = filtered_df[filtered_df["site_id"] == selected_site]
-if selected_name != "All":
-    filtered_df = filtered_df[filtered_df["full_name"] == selected_name]
-filtered_df = filtered_df[(filtered_df["Timestamp"].dt.date >= start_date) &
-                          (filtered_df["Timestamp"].dt.date <= end_date)]
+selected_site = st.sidebar.selectbox("Filter by Site ID", ["All"] + filter_options["sites"])
+selected_name = st.sidebar.selectbox("Filter by Engineer", ["All"] + filter_options["engineers"])
+start_date = st.sidebar.date_input("Start Date", value=filter_options["min_date"])
+end_date = st.sidebar.date_input("End Date", value=filter_options["max_date"])
+
+filters = {
+    "title": None if selected_template == "All" else selected_template,
+    "site_id": None if selected_site == "All" else selected_site,
+    "full_name": None if selected_name == "All" else selected_name,
+    "start_date": start_date,
+    "end_date": end_date,
+}
+
+# Only the template/month partitions the filters can match are read; shared, so never modified in place
+filtered_df = response_store.select(**filters)
 
 if filtered_df.empty:
     st.warning("No data matches your filters.")
-    session.close()
     st.stop()
 
 @st.cache_data
-def calculate_filtered_stats(df):
-    global_counts = df.groupby(["Keyword", "Response"]).size().unstack(fill_value=0)
+def load_filtered_rollups(template, site, name, start, end, watermark):
+    # watermark is only part of the cache key so new audits invalidate the entry
+    return load_rollups(
+        engine, start, end,
+        title=None if template == "All" else template,
+        site_id=None if site == "All" else site,
+        full_name=None if name == "All" else name
+    )
+
+rollups = load_filtered_rollups(
+    selected_template, selected_site, selected_name, start_date, end_date, response_store.watermark
+)
+if rollups.empty:
+    # The rollup table has not been built yet (run python -m database.backfill_rollups): count the loaded rows
+    rollups = rollups_from_responses(filtered_df)
+
+@st.cache_data
+def calculate_filtered_stats(rollups):
+    global_counts = sum_rollups(rollups, ["Keyword"])
     global_percent = global_counts.div(global_counts.sum(axis=1), axis=0) * 100
     return global_counts, global_percent
 
-global_counts, global_percent = calculate_filtered_stats(filtered_df)
 
 @st.cache_data
-def calculate_site_stats(df):
-    site_counts = df.groupby(["site_id", "Keyword", "Response"]).size().unstack(fill_value=0)
+def calculate_site_stats(rollups):
+    site_counts = sum_rollups(rollups, ["site_id", "Keyword"])
     site_percent = site_counts.div(site_counts.sum(axis=1), axis=0) * 100
     return site_counts, site_percent
 
-site_counts, site_percent = calculate_site_stats(filtered_df)
 
 @st.cache_data
-def calculate_engineer_stats(df):
-    engineer_metrics = df.groupby("full_name").agg(
+def calculate_engineer_stats(df, rollups):
+    by_engineer = df.groupby("full_name", observed=True)
+    engineer_metrics = by_engineer.agg(
         total_audits=("Audit ID", "nunique"),
-        sites_visited=("site_id", "nunique"),
-        unique_sites=("site_id", lambda x: list(x.unique()))
-    ).reset_index()
+        sites_visited=("site_id", "nunique")
+    )
+    # Outside agg: a list-valued lambda over a categorical column is cast back to the category dtype
+    engineer_metrics["unique_sites"] = [list(sites) for sites in by_engineer["site_id"].unique()]
+    engineer_metrics = engineer_metrics.reset_index()
     
-    engineer_site_visits = df.groupby(["full_name", "site_id"]).size().reset_index(name="visits")
+    engineer_site_visits = df.groupby(["full_name", "site_id"], observed=True).size().reset_index(name="visits")
     
-    engineer_kw = df.groupby(["full_name", "Keyword", "Response"]).size().unstack(fill_value=0)
+    engineer_kw = sum_rollups(rollups, ["full_name", "Keyword"])
     engineer_kw_percent = engineer_kw.div(engineer_kw.sum(axis=1), axis=0) * 100
     
     return engineer_metrics, engineer_site_visits, engineer_kw, engineer_kw_percent
 
-engineer_metrics, engineer_site_visits, engineer_kw, engineer_kw_percent = calculate_engineer_stats(filtered_df)
+def monthly_rollups(rollups):
+    return rollups.groupby(rollups["day"].dt.to_period("M"))[ROLLUP_RESPONSES].sum()
+
+@st.cache_resource
+def get_analytics():
+    # Optional columnar backend; None keeps the pandas/rollup path
+    if ANALYTICS_BACKEND != "duckdb":
+        return None
+    return DuckDBAnalytics(ANALYTICS_SOURCE or db_path)
+
+analytics = get_analytics()
+
+@st.cache_data
+def calculate_analytics_stats(filter_items, watermark):
+    # watermark is only part of the cache key so new audits invalidate the entry
+    filters = dict(filter_items)
+    return (
+        analytics.filtered_stats(**filters),
+        analytics.site_stats(**filters),
+        analytics.engineer_stats(**filters),
+    )
+
+@st.cache_data
+def calculate_analytics_monthly(filter_items, site_id, full_names, watermark):
+    filters = dict(filter_items)
+    if site_id is not None:
+        filters["site_id"] = site_id
+    return analytics.monthly(full_names=full_names, **filters)
+
+if analytics is None:
+    global_counts, global_percent = calculate_filtered_stats(rollups)
+    site_counts, site_percent = calculate_site_stats(rollups)
+    engineer_metrics, engineer_site_visits, engineer_kw, engineer_kw_percent = calculate_engineer_stats(filtered_df, rollups)
+else:
+    (
+        (global_counts, global_percent),
+        (site_counts, site_percent),
+        (engineer_metrics, engineer_site_visits, engineer_kw, engineer_kw_percent),
+    ) = calculate_analytics_stats(tuple(filters.items()), response_store.watermark)
+
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache()
+
+figure_cache = get_figure_cache()
+
+def show_figure(chart, draw, *params):
+    """Show a chart, rendering it with draw() only if this chart/filter/data state is not cached."""
+    key = (chart, tuple(filters.items()), response_store.watermark, *params)
+    st.image(figure_cache.get_or_render(key, draw))
+
+@st.cache_data
+def calculate_compliance_tables(filter_items, watermark):
+    # Keyed on the filter state rather than the frame, so reruns skip hashing the responses
+    df = response_store.select(**dict(filter_items))
+    return compliance_table(df, "full_name"), compliance_table(df, "site_id")
+
+# Per-engineer and per-site compliance shared by the tabs and the AI context
+engineer_compliance, site_compliance = calculate_compliance_tables(tuple(filters.items()), response_store.watermark)
+
+def monthly_counts(site_id=None, full_names=None):
+    """Yes/No/N/A per month for the current filters, narrowed to a site or a set of engineers."""
+    if analytics is not None:
+        return calculate_analytics_monthly(
+            tuple(filters.items()), site_id,
+            tuple(full_names) if full_names is not None else None,
+            response_store.watermark
+        )
+    subset = rollups
+    if site_id is not None:
+        subset = subset[subset["site_id"] == site_id]
+    if full_names is not None:
+        subset = subset[subset["full_name"].isin(full_names)]
+    return monthly_rollups(subset)
 
 st.markdown("### 📊 Summary Statistics")
+if analytics is not None and analytics.is_snapshot:
+    written_at = analytics.snapshot_written_at()
+    st.warning(
+        f"⚠️ Keyword, site, engineer and monthly aggregates come from the Parquet snapshot "
+        f"`{analytics.source}`"
+        + (f" written {written_at:%Y-%m-%d %H:%M}" if written_at else "")
+        + ". Audits saved after it are missing there, while the totals, compliance tables and audit list "
+        "are live. Rewrite it with `python analytics.py` or set ANALYTICS_SOURCE to safetyhub.db."
+    )
 st.info(f"📋 Viewing template: **{selected_template}**" if selected_template != "All" else "📋 Viewing: **All Templates**")
 
 col1, col2, col3 = st.columns(3)
@@ -164,10 +290,12 @@ with tab1:
     st.subheader("Keyword Performance Heatmap")
     st.write("Percentage of Yes/No/NA responses for each keyword")
     
-    fig, ax = plt.subplots(figsize=(12, 8))
-    sns.heatmap(global_percent, annot=True, fmt=".1f", cmap="YlGnBu", ax=ax)
-    ax.set_title("Response Percentage by Keyword")
-    st.pyplot(fig)
+    def draw():
+        fig, ax = plt.subplots(figsize=(12, 8))
+        sns.heatmap(global_percent, annot=True, fmt=".1f", cmap="YlGnBu", ax=ax)
+        ax.set_title("Response Percentage by Keyword")
+        return fig
+    show_figure("keyword_heatmap", draw)
 
 with tab2:
     st.header("Site Insights")
@@ -182,9 +310,9 @@ with tab2:
     st.subheader(f"📌 {site} - Detailed Analysis")
     
     m1, m2, m3, m4 = st.columns(4)
-    m1.metric("Total Audits", len(site_data["Audit ID"].unique()))
+    m1.metric("Total Audits", int(site_compliance.loc[site, "audits"]))
 
-    compliance_rate = (site_data['Response'] == 'Yes').mean() * 100
+    compliance_rate = site_compliance.loc[site, "compliance_rate"]
     m2.metric("Compliance", f"{compliance_rate:.1f}%", 
             delta=f"Δ{compliance_rate - global_percent['Yes'].mean():.1f}%")
 
@@ -209,59 +337,62 @@ with tab2:
     
     with site_tab1:
         st.markdown("#### Compliance Trend")
-        monthly_compliance = site_data[site_data['Response']=='Yes'].groupby(
-            site_data['Timestamp'].dt.to_period('M')
-        ).size() / site_data.groupby(site_data['Timestamp'].dt.to_period('M')).size() * 100
+        site_monthly = monthly_counts(site_id=site)
+        monthly_compliance = site_monthly['Yes'] / site_monthly.sum(axis=1) * 100
         
-        fig, ax = plt.subplots(figsize=(10, 4))
-        monthly_compliance.plot(kind='line', marker='o', ax=ax, label='Site Compliance')
-        ax.axhline(y=global_percent['Yes'].mean(), color='r', linestyle='--', 
-                  label='Template Average')
-        ax.set_title(f"Monthly Compliance Trend")
-        ax.set_ylabel("Compliance Rate (%)")
-        ax.legend()
-        st.pyplot(fig)
+        def draw():
+            fig, ax = plt.subplots(figsize=(10, 4))
+            monthly_compliance.plot(kind='line', marker='o', ax=ax, label='Site Compliance')
+            ax.axhline(y=global_percent['Yes'].mean(), color='r', linestyle='--', 
+                      label='Template Average')
+            ax.set_title(f"Monthly Compliance Trend")
+            ax.set_ylabel("Compliance Rate (%)")
+            ax.legend()
+            return fig
+        show_figure("site_compliance_trend", draw, site)
     
     with site_tab2:
         st.markdown("#### Issue Frequency")
 
-        monthly_issues = site_data[site_data['Response']=='No'].groupby(
-            site_data['Timestamp'].dt.to_period('M')).size()
+        monthly_issues = site_monthly['No'][site_monthly['No'] > 0]
 
         if not monthly_issues.empty:
-            fig, ax = plt.subplots(figsize=(10, 4))
-            monthly_issues.plot(kind='bar', ax=ax, color='orange')
-            ax.set_title("Monthly Issue Count")
-            ax.set_xlabel("")
-            st.pyplot(fig)
+            def draw():
+                fig, ax = plt.subplots(figsize=(10, 4))
+                monthly_issues.plot(kind='bar', ax=ax, color='orange')
+                ax.set_title("Monthly Issue Count")
+                ax.set_xlabel("")
+                return fig
+            show_figure("site_monthly_issues", draw, site)
         else:
             st.info("No safety issues found for this site in the selected time period!")
         
         st.markdown("#### Top 5 Problem Areas")
 
-        issue_keywords = site_data[site_data['Response']=='No']['Keyword'].value_counts().nlargest(5)
+        issue_keywords = site_data[site_data['Response']=='No']['Keyword'].value_counts().loc[lambda s: s > 0].nlargest(5)
 
         if not issue_keywords.empty:
-            fig, ax = plt.subplots(figsize=(10, 4))
-            
-            issue_keywords.sort_values().plot(
-                kind='barh', 
-                ax=ax, 
-                color='#ff6666',
-                edgecolor='darkred',
-                width=0.7
-            )
+            def draw():
+                fig, ax = plt.subplots(figsize=(10, 4))
             
-            for i, v in enumerate(issue_keywords.sort_values()):
-                ax.text(v + 0.5, i, str(v), color='darkred', fontweight='bold')
+                issue_keywords.sort_values().plot(
+                    kind='barh', 
+                    ax=ax, 
+                    color='#ff6666',
+                    edgecolor='darkred',
+                    width=0.7
+                )
             
-            ax.set_title("Most Frequent Safety Issues", pad=20, fontsize=14)
-            ax.set_xlabel("Number of Occurrences", labelpad=10)
-            ax.set_ylabel("")
-            ax.spines['top'].set_visible(False)
-            ax.spines['right'].set_visible(False)
+                for i, v in enumerate(issue_keywords.sort_values()):
+                    ax.text(v + 0.5, i, str(v), color='darkred', fontweight='bold')
             
-            st.pyplot(fig)
+                ax.set_title("Most Frequent Safety Issues", pad=20, fontsize=14)
+                ax.set_xlabel("Number of Occurrences", labelpad=10)
+                ax.set_ylabel("")
+                ax.spines['top'].set_visible(False)
+                ax.spines['right'].set_visible(False)
+                return fig
+            show_figure("site_top_issues", draw, site)
         else:
             st.success("No safety issues found for this site!")
 
@@ -277,10 +408,10 @@ with tab3:
     
     st.subheader(f"Engineer Profile: {engineer}")
     col1, col2, col3 = st.columns(3)
-    col1.metric("Total Audits", len(engineer_data["Audit ID"].unique()))
+    col1.metric("Total Audits", int(engineer_compliance.loc[engineer, "audits"]))
     col2.metric("Sites Visited", len(engineer_data["site_id"].unique()))
     
-    compliance_rate = (engineer_data['Response'] == 'Yes').mean() * 100
+    compliance_rate = engineer_compliance.loc[engineer, "compliance_rate"]
     col3.metric("Overall Compliance", f"{compliance_rate:.1f}%", 
                delta=f"{(compliance_rate - global_percent['Yes'].mean()):.1f}% vs template avg")
     
@@ -343,99 +474,99 @@ with tab3:
 
         st.write(f"{engineer} is in the **{current_group}** peer group (based on audit volume)")
         
-        peer_data = engineer_metrics[engineer_metrics['peer_group'] == current_group]
+        peer_data = engineer_metrics[engineer_metrics['peer_group'] == current_group].copy()
+        # Plain strings: a categorical full_name keeps every engineer as a y-axis level
+        peer_data['full_name'] = peer_data['full_name'].astype(str)
+        peer_palette = {name: 'red' if name == engineer else 'gray' for name in peer_data['full_name']}
         
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 5))
-        
-        sns.barplot(
-            data=peer_data.sort_values('total_audits', ascending=False),
-            y='full_name',
-            x='total_audits',
-            ax=ax1,
-            palette=['red' if x == engineer else 'gray' for x in peer_data['full_name']]
-        )
-        ax1.set_title(f"Audit Count Comparison\n({current_group} Group)")
-        ax1.set_xlabel("Number of Audits")
+        def draw():
+            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 5))
         
-        peer_compliance = []
-        for peer in peer_data['full_name']:
-            peer_responses = filtered_df[filtered_df['full_name'] == peer]['Response']
-            peer_compliance.append((peer_responses == 'Yes').mean() * 100)
+            sns.barplot(
+                data=peer_data.sort_values('total_audits', ascending=False),
+                y='full_name',
+                x='total_audits',
+                hue='full_name',
+                ax=ax1,
+                palette=peer_palette,
+                legend=False
+            )
+            ax1.set_title(f"Audit Count Comparison\n({current_group} Group)")
+            ax1.set_xlabel("Number of Audits")
         
-        peer_data_copy = peer_data.copy()
-        peer_data_copy['compliance_rate'] = peer_compliance
-        sns.barplot(
-            data=peer_data_copy.sort_values('compliance_rate', ascending=False),
-            y='full_name',
-            x='compliance_rate',
-            ax=ax2,
-            palette=['red' if x == engineer else 'gray' for x in peer_data_copy['full_name']]
-        )
-        ax2.axvline(x=global_percent['Yes'].mean(), color='green', linestyle='--', 
-                   label='Template Avg')
-        ax2.set_title(f"Compliance Rate Comparison\n({current_group} Group)")
-        ax2.set_xlabel("Compliance Rate (%)")
-        ax2.legend()
+            peer_data_copy = peer_data.copy()
+            peer_data_copy['compliance_rate'] = peer_data_copy['full_name'].map(engineer_compliance['compliance_rate'])
+            sns.barplot(
+                data=peer_data_copy.sort_values('compliance_rate', ascending=False),
+                y='full_name',
+                x='compliance_rate',
+                hue='full_name',
+                ax=ax2,
+                palette=peer_palette,
+                legend=False
+            )
+            ax2.axvline(x=global_percent['Yes'].mean(), color='green', linestyle='--', 
+                       label='Template Avg')
+            ax2.set_title(f"Compliance Rate Comparison\n({current_group} Group)")
+            ax2.set_xlabel("Compliance Rate (%)")
+            ax2.legend()
         
-        plt.tight_layout()
-        st.pyplot(fig)
+            plt.tight_layout()
+            return fig
+        show_figure("peer_comparison", draw, engineer)
     
     with comp_tab2:
         st.markdown("**Performance Trend Over Time**")
         
-        monthly = engineer_data.groupby([
-            engineer_data['Timestamp'].dt.to_period('M'),
-            'Response'
-        ]).size().unstack().fillna(0)
+        monthly = monthly_counts(full_names=[engineer])
         monthly_pct = monthly.div(monthly.sum(axis=1), axis=0) * 100
         
-        fig, ax = plt.subplots(figsize=(10, 4))
-        if 'Yes' in monthly_pct.columns:
-            monthly_pct['Yes'].plot(
-                kind='line', 
-                marker='o', 
-                ax=ax, 
-                label=engineer
-            )
-        
-        if 'peer_group' in locals():
-            peer_group_avg = filtered_df[
-                filtered_df['full_name'].isin(peer_data['full_name'])
-            ].groupby([
-                filtered_df['Timestamp'].dt.to_period('M'),
-                'Response'
-            ]).size().unstack().fillna(0)
-            peer_group_avg_pct = peer_group_avg.div(peer_group_avg.sum(axis=1), axis=0) * 100
-            if 'Yes' in peer_group_avg_pct.columns:
-                peer_group_avg_pct['Yes'].plot(
+        def draw():
+            fig, ax = plt.subplots(figsize=(10, 4))
+            if 'Yes' in monthly_pct.columns:
+                monthly_pct['Yes'].plot(
                     kind='line', 
-                    linestyle='--', 
+                    marker='o', 
                     ax=ax, 
-                    label=f'{current_group} Avg'
+                    label=engineer
                 )
         
-        ax.axhline(y=global_percent['Yes'].mean(), color='green', linestyle=':', 
-                  label='Template Avg')
-        ax.set_title("Monthly Compliance Rate Trend")
-        ax.set_ylabel("Compliance Rate (%)")
-        ax.legend()
-        st.pyplot(fig)
+            if 'peer_group' in locals():
+                peer_group_avg = monthly_counts(full_names=peer_data['full_name'].tolist())
+                peer_group_avg_pct = peer_group_avg.div(peer_group_avg.sum(axis=1), axis=0) * 100
+                if 'Yes' in peer_group_avg_pct.columns:
+                    peer_group_avg_pct['Yes'].plot(
+                        kind='line', 
+                        linestyle='--', 
+                        ax=ax, 
+                        label=f'{current_group} Avg'
+                    )
+        
+            ax.axhline(y=global_percent['Yes'].mean(), color='green', linestyle=':', 
+                      label='Template Avg')
+            ax.set_title("Monthly Compliance Rate Trend")
+            ax.set_ylabel("Compliance Rate (%)")
+            ax.legend()
+            return fig
+        show_figure("engineer_compliance_trend", draw, engineer)
         
         st.markdown("**Audit Activity Over Time**")
         audit_freq = engineer_data.groupby(
             engineer_data['Timestamp'].dt.to_period('M')
         ).size()
         
-        fig, ax = plt.subplots(figsize=(10, 3))
-        audit_freq.plot(kind='bar', ax=ax)
-        ax.set_title("Monthly Audit Count")
-        ax.set_xlabel("")
-        st.pyplot(fig)
+        def draw():
+            fig, ax = plt.subplots(figsize=(10, 3))
+            audit_freq.plot(kind='bar', ax=ax)
+            ax.set_title("Monthly Audit Count")
+            ax.set_xlabel("")
+            return fig
+        show_figure("engineer_audit_activity", draw, engineer)
     
     with comp_tab3:
         st.markdown("**Keyword-Specific Performance**")
         
-        eng_kw = engineer_data.groupby(['Keyword', 'Response']).size().unstack().fillna(0)
+        eng_kw = engineer_data.groupby(['Keyword', 'Response'], observed=True).size().unstack().fillna(0)
         eng_kw_pct = eng_kw.div(eng_kw.sum(axis=1), axis=0) * 100
         
         comparison = pd.DataFrame({
@@ -483,36 +614,31 @@ with tab3:
         kw_data = engineer_data[engineer_data['Keyword'] == selected_kw]
         kw_responses = kw_data['Response'].value_counts(normalize=True) * 100
         
-        fig, ax = plt.subplots(figsize=(8, 3))
-        kw_responses.plot(kind='bar', ax=ax)
-        ax.set_title(f"Response Distribution for '{selected_kw}'")
-        ax.set_ylabel("Percentage")
-        st.pyplot(fig)
+        def draw():
+            fig, ax = plt.subplots(figsize=(8, 3))
+            kw_responses.plot(kind='bar', ax=ax)
+            ax.set_title(f"Response Distribution for '{selected_kw}'")
+            ax.set_ylabel("Percentage")
+            return fig
+        show_figure("engineer_keyword_distribution", draw, engineer, selected_kw)
 
 with tab4:
     st.header("Audit Inspector")
     
-    filtered_audits = session.query(Audit).join(User).filter(
-        Audit.timestamp.between(start_date, end_date + timedelta(days=1))
+    filtered_audits = load_audit_list(
+        engine, start_date, end_date,
+        title=None if selected_template == "All" else selected_template,
+        site_id=None if selected_site == "All" else selected_site,
+        full_name=None if selected_name == "All" else selected_name
     )
 
-    if selected_template != "All":
-        filtered_audits = filtered_audits.filter(Audit.title == selected_template)
-    if selected_site != "All":
-        filtered_audits = filtered_audits.filter(Audit.site_id == selected_site)
-    if selected_name != "All":
-        filtered_audits = filtered_audits.filter(User.full_name == selected_name)
-    
-    filtered_audits = filtered_audits.order_by(Audit.timestamp.desc()).all()
-    
-    if not filtered_audits:
+    if filtered_audits.empty:
         st.warning("No audits match your filters")
-        session.close()
         st.stop()
     
     audit_options = [
-        f"{audit.id} | {audit.user.full_name} | {audit.site_id} | {audit.timestamp.strftime('%Y-%m-%d %H:%M')}"
-        for audit in filtered_audits
+        f"{audit.audit_id} | {audit.full_name} | {audit.site_id} | {audit.timestamp.strftime('%Y-%m-%d %H:%M')}"
+        for audit in filtered_audits.itertuples()
     ]
     
     selected = st.selectbox(
@@ -522,26 +648,22 @@ with tab4:
     )
     
     selected_id = int(selected.split(" | ")[0])
-    audit = session.query(Audit).get(selected_id)
+    audit = filtered_audits[filtered_audits["audit_id"] == selected_id].iloc[0]
     
     st.subheader("Audit Metadata")
     meta_col1, meta_col2, meta_col3 = st.columns(3)
     with meta_col1:
-        st.metric("Auditor", audit.user.full_name)
+        st.metric("Auditor", audit.full_name)
     with meta_col2:
         st.metric("Site", audit.site_id)
     with meta_col3:
         st.metric("Date", audit.timestamp.strftime('%Y-%m-%d'))
     
     st.subheader("Audit Responses")
-    responses = session.query(Response).filter_by(audit_id=audit.id).all()
-    
-    df_responses = pd.DataFrame([{
-        "Category": r.category,
-        "Keyword": r.keyword,
-        "Question": r.question[:60] + "..." if len(r.question) > 60 else r.question,
-        "Response": r.response,
-    } for r in responses])
+    df_responses = load_audit_responses(engine, selected_id)
+    df_responses["Question"] = df_responses["Question"].fillna("").map(
+        lambda q: q[:60] + "..." if len(q) > 60 else q
+    )
     
     gb = GridOptionsBuilder.from_dataframe(df_responses)
     gb.configure_selection('single', use_checkbox=False)
@@ -550,7 +672,7 @@ with tab4:
     grid_response = AgGrid(
         df_responses,
         gridOptions=grid_options,
-        height=min(400, 50 + len(responses)*40),
+        height=min(400, 50 + len(df_responses)*40),
         theme="streamlit",
         fit_columns_on_grid_load=True,
         allow_unsafe_jscode=True
@@ -578,22 +700,23 @@ with tab5:
     if "processing" not in st.session_state:
         st.session_state.processing = False
 
-    # Build AI context
-    def build_data_context():
-        context = {
-            "template_name": selected_template,
-            "date_range": f"{start_date} to {end_date}",
-            "total_audits": len(filtered_df["Audit ID"].unique()),
-            "total_engineers": len(filtered_df["full_name"].unique()),
-            "total_sites": len(filtered_df["site_id"].unique()),
-            "overall_compliance": f"{(filtered_df['Response'] == 'Yes').mean() * 100:.1f}%",
-            "top_issues": filtered_df[filtered_df['Response']=='No']['Keyword'].value_counts().head(5).to_dict(),
-            "best_performing_keywords": global_percent['Yes'].nlargest(5).to_dict(),
-            "worst_performing_keywords": global_percent['Yes'].nsmallest(5).to_dict(),
-            "site_performance": filtered_df.groupby('site_id').apply(lambda x: f"{(x['Response'] == 'Yes').mean() * 100:.1f}%").to_dict(),
-            "engineer_performance": filtered_df.groupby('full_name').apply(lambda x: f"{(x['Response'] == 'Yes').mean() * 100:.1f}%").to_dict(),
-        }
-        return context
+    @st.cache_data
+    def get_ai_context(filter_items, watermark):
+        # Keyed on the filter state: the aggregates it summarises are determined by it
+        context = build_data_context(
+            selected_template, start_date, end_date, filtered_df["Audit ID"].nunique(),
+            global_counts, global_percent, site_compliance, engineer_compliance
+        )
+        prompt = system_prompt(context)
+        return context, prompt, count_tokens(prompt)
+
+    ai_context, ai_system_prompt, ai_context_tokens = get_ai_context(tuple(filters.items()), response_store.watermark)
+
+    @st.cache_resource
+    def get_answer_cache():
+        return SQLiteAnswerCache()
+
+    answer_cache = get_answer_cache()
 
     # Quick action buttons
     st.markdown("**💡 Quick Questions:**")
@@ -621,8 +744,10 @@ with tab5:
                 del st.session_state.quick_query
             st.rerun()  # Use st.rerun() instead of st.experimental_rerun()
     with col_b:
-        with st.expander("🔍 View AI Data Context"):
-            st.json(build_data_context())
+        with st.expander(f"🔍 View AI Data Context (~{ai_context_tokens} tokens)"):
+            st.json(ai_context)
+        cache_stats = answer_cache.stats()
+        st.caption(f"Answer cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['entries']} stored")
 
     st.divider()
 
@@ -653,37 +778,19 @@ with tab5:
             st.session_state.processing = False
         else:
             st.session_state.assistant_history.append({"role": "user", "content": user_query})
-            context_str = json.dumps(build_data_context(), indent=2)
-            system_prompt = f"""You are SafetyBot, a professional safety audit analyst. Use the data context below:
-
-{context_str}
-
-Answer concisely, cite metrics, prioritize critical issues, and provide actionable recommendations."""
+            # Older turns are dropped once the prompt would exceed AI_PROMPT_TOKEN_BUDGET
+            messages, _ = build_messages(ai_system_prompt, st.session_state.assistant_history)
 
             with st.chat_message("user"):
                 st.markdown(user_query)
 
             with st.chat_message("assistant"):
                 message_placeholder = st.empty()
-                full_response = ""
                 try:
-                    from openai import OpenAI
-                    stream = client.chat.completions.create(
-                        model="gpt-4o-mini",
-                        messages=[{"role": "system", "content": system_prompt}] +
-                                 [{"role": m["role"], "content": m["content"]} for m in st.session_state.assistant_history],
-                        temperature=0.5,
-                        max_tokens=800,
-                        stream=True
-                    )
-
-                    for chunk in stream:
-                        content = getattr(chunk.choices[0].delta, "content", None)
-                        if content:
-                            full_response += content
-                            message_placeholder.markdown(full_response + "▌")
-                    message_placeholder.markdown(full_response)
-
+                    full_response = write_stream(message_placeholder, stream_answer(
+                        client, answer_cache, AI_MODEL, messages,
+                        temperature=AI_TEMPERATURE, max_tokens=AI_MAX_TOKENS
+                    ))
                     st.session_state.assistant_history.append({"role": "assistant", "content": full_response})
 
                 except Exception as e:
@@ -692,9 +799,3 @@ Answer concisely, cite metrics, prioritize critical issues, and provide actionab
 
             st.session_state.processing = False
             st.rerun()  # Force rerun after processing to show chat input again
-
-if enable_auto_refresh:
-    time.sleep(refresh_interval)
-    st.rerun()
-
-session.close()
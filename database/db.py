@@ -1,4 +1,20 @@
-from database.models import Session, User, Audit, Response
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database.models import (
+    Session, User, Audit, Response, ComplianceRollup, TemplateVersion, Question,
+    DEFAULT_ANSWER_CODES, get_or_create_template_version, get_answer_code, rebuild_rollups
+)
+from utils.compiled_template import template_version
+
+# Rollup counter column for each answer; anything else is counted as N/A
+ROLLUP_COLUMNS = {"Yes": "yes_count", "No": "no_count"}
+
+# Question ids per template version and codes per answer label; both are
+# immutable once committed, so completed audits skip the lookups
+_template_question_cache = {}
+_answer_code_cache = {}
 
 
 def upsert_user(telegram_id, full_name, site_id):
@@ -24,22 +40,124 @@ def create_audit(telegram_id, site_id, title=None):
     return audit_id
 
 
+def update_rollups(session, audit, answers_by_keyword):
+    """Add one audit's answers to the daily compliance rollups."""
+    counts = defaultdict(lambda: {"yes_count": 0, "no_count": 0, "na_count": 0})
+    for keyword, answer in answers_by_keyword:
+        # NULL keywords would never match the unique key, so every audit would add a new row
+        counts[keyword or ""][ROLLUP_COLUMNS.get(answer, "na_count")] += 1
+
+    if not counts:
+        return
+
+    stmt = sqlite_insert(ComplianceRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["title", "site_id", "user_id", "keyword", "day"],
+        set_={
+            col: getattr(ComplianceRollup, col) + getattr(stmt.excluded, col)
+            for col in ("yes_count", "no_count", "na_count")
+        }
+    )
+    session.execute(stmt, [
+        {
+            "title": audit.title or "",
+            "site_id": audit.site_id or "",
+            "user_id": audit.user_id,
+            "keyword": keyword,
+            "day": audit.timestamp.date(),
+            **keyword_counts
+        }
+        for keyword, keyword_counts in counts.items()
+    ])
+
+
+def _template_questions(session, template):
+    """(template_version_id, [(question_id, keyword), ...]) for a template dict."""
+    version = template_version(template)
+    cached = _template_question_cache.get(version)
+    if cached is not None:
+        return cached
+
+    existing = session.query(TemplateVersion).filter_by(version=version).one_or_none()
+    template_version_row = existing or get_or_create_template_version(session, version, template)
+    questions = (
+        session.query(Question.id, Question.keyword)
+        .filter_by(template_version_id=template_version_row.id)
+        .order_by(Question.question_index)
+        .all()
+    )
+    result = (template_version_row.id, [(q.id, q.keyword) for q in questions])
+    # Only committed versions are cached, so a rolled-back insert is never reused
+    if existing is not None:
+        _template_question_cache[version] = result
+    return result
+
+
+def _answer_code(session, label):
+    code = _answer_code_cache.get(label)
+    if code is None:
+        code = get_answer_code(session, label)
+        if label in DEFAULT_ANSWER_CODES:
+            _answer_code_cache[label] = code
+    return code
+
+
+def build_response_rows(session, audit_id, template, responses):
+    """Compact Response rows for a template's answers, plus (keyword, answer) pairs for the rollups."""
+    template_version_id, questions = _template_questions(session, template)
+    rows = []
+    answers_by_keyword = []
+    for question_index, (question_id, keyword) in enumerate(questions):
+        answer = responses[question_index] if question_index < len(responses) else "N/A"
+        answer = answer or "N/A"
+        rows.append({
+            "audit_id": audit_id,
+            "question_id": question_id,
+            "answer": _answer_code(session, answer)
+        })
+        answers_by_keyword.append((keyword, answer))
+    return template_version_id, rows, answers_by_keyword
+
+
 def save_responses(audit_id, template, responses):
     session = Session()
-    question_index = 0
-    for cat in template["categories"]:
-        cat_name = cat["name"]
-        for q in cat["questions"]:
-            answer = responses[question_index] if question_index < len(responses) else "N/A"
-            session.add(Response(
-                audit_id=audit_id,
-                question_index=question_index,
-                category=cat_name,
-                question=q["question_en"],
-                question_ru=q["question_ru"],
-                keyword=q["keyword"], 
-                response=answer
-            ))
-            question_index += 1
+    audit = session.query(Audit).get(audit_id)
+    audit.template_version_id, rows, answers_by_keyword = build_response_rows(session, audit_id, template, responses)
+    if rows:
+        session.execute(insert(Response), rows)
+    update_rollups(session, audit, answers_by_keyword)
     session.commit()
     session.close()
+
+
+def persist_completed_audit(telegram_id, full_name, site_id, template, responses, title=None, timestamp=None):
+    """Write the user upsert, the audit and all its responses in one transaction; returns the audit id.
+
+    timestamp defaults to now (UTC).
+    """
+    session = Session()
+    try:
+        user_stmt = sqlite_insert(User).values(telegram_id=telegram_id, full_name=full_name, site_id=site_id)
+        session.execute(user_stmt.on_conflict_do_update(
+            index_elements=["telegram_id"],
+            set_={"full_name": full_name, "site_id": site_id}
+        ))
+
+        audit = Audit(user_id=telegram_id, site_id=site_id, title=title, timestamp=timestamp or datetime.utcnow())
+        session.add(audit)
+        session.flush()
+
+        # executemany over plain dicts instead of one ORM object per question
+        audit.template_version_id, rows, answers_by_keyword = build_response_rows(session, audit.id, template, responses)
+        if rows:
+            session.execute(insert(Response), rows)
+        update_rollups(session, audit, answers_by_keyword)
+
+        audit_id = audit.id
+        session.commit()
+        return audit_id
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
@@ -0,0 +1,186 @@
+# export_reports.py
+# Render PDF reports of past audits into a zip archive.
+# Run from the project root: python -m database.export_reports --start 2025-01-01 --site S1
+import argparse
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from sqlalchemy import text
+from database.models import engine, init_db
+from utils.pdf_generator import render_report
+
+# Audits whose responses are fetched per query
+BATCH_SIZE = 500
+
+# Jobs in flight per worker; bounds memory when exporting many audits
+JOBS_PER_WORKER = 4
+
+AUDITS_QUERY = """
+SELECT a.id, a.site_id, a.timestamp, a.template_version_id, u.full_name
+FROM audits a
+JOIN users u ON u.telegram_id = a.user_id
+WHERE a.template_version_id IS NOT NULL
+"""
+
+RESPONSES_QUERY = """
+SELECT audit_id, question_index, response
+FROM response_details
+WHERE audit_id IN ({ids})
+ORDER BY audit_id, question_index
+"""
+
+
+def build_audits_query(start=None, end=None, site_id=None, template=None):
+    sql = AUDITS_QUERY
+    params = {}
+    if start:
+        sql += " AND a.timestamp >= :start"
+        params["start"] = start
+    if end:
+        # Inclusive end date
+        sql += " AND a.timestamp < DATE(:end, '+1 day')"
+        params["end"] = end
+    if site_id:
+        sql += " AND a.site_id = :site_id"
+        params["site_id"] = site_id
+    if template:
+        sql += " AND a.title = :title"
+        params["title"] = template
+    sql += " ORDER BY a.id"
+    return text(sql), params
+
+
+def load_template(conn, template_version_id):
+    """(version, template dict) rebuilt from the stored questions of a template version."""
+    version, title = conn.execute(
+        text("SELECT version, title FROM template_versions WHERE id = :id"), {"id": template_version_id}
+    ).one()
+    rows = conn.execute(text("""
+        SELECT category, question, question_ru, keyword
+        FROM questions
+        WHERE template_version_id = :id
+        ORDER BY question_index
+    """), {"id": template_version_id}).all()
+
+    categories = []
+    for category, question, question_ru, keyword in rows:
+        if not categories or categories[-1]["name"] != category:
+            categories.append({"name": category, "questions": []})
+        categories[-1]["questions"].append({
+            "keyword": keyword,
+            "question_en": question or "",
+            "question_ru": question_ru or "",
+        })
+    return version, {"template_name": title, "categories": categories}
+
+
+def iter_report_jobs(start=None, end=None, site_id=None, template=None, batch_size=BATCH_SIZE):
+    """Yield render_report keyword arguments for every matching audit, reading responses per batch."""
+    sql, params = build_audits_query(start, end, site_id, template)
+    templates = {}
+    with engine.connect() as conn:
+        audits = conn.execute(sql, params).all()
+        for offset in range(0, len(audits), batch_size):
+            batch = audits[offset:offset + batch_size]
+            ids = [audit.id for audit in batch]
+
+            # Answers are placed by question_index: an audit without a row for some
+            # question (e.g. a legacy audit) shows N/A there instead of shifting the rest
+            responses = {}
+            for audit in batch:
+                if audit.template_version_id not in templates:
+                    templates[audit.template_version_id] = load_template(conn, audit.template_version_id)
+                template_dict = templates[audit.template_version_id][1]
+                responses[audit.id] = ["N/A"] * sum(len(c["questions"]) for c in template_dict["categories"])
+
+            placeholders = ", ".join(str(audit_id) for audit_id in ids)
+            for audit_id, question_index, response in conn.execute(text(RESPONSES_QUERY.format(ids=placeholders))):
+                answers = responses[audit_id]
+                if question_index < len(answers):
+                    answers[question_index] = response
+
+            for audit in batch:
+                version, template_dict = templates[audit.template_version_id]
+                yield {
+                    "audit_id": audit.id,
+                    "username": audit.full_name or str(audit.id),
+                    "template": template_dict,
+                    "responses": responses[audit.id],
+                    "site_id": audit.site_id or "Unknown",
+                    "timestamp": str(audit.timestamp)[:16],
+                    "version": version,
+                }
+
+
+def _render(job):
+    return job["audit_id"], job["username"], job["site_id"], render_report(**job)
+
+
+def archive_name(audit_id, username, site_id):
+    return f"audit_{audit_id}_{username.replace(' ', '_')}_{site_id}.pdf"
+
+
+def export_reports(output, start=None, end=None, site_id=None, template=None, workers=None, progress_every=100):
+    """Render the matching audits' reports across a process pool into a zip archive.
+
+    Reports already in the report cache are not rendered again. Returns
+    {'reports', 'seconds', 'reports_per_second', 'output'}.
+    """
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    count = 0
+
+    jobs = iter_report_jobs(start, end, site_id, template)
+    with ProcessPoolExecutor(max_workers=workers) as executor, \
+            zipfile.ZipFile(output, "w", compression=zipfile.ZIP_STORED) as archive:
+        pending = set()
+        exhausted = False
+        while pending or not exhausted:
+            # Keep a bounded number of jobs queued instead of submitting every audit at once
+            while not exhausted and len(pending) < workers * JOBS_PER_WORKER:
+                job = next(jobs, None)
+                if job is None:
+                    exhausted = True
+                else:
+                    pending.add(executor.submit(_render, job))
+            if not pending:
+                break
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                audit_id, username, audit_site_id, path = future.result()
+                # PDFs are already compressed, so they are stored as-is
+                archive.write(path, archive_name(audit_id, username, audit_site_id))
+                count += 1
+                if progress_every and count % progress_every == 0:
+                    elapsed = time.perf_counter() - started
+                    print(f"{count} reports, {count / elapsed:.1f} reports/s")
+
+    seconds = time.perf_counter() - started
+    return {
+        "reports": count,
+        "seconds": seconds,
+        "reports_per_second": count / seconds if seconds else 0.0,
+        "output": output,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export PDF reports of past audits into a zip archive.")
+    parser.add_argument("--output", default="audit_reports.zip")
+    parser.add_argument("--start", help="First audit date to include (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Last audit date to include (YYYY-MM-DD)")
+    parser.add_argument("--site", help="Only export audits of this site ID")
+    parser.add_argument("--template", help="Only export audits of this template title")
+    parser.add_argument("--workers", type=int, help="Render processes (default: number of CPUs)")
+    args = parser.parse_args()
+
+    init_db()
+    stats = export_reports(args.output, args.start, args.end, args.site, args.template, args.workers)
+    print(f"Exported {stats['reports']} reports to {stats['output']} "
+          f"in {stats['seconds']:.1f}s ({stats['reports_per_second']:.1f} reports/s)")
+
+
+if __name__ == "__main__":
+    main()
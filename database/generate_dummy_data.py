@@ -4,7 +4,7 @@ from datetime import datetime, timedelta
 from faker import Faker
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from models import Base, User, Audit, Response
+from models import Base, User, Audit, Response, init_db, rebuild_rollups, get_or_create_template_version, get_answer_code
 import os
 import numpy as np
 
@@ -18,6 +18,7 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 db_path = os.path.join(BASE_DIR, "safetyhub.db")
 engine = create_engine(f"sqlite:///{db_path}")
 Session = sessionmaker(bind=engine)
+init_db()
 session = Session()
 
 # Configuration
@@ -29,13 +30,18 @@ DAYS_BACK = 180  # 6 months of data
 # Load real checklist template
 template = load_template()
 
-# Flatten questions with category included
+# Questions are stored once per template version; responses reference them by id
+template_version = get_or_create_template_version(session, f"dummy:{template['template_name']}", template)
+session.commit()
+
+# Flatten questions with category and question id included
 flat_questions = []
 for category in template["categories"]:
     category_name = category["name"]
     for q in category["questions"]:
         q_copy = q.copy()
         q_copy['category'] = category_name
+        q_copy['question_id'] = template_version.questions[len(flat_questions)].id
         flat_questions.append(q_copy)
 
 # Define realistic response probabilities for each keyword
@@ -132,7 +138,8 @@ for audit_num in range(NUM_AUDITS):
     timestamp = fake.date_time_between(start_date=start_date, end_date="now")
     timestamp = timestamp.replace(hour=hour, minute=minute)
     
-    audit = Audit(user_id=user.telegram_id, site_id=site_id, timestamp=timestamp)
+    audit = Audit(user_id=user.telegram_id, site_id=site_id, timestamp=timestamp,
+                  template_version_id=template_version.id)
     session.add(audit)
     session.commit()
 
@@ -149,11 +156,8 @@ for audit_num in range(NUM_AUDITS):
         
         responses.append(Response(
             audit_id=audit.id,
-            category=q['category'],
-            question=q["question_en"],
-            question_ru=q["question_ru"],
-            keyword=q["keyword"],
-            response=response
+            question_id=q['question_id'],
+            answer=get_answer_code(session, response)
         ))
 
     session.add_all(responses)
@@ -163,4 +167,5 @@ print(f"✅ Successfully inserted:")
 print(f"- {NUM_USERS} users")
 print(f"- {NUM_AUDITS} audits")
 print(f"- Approximately {NUM_AUDITS * len(selected_questions)} responses")
+print(f"- {rebuild_rollups()} dashboard rollup rows rebuilt")
 session.close()
\ No newline at end of file
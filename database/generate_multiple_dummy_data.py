@@ -6,7 +6,7 @@ from faker import Faker
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 import numpy as np
-from models import Base, User, Audit, Response
+from models import Base, User, Audit, Response, init_db, rebuild_rollups, get_or_create_template_version, get_answer_code
 
 # --------------------------
 # Configuration
@@ -25,6 +25,7 @@ DAYS_BACK = 180
 
 engine = create_engine(f"sqlite:///{DB_PATH}")
 Session = sessionmaker(bind=engine)
+init_db()
 session = Session()
 
 
@@ -175,6 +176,9 @@ for idx in range(NUM_AUDITS):
     chosen_template = random.choice(TEMPLATES)
     template_name = chosen_template["template_name"] if "template_name" in chosen_template else chosen_template["name"]
     flat_qs = flatten_template(chosen_template)
+    template_version = get_or_create_template_version(session, f"dummy:{template_name}", chosen_template["data"])
+    for q, question in zip(flat_qs, template_version.questions):
+        q["question_id"] = question.id
 
     # Create timestamp weighted toward work hours
     hour = random.choices(
@@ -189,7 +193,8 @@ for idx in range(NUM_AUDITS):
         user_id=user.telegram_id,
         site_id=site_id,
         timestamp=timestamp,
-        title=template_name
+        title=template_name,
+        template_version_id=template_version.id
     )
     session.add(audit)
     session.commit()
@@ -202,11 +207,8 @@ for idx in range(NUM_AUDITS):
         ans = weighted_random_response(template_name, site_id, user.telegram_id)
         responses.append(Response(
             audit_id=audit.id,
-            category=q.get("category", "Unknown"),
-            question=q.get("question_en", q.get("question", "Unknown Question")),
-            question_ru=q.get("question_ru", ""),
-            keyword=q.get("keyword", q.get("key", q.get("id", "unknown_keyword"))),
-            response=ans
+            question_id=q["question_id"],
+            answer=get_answer_code(session, ans)
         ))
 
     session.add_all(responses)
@@ -216,4 +218,5 @@ print("✅ Generation complete!")
 print(f"- Templates used: {[t['name'] for t in TEMPLATES]}")
 print(f"- {NUM_USERS} users created")
 print(f"- {NUM_AUDITS} audits inserted")
+print(f"- {rebuild_rollups()} dashboard rollup rows rebuilt")
 session.close()
@@ -1,5 +1,8 @@
 # models.py
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import (
+    create_engine, event, inspect, insert, text, Column, Integer, SmallInteger, String, Text,
+    Date, DateTime, ForeignKey, Index, MetaData, Table, UniqueConstraint
+)
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
 from datetime import datetime
 import os
@@ -7,9 +10,39 @@ import os
 
 Base = declarative_base()
 
+# Applied to every new SQLite connection
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",       # readers (dashboard) no longer block the bot's writes
+    "synchronous": "NORMAL",     # safe with WAL, one fsync per checkpoint instead of per commit
+    "cache_size": -65536,        # 64 MB page cache (negative = KiB)
+    "mmap_size": 268435456,      # 256 MB memory-mapped reads
+    "temp_store": "MEMORY",
+}
+
+
+def create_sqlite_engine(path, read_only=False):
+    """SQLAlchemy engine for a SQLite file with the SafetyHub pragmas applied on connect.
+
+    read_only connections reject writes (PRAGMA query_only), for readers such
+    as the dashboard that share the file with the bot.
+    """
+    sqlite_engine = create_engine(f"sqlite:///{path}")
+
+    @event.listens_for(sqlite_engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+    return sqlite_engine
+
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 db_path = os.path.join(BASE_DIR, "safetyhub.db")
-engine = create_engine(f"sqlite:///{db_path}")
+engine = create_sqlite_engine(db_path)
 Session = sessionmaker(bind=engine)
 
 class User(Base):
@@ -27,24 +60,299 @@ class Audit(Base):
     user_id = Column(Integer, ForeignKey("users.telegram_id"))
     site_id = Column(String)
     title = Column(String, nullable=True)  # ✅ NEW COLUMN
+    template_version_id = Column(Integer, ForeignKey("template_versions.id"), nullable=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
     user = relationship("User", back_populates="audits")
     responses = relationship("Response", back_populates="audit")
+    template_version = relationship("TemplateVersion")
 
+    # Dashboard filters: date range alone or combined with template/site/engineer
+    __table_args__ = (
+        Index("ix_audits_timestamp", "timestamp"),
+        Index("ix_audits_title_timestamp", "title", "timestamp"),
+        Index("ix_audits_site_timestamp", "site_id", "timestamp"),
+        Index("ix_audits_user_timestamp", "user_id", "timestamp"),
+    )
 
-class Response(Base):
-    __tablename__ = "responses"
+
+class TemplateVersion(Base):
+    """One exact revision of a template; its questions are stored once, not per response."""
+    __tablename__ = "template_versions"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    audit_id = Column(Integer, ForeignKey("audits.id"))
-    question_index = Column(Integer)
+    version = Column(String, unique=True, nullable=False)  # content hash of the template
+    title = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    questions = relationship("Question", back_populates="template_version", order_by="Question.question_index")
+
+
+class Question(Base):
+    __tablename__ = "questions"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    template_version_id = Column(Integer, ForeignKey("template_versions.id"), nullable=False)
+    question_index = Column(Integer, nullable=False)
     category = Column(String)
     question = Column(Text)
-    question_ru = Column(String, nullable=True)  
-    keyword = Column(String)  
-    response = Column(Text)
+    question_ru = Column(String, nullable=True)
+    keyword = Column(String)
+
+    template_version = relationship("TemplateVersion", back_populates="questions")
+
+    __table_args__ = (
+        UniqueConstraint("template_version_id", "question_index", name="uq_question_position"),
+        Index("ix_questions_keyword", "keyword"),
+    )
+
+
+class AnswerOption(Base):
+    """Lookup of answer labels; responses store the small-integer code."""
+    __tablename__ = "answer_options"
+    code = Column(SmallInteger, primary_key=True)
+    label = Column(String, unique=True, nullable=False)
+
+
+# Seeded codes; other labels are added on first use
+DEFAULT_ANSWER_CODES = {"Yes": 1, "No": 2, "N/A": 3}
+
+
+class Response(Base):
+    __tablename__ = "responses"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    audit_id = Column(Integer, ForeignKey("audits.id"), nullable=False)
+    question_id = Column(Integer, ForeignKey("questions.id"), nullable=False)
+    answer = Column(SmallInteger, ForeignKey("answer_options.code"), nullable=False)
 
     audit = relationship("Audit", back_populates="responses")
+    question = relationship("Question")
+
+    __table_args__ = (
+        Index("ix_responses_audit_id", "audit_id"),
+        Index("ix_responses_question_id", "question_id"),
+    )
+
+
+# Read-only views over the normalized tables, kept out of Base.metadata so
+# create_all does not try to create them as tables
+view_metadata = MetaData()
+
+RESPONSE_DETAILS_VIEW = """
+CREATE VIEW IF NOT EXISTS response_details AS
+SELECT r.id              AS id,
+       r.audit_id        AS audit_id,
+       q.question_index  AS question_index,
+       q.category        AS category,
+       q.question        AS question,
+       q.question_ru     AS question_ru,
+       q.keyword         AS keyword,
+       ao.label          AS response
+FROM responses r
+JOIN questions q ON q.id = r.question_id
+JOIN answer_options ao ON ao.code = r.answer
+"""
+
+
+class ResponseDetail(Base):
+    """A response with its question text and answer label, in the pre-normalization shape."""
+    __table__ = Table(
+        "response_details", view_metadata,
+        Column("id", Integer, primary_key=True),
+        Column("audit_id", Integer),
+        Column("question_index", Integer),
+        Column("category", String),
+        Column("question", Text),
+        Column("question_ru", String),
+        Column("keyword", String),
+        Column("response", String),
+    )
+
+
+class ComplianceRollup(Base):
+    """Daily Yes/No/N/A counts per template, site, engineer and keyword."""
+    __tablename__ = "compliance_rollups"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    title = Column(String, nullable=False, default="")  # "" for audits without a template title
+    site_id = Column(String, nullable=False, default="")
+    user_id = Column(Integer, ForeignKey("users.telegram_id"))
+    keyword = Column(String, nullable=False, default="")  # "" for questions without a keyword
+    day = Column(Date)
+    yes_count = Column(Integer, nullable=False, default=0)
+    no_count = Column(Integer, nullable=False, default=0)
+    na_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("title", "site_id", "user_id", "keyword", "day", name="uq_compliance_rollup"),
+        Index("ix_compliance_rollups_day", "day"),
+    )
+
+
+ROLLUP_REBUILD_QUERY = """
+INSERT INTO compliance_rollups (title, site_id, user_id, keyword, day, yes_count, no_count, na_count)
+SELECT COALESCE(a.title, ''), COALESCE(a.site_id, ''), a.user_id, COALESCE(r.keyword, ''), DATE(a.timestamp),
+       SUM(r.response = 'Yes'), SUM(r.response = 'No'), SUM(COALESCE(r.response NOT IN ('Yes', 'No'), 1))
+FROM audits a
+JOIN response_details r ON r.audit_id = a.id
+GROUP BY 1, 2, 3, 4, 5
+"""
+
+
+def rebuild_rollups():
+    """Rebuild the compliance rollups from the full audit history; returns the number of rollup rows."""
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM compliance_rollups"))
+        conn.execute(text(ROLLUP_REBUILD_QUERY))
+        return conn.execute(text("SELECT COUNT(*) FROM compliance_rollups")).scalar()
+
+
+def get_or_create_template_version(session, version, template):
+    """TemplateVersion row for a template dict, inserting it and its questions on first use."""
+    template_version = session.query(TemplateVersion).filter_by(version=version).one_or_none()
+    if template_version is not None:
+        return template_version
+
+    template_version = TemplateVersion(version=version, title=template.get("template_name"))
+    session.add(template_version)
+    session.flush()
+
+    rows = []
+    for cat in template["categories"]:
+        for q in cat["questions"]:
+            rows.append({
+                "template_version_id": template_version.id,
+                "question_index": len(rows),
+                "category": cat["name"],
+                "question": q.get("question_en"),
+                "question_ru": q.get("question_ru"),
+                "keyword": q.get("keyword"),
+            })
+    if rows:
+        session.execute(insert(Question), rows)
+    return template_version
+
+
+def get_answer_code(session, label):
+    """Small-integer code of an answer label, adding unseen labels to answer_options."""
+    option = session.query(AnswerOption).filter_by(label=label).one_or_none()
+    if option is None:
+        next_code = (session.query(AnswerOption.code).order_by(AnswerOption.code.desc()).limit(1).scalar() or 0) + 1
+        option = AnswerOption(code=next_code, label=label)
+        session.add(option)
+        session.flush()
+    return option.code
+
+
+# Moves the pre-normalization responses table (question text repeated per row)
+# into template_versions/questions/responses. Legacy audits get one template
+# version per audit title, with questions numbered in order of first appearance.
+LEGACY_MIGRATION = [
+    "DROP INDEX IF EXISTS ix_responses_audit_id",
+    "DROP INDEX IF EXISTS ix_responses_keyword_response",
+    "ALTER TABLE responses RENAME TO responses_legacy",
+    None,  # create the normalized tables here
+    """
+    INSERT OR IGNORE INTO template_versions (version, title, created_at)
+    SELECT 'legacy:' || COALESCE(a.title, ''), a.title, MIN(a.timestamp)
+    FROM responses_legacy r JOIN audits a ON a.id = r.audit_id
+    GROUP BY a.title
+    """,
+    """
+    INSERT INTO questions (template_version_id, question_index, category, question, question_ru, keyword)
+    SELECT tv_id,
+           ROW_NUMBER() OVER (PARTITION BY tv_id ORDER BY first_index, first_id) - 1,
+           category, question, question_ru, keyword
+    FROM (
+        SELECT tv.id AS tv_id, r.category, r.question, r.question_ru, r.keyword,
+               MIN(COALESCE(r.question_index, 2147483647)) AS first_index, MIN(r.id) AS first_id
+        FROM responses_legacy r
+        JOIN audits a ON a.id = r.audit_id
+        JOIN template_versions tv ON tv.version = 'legacy:' || COALESCE(a.title, '')
+        GROUP BY tv.id, r.category, r.question, r.question_ru, r.keyword
+    )
+    """,
+    """
+    INSERT OR IGNORE INTO answer_options (code, label)
+    SELECT (SELECT COALESCE(MAX(code), 0) FROM answer_options) + ROW_NUMBER() OVER (ORDER BY label), label
+    FROM (SELECT DISTINCT COALESCE(response, 'N/A') AS label FROM responses_legacy)
+    WHERE label NOT IN (SELECT label FROM answer_options)
+    """,
+    """
+    INSERT INTO responses (id, audit_id, question_id, answer)
+    SELECT r.id, r.audit_id, q.id, ao.code
+    FROM responses_legacy r
+    JOIN audits a ON a.id = r.audit_id
+    JOIN template_versions tv ON tv.version = 'legacy:' || COALESCE(a.title, '')
+    JOIN questions q ON q.template_version_id = tv.id
+                    AND q.category IS r.category AND q.question IS r.question
+                    AND q.question_ru IS r.question_ru AND q.keyword IS r.keyword
+    JOIN answer_options ao ON ao.label = COALESCE(r.response, 'N/A')
+    """,
+    """
+    UPDATE audits SET template_version_id = (
+        SELECT tv.id FROM template_versions tv WHERE tv.version = 'legacy:' || COALESCE(audits.title, '')
+    )
+    WHERE template_version_id IS NULL AND id IN (SELECT audit_id FROM responses_legacy)
+    """,
+    "DROP TABLE responses_legacy",
+]
+
+
+def _migrate_schema():
+    """Upgrade databases created before the normalized response schema."""
+    inspector = inspect(engine)
+    tables = inspector.get_table_names()
+
+    if "audits" in tables:
+        audit_columns = {c["name"] for c in inspector.get_columns("audits")}
+        if "template_version_id" not in audit_columns:
+            with engine.begin() as conn:
+                conn.execute(text(
+                    "ALTER TABLE audits ADD COLUMN template_version_id INTEGER REFERENCES template_versions(id)"
+                ))
+
+    legacy = "responses" in tables and "question" in {c["name"] for c in inspector.get_columns("responses")}
+    if not legacy:
+        return False
+
+    with engine.begin() as conn:
+        for statement in LEGACY_MIGRATION:
+            if statement is None:
+                Base.metadata.create_all(conn)
+                _seed_answer_options(conn)
+            else:
+                conn.execute(text(statement))
+    return True
+
+
+def _seed_answer_options(conn):
+    for label, code in DEFAULT_ANSWER_CODES.items():
+        conn.execute(text("INSERT OR IGNORE INTO answer_options (code, label) VALUES (:code, :label)"),
+                     {"code": code, "label": label})
 
 
 def init_db():
+    """Create missing tables and bring existing databases up to the current schema."""
+    migrated = _migrate_schema()
     Base.metadata.create_all(engine)
+
+    # create_all skips indexes of tables that already exist
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+    with engine.begin() as conn:
+        _seed_answer_options(conn)
+        conn.execute(text(RESPONSE_DETAILS_VIEW))
+        conn.execute(text("PRAGMA optimize"))
+        # Databases upgraded from before the rollups have history but an empty rollup table;
+        # rollups built before keywords were coalesced hold duplicate NULL-keyword rows
+        needs_rollups = conn.execute(text(
+            "SELECT (NOT EXISTS (SELECT 1 FROM compliance_rollups) AND EXISTS (SELECT 1 FROM responses))"
+            " OR EXISTS (SELECT 1 FROM compliance_rollups WHERE keyword IS NULL)"
+        )).scalar()
+
+    if needs_rollups:
+        rebuild_rollups()
+
+    if migrated:
+        # Reclaim the space of the dropped legacy table
+        with engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
@@ -1,18 +1,168 @@
-import pandas as pd
-from sqlalchemy import create_engine
+import argparse
+import json
 import os
+import pandas as pd
+from sqlalchemy import text
+from models import create_sqlite_engine
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 db_path = os.path.join(BASE_DIR, "safetyhub.db")
-engine = create_engine(f"sqlite:///{db_path}")
+engine = create_sqlite_engine(db_path)
+
+# Highest exported audit id per output file, for --since-last; only unfiltered
+# exports record it, so the file holds every audit up to that id
+STATE_PATH = os.path.join(BASE_DIR, "export_state.json")
+
+# Rows fetched from the cursor and written per chunk (one Parquet row group each)
+CHUNK_SIZE = 100_000
 
 # Join audits + responses into a single table
 query = """
 SELECT a.id as audit_id, a.site_id, r.keyword, r.response
 FROM audits a
-JOIN responses r ON a.id = r.audit_id
+JOIN response_details r ON a.id = r.audit_id
+WHERE a.id > :since_audit_id
 """
-df = pd.read_sql(query, engine)
 
-df.to_csv("audits_export.csv", index=False)
-print("Exported", len(df), "rows")
+
+def build_query(args, since_audit_id):
+    sql = query
+    params = {"since_audit_id": since_audit_id}
+    if args.start:
+        sql += " AND a.timestamp >= :start"
+        params["start"] = args.start
+    if args.end:
+        # Inclusive end date
+        sql += " AND a.timestamp < DATE(:end, '+1 day')"
+        params["end"] = args.end
+    if args.template:
+        sql += " AND a.title = :title"
+        params["title"] = args.template
+    sql += " ORDER BY a.id, r.id"
+    return text(sql), params
+
+
+def is_filtered(args):
+    return bool(args.start or args.end or args.template)
+
+
+def load_state():
+    if not os.path.exists(STATE_PATH):
+        return {}
+    with open(STATE_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state):
+    with open(STATE_PATH, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+
+
+class CsvChunkWriter:
+    def __init__(self, path, append=False):
+        self.path = path
+        self.append = append and os.path.exists(path)
+        self.header = not self.append
+
+    def write(self, chunk):
+        chunk.to_csv(self.path, mode="a" if self.append else "w", header=self.header, index=False)
+        self.append = True
+        self.header = False
+
+    def close(self):
+        if self.header:
+            # No rows: still produce a file with the header
+            pd.DataFrame(columns=["audit_id", "site_id", "keyword", "response"]).to_csv(self.path, index=False)
+
+
+class ParquetChunkWriter:
+    """Writes each chunk as one row group of a zstd-compressed Parquet file.
+
+    Every chunk is converted with the same explicit schema: inferring it per
+    chunk turns a column that happens to be all NULL (e.g. site_id of older
+    audits) into a null-typed column the file's schema does not accept.
+    """
+
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet export requires pyarrow: pip install pyarrow")
+        self.pa = pa
+        self.pq = pq
+        self.path = path
+        self.schema = pa.schema([
+            ("audit_id", pa.int64()),
+            ("site_id", pa.string()),
+            ("keyword", pa.string()),
+            ("response", pa.string()),
+        ])
+        self.writer = None
+
+    def write(self, chunk):
+        table = self.pa.Table.from_pandas(chunk, schema=self.schema, preserve_index=False)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, self.schema, compression="zstd")
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def export(args):
+    state = load_state()
+    output = os.path.abspath(args.output or f"audits_export.{args.format}")
+    since_audit_id = state.get(output, 0) if args.since_last else 0
+
+    if args.format == "parquet":
+        # Parquet files cannot be appended to: incremental runs write a new part file
+        root, ext = os.path.splitext(output)
+        part = f"{root}-from-{since_audit_id + 1}{ext}" if since_audit_id else output
+        writer = ParquetChunkWriter(part)
+    else:
+        # Without a watermark the whole history is exported, so the file is rewritten
+        writer = CsvChunkWriter(output, append=bool(since_audit_id))
+    sql, params = build_query(args, since_audit_id)
+
+    rows = 0
+    last_audit_id = since_audit_id
+    with engine.connect() as conn:
+        conn = conn.execution_options(stream_results=True)
+        for chunk in pd.read_sql_query(sql, conn, params=params, chunksize=args.chunk_size):
+            if chunk.empty:
+                continue
+            writer.write(chunk)
+            rows += len(chunk)
+            last_audit_id = int(chunk["audit_id"].iloc[-1])
+    writer.close()
+
+    if is_filtered(args):
+        # The file was rewritten with a subset of the audits; a later --since-last run
+        # must start over instead of appending to it
+        state.pop(output, None)
+    else:
+        state[output] = last_audit_id
+    save_state(state)
+    print("Exported", rows, "rows to", writer.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export audit responses to CSV or Parquet in bounded-memory chunks.")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--output", help="Output file (default: audits_export.<format>)")
+    parser.add_argument("--start", help="First audit date to include (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Last audit date to include (YYYY-MM-DD)")
+    parser.add_argument("--template", help="Only export audits of this template title")
+    parser.add_argument("--since-last", action="store_true",
+                        help="Only export audits newer than the previous export to the same file")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+    if args.since_last and is_filtered(args):
+        parser.error("--since-last exports every new audit and cannot be combined with --start, --end or --template")
+    export(args)
+
+
+if __name__ == "__main__":
+    main()
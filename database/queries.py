@@ -0,0 +1,408 @@
+# database/queries.py
+import threading
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+# Low-cardinality columns are stored as categoricals to keep the frame compact
+CATEGORICAL_COLUMNS = ["site_id", "Keyword", "Response", "full_name"]
+
+# Column layout of the dashboard's response frame
+RESPONSE_COLUMNS = [
+    "Audit ID", "Category", "Keyword", "Question", "Response",
+    "Timestamp", "site_id", "full_name", "title"
+]
+
+# Number of rows pulled from the cursor per chunk
+CHUNK_SIZE = 50_000
+
+# audits ⋈ users ⋈ responses in one statement, aliased to the dashboard's column names
+RESPONSES_QUERY = """
+SELECT r.audit_id   AS "Audit ID",
+       r.category   AS "Category",
+       r.keyword    AS "Keyword",
+       r.question   AS "Question",
+       r.response   AS "Response",
+       a.timestamp  AS "Timestamp",
+       a.site_id    AS site_id,
+       u.full_name  AS full_name,
+       a.title      AS title
+FROM audits a
+JOIN users u ON u.telegram_id = a.user_id
+JOIN response_details r ON r.audit_id = a.id
+WHERE a.id > :since_audit_id
+ORDER BY a.timestamp DESC, r.id
+"""
+
+
+# The response frame is assembled from integer codes: responses are read as
+# (audit id, question id, answer code) triples and the text columns are looked
+# up from the much smaller audits, questions and answer_options tables
+FRAME_AUDITS_QUERY = """
+SELECT a.id AS audit_id, a.timestamp, a.site_id, u.full_name, a.title
+FROM audits a
+JOIN users u ON u.telegram_id = a.user_id
+WHERE a.id > :since_audit_id
+ORDER BY a.id
+"""
+
+FRAME_QUESTIONS_QUERY = "SELECT id, category, question, keyword FROM questions ORDER BY id"
+
+FRAME_ANSWERS_QUERY = "SELECT code, label FROM answer_options ORDER BY code"
+
+# Positional parameter: read through the DBAPI cursor, not SQLAlchemy rows.
+# Ordered by audit_id so the range is read from ix_responses_audit_id; ORDER BY id
+# alone makes SQLite scan the whole table even for a refresh of a few new audits
+FRAME_RESPONSES_QUERY = "SELECT audit_id, question_id, answer FROM responses WHERE audit_id > ? ORDER BY audit_id, id"
+
+
+def _lookup(ids: np.ndarray, values: np.ndarray):
+    """Positions of values in the sorted ids array, and a mask of the values that were found."""
+    positions = np.searchsorted(ids, values)
+    positions[positions >= len(ids)] = 0
+    return positions, ids[positions] == values if len(ids) else np.zeros(len(values), dtype=bool)
+
+
+def _categorical(values: pd.Series, positions: np.ndarray) -> pd.Categorical:
+    """values[positions] as a categorical with sorted categories, without hashing every row."""
+    codes, categories = pd.factorize(values, sort=True)
+    return pd.Categorical.from_codes(codes[positions], categories=categories)
+
+
+def load_responses_frame(engine, since_audit_id: int = 0, chunk_size: int = CHUNK_SIZE) -> pd.DataFrame:
+    """Load responses of audits newer than since_audit_id, newest audit first.
+
+    Responses are streamed as integer triples in chunks of chunk_size rows;
+    every other column is gathered by position from the per-audit and
+    per-question lookups, so no per-row strings are read from SQLite.
+    """
+    with engine.connect() as conn:
+        audits = pd.read_sql_query(text(FRAME_AUDITS_QUERY), conn, params={"since_audit_id": since_audit_id})
+        if audits.empty:
+            return pd.DataFrame(columns=RESPONSE_COLUMNS)
+        questions = pd.read_sql_query(text(FRAME_QUESTIONS_QUERY), conn)
+        answers = pd.read_sql_query(text(FRAME_ANSWERS_QUERY), conn)
+
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(FRAME_RESPONSES_QUERY, (since_audit_id,))
+            chunks = []
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                chunks.append(np.array(rows, dtype=np.int64))
+        finally:
+            cursor.close()
+
+    if not chunks:
+        return pd.DataFrame(columns=RESPONSE_COLUMNS)
+    codes = np.concatenate(chunks)
+
+    # Inner-join semantics: drop responses whose audit (e.g. inserted after the audits
+    # were read, or without a user), question or answer label is unknown
+    audit_pos, audit_found = _lookup(audits["audit_id"].to_numpy(np.int64), codes[:, 0])
+    question_pos, question_found = _lookup(questions["id"].to_numpy(np.int64), codes[:, 1])
+    answer_pos, answer_found = _lookup(answers["code"].to_numpy(np.int64), codes[:, 2])
+    keep = audit_found & question_found & answer_found
+    if not keep.all():
+        codes, audit_pos, question_pos, answer_pos = codes[keep], audit_pos[keep], question_pos[keep], answer_pos[keep]
+    if len(codes) == 0:
+        return pd.DataFrame(columns=RESPONSE_COLUMNS)
+
+    # Newest audit first, responses in insertion order within an audit (missing timestamps last)
+    timestamps = pd.to_datetime(audits["timestamp"])
+    sort_key = timestamps.to_numpy("datetime64[ns]").view(np.int64).copy()
+    sort_key[timestamps.isna().to_numpy()] = np.iinfo(np.int64).min + 1
+    order = np.argsort(-sort_key[audit_pos], kind="stable")
+    audit_pos, question_pos, answer_pos = audit_pos[order], question_pos[order], answer_pos[order]
+
+    return pd.DataFrame({
+        "Audit ID": codes[order, 0],
+        "Category": questions["category"].to_numpy(object)[question_pos],
+        "Keyword": _categorical(questions["keyword"], question_pos),
+        "Question": questions["question"].to_numpy(object)[question_pos],
+        "Response": _categorical(answers["label"], answer_pos),
+        "Timestamp": timestamps.to_numpy()[audit_pos],
+        "site_id": _categorical(audits["site_id"], audit_pos),
+        "full_name": _categorical(audits["full_name"], audit_pos),
+        "title": audits["title"].to_numpy(object)[audit_pos],
+    })
+
+
+class ResponseStore:
+    """Cached response frames, refreshed incrementally and partitioned by template and month.
+
+    The watermark is the highest audit id loaded so far; each refresh only
+    fetches newer audits and prepends them to their partitions. select()
+    only touches the partitions a filter can match, and all partitions share
+    one categorical dtype per column so combining them does not re-encode.
+    """
+
+    # Recent select() results kept until the next refresh
+    SELECTION_CACHE_SIZE = 8
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.partitions = {}  # (title or "", month Period) -> frame, newest first
+        self.watermark = 0
+        self._dtypes = {}
+        self._selections = {}
+        self._lock = threading.Lock()
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """Every loaded response, newest month first."""
+        return self.select()
+
+    def _unify_categories(self, new_rows: pd.DataFrame):
+        """Give new_rows and every partition the same categories for each categorical column."""
+        for col in CATEGORICAL_COLUMNS:
+            known = self._dtypes.get(col)
+            new_categories = new_rows[col].cat.categories
+            if known is not None:
+                added = new_categories.difference(known.categories)
+                if len(added) == 0:
+                    new_rows[col] = new_rows[col].cat.set_categories(known.categories)
+                    continue
+                # Appending keeps the existing codes valid, so partitions are not re-encoded
+                categories = known.categories.append(added)
+            else:
+                categories = new_categories
+            dtype = pd.CategoricalDtype(categories)
+            self._dtypes[col] = dtype
+            new_rows[col] = new_rows[col].cat.set_categories(categories)
+            for part in self.partitions.values():
+                part[col] = part[col].cat.set_categories(categories)
+
+    def refresh(self) -> int:
+        """Add audits newer than the watermark; returns the number of new rows."""
+        with self._lock:
+            new_rows = load_responses_frame(self.engine, since_audit_id=self.watermark)
+            if new_rows.empty:
+                return 0
+
+            self._unify_categories(new_rows)
+            keys = [new_rows["title"].fillna(""), new_rows["Timestamp"].dt.to_period("M")]
+            for key, part in new_rows.groupby(keys, sort=False):
+                existing = self.partitions.get(key)
+                part = part.reset_index(drop=True)
+                # Newest audits first, matching the ORDER BY of the full load
+                self.partitions[key] = part if existing is None else pd.concat([part, existing], ignore_index=True)
+
+            self.watermark = int(new_rows["Audit ID"].max())
+            self._selections.clear()
+            return len(new_rows)
+
+    def select(self, title=None, site_id=None, full_name=None, start_date=None, end_date=None) -> pd.DataFrame:
+        """Responses matching the dashboard filters (None = no filter; dates inclusive).
+
+        The result is shared between callers and must not be modified in place.
+        """
+        key = (title, site_id, full_name, start_date, end_date)
+        with self._lock:
+            cached = self._selections.get(key)
+            if cached is not None:
+                return cached
+
+            start = pd.Timestamp(start_date) if start_date is not None else None
+            # Inclusive end date: everything before the following midnight
+            end = pd.Timestamp(end_date) + pd.Timedelta(days=1) if end_date is not None else None
+            start_month = start.to_period("M") if start is not None else None
+            end_month = (end - pd.Timedelta(microseconds=1)).to_period("M") if end is not None else None
+
+            frames = []
+            for (part_title, month), part in sorted(self.partitions.items(), key=lambda item: item[0][1], reverse=True):
+                if title is not None and part_title != title:
+                    continue
+                if start_month is not None and month < start_month:
+                    continue
+                if end_month is not None and month > end_month:
+                    continue
+                # Only partitions in the boundary months need a timestamp comparison
+                if month == start_month or month == end_month:
+                    timestamps = part["Timestamp"]
+                    mask = pd.Series(True, index=part.index)
+                    if start is not None:
+                        mask &= timestamps >= start
+                    if end is not None:
+                        mask &= timestamps < end
+                    part = part[mask]
+                if site_id is not None:
+                    part = part[part["site_id"] == site_id]
+                if full_name is not None:
+                    part = part[part["full_name"] == full_name]
+                frames.append(part)
+
+            if frames:
+                selection = pd.concat(frames, ignore_index=True)
+            else:
+                selection = pd.DataFrame(columns=RESPONSE_COLUMNS)
+
+            if len(self._selections) >= self.SELECTION_CACHE_SIZE:
+                self._selections.pop(next(iter(self._selections)))
+            self._selections[key] = selection
+            return selection
+
+
+# Answer columns of the compliance rollups, in display order
+ROLLUP_RESPONSES = ["Yes", "No", "N/A"]
+
+ROLLUP_QUERY = """
+SELECT cr.title      AS title,
+       cr.site_id    AS site_id,
+       u.full_name   AS full_name,
+       cr.keyword    AS "Keyword",
+       cr.day        AS day,
+       cr.yes_count  AS "Yes",
+       cr.no_count   AS "No",
+       cr.na_count   AS "N/A"
+FROM compliance_rollups cr
+JOIN users u ON u.telegram_id = cr.user_id
+WHERE cr.day BETWEEN :start_date AND :end_date
+"""
+
+
+def load_rollups(engine, start_date, end_date, title=None, site_id=None, full_name=None) -> pd.DataFrame:
+    """Load the daily compliance rollups matching the dashboard filters."""
+    query = ROLLUP_QUERY
+    params = {"start_date": start_date.isoformat(), "end_date": end_date.isoformat()}
+    if title is not None:
+        query += " AND cr.title = :title"
+        params["title"] = title
+    if site_id is not None:
+        query += " AND cr.site_id = :site_id"
+        params["site_id"] = site_id
+    if full_name is not None:
+        query += " AND u.full_name = :full_name"
+        params["full_name"] = full_name
+
+    with engine.connect() as conn:
+        rollups = pd.read_sql_query(text(query), conn, params=params)
+    rollups["day"] = pd.to_datetime(rollups["day"])
+    return rollups
+
+
+def rollups_from_responses(df: pd.DataFrame) -> pd.DataFrame:
+    """Daily Yes/No/N/A counts computed from response rows, shaped like load_rollups().
+
+    Fallback for databases whose rollup table has not been built yet.
+    """
+    response = df["Response"].astype(object)
+    rows = pd.DataFrame({
+        "title": df["title"].fillna(""),
+        "site_id": df["site_id"].astype(object).fillna(""),
+        "full_name": df["full_name"].astype(object),
+        "Keyword": df["Keyword"].astype(object).fillna(""),
+        "day": df["Timestamp"].dt.normalize(),
+        "Yes": response.eq("Yes"),
+        "No": response.eq("No"),
+    })
+    rows["N/A"] = ~(rows["Yes"] | rows["No"])
+    keys = ["title", "site_id", "full_name", "Keyword", "day"]
+    return rows.groupby(keys, dropna=False, sort=False)[ROLLUP_RESPONSES].sum().reset_index()
+
+
+def sum_rollups(rollups: pd.DataFrame, keys) -> pd.DataFrame:
+    """Yes/No/N/A totals of the rollups grouped by keys, shaped like an unstacked Response count."""
+    counts = rollups.groupby(keys)[ROLLUP_RESPONSES].sum()
+    counts.columns.name = "Response"
+    return counts
+
+
+def compliance_table(df: pd.DataFrame, key: str) -> pd.DataFrame:
+    """Audits, responses, Yes answers and compliance rate (% Yes) per value of key, in one grouped pass."""
+    columns = pd.DataFrame({
+        key: df[key],
+        "audit_id": df["Audit ID"],
+        "is_yes": df["Response"] == "Yes",
+    })
+    table = columns.groupby(key, observed=True).agg(
+        audits=("audit_id", "nunique"),
+        responses=("is_yes", "size"),
+        yes=("is_yes", "sum"),
+    )
+    table["compliance_rate"] = table["yes"] / table["responses"] * 100
+    return table
+
+
+# Filter dropdown values; each is answered from an index on audits
+FILTER_OPTION_QUERIES = {
+    "titles": "SELECT DISTINCT title FROM audits WHERE title IS NOT NULL ORDER BY title",
+    "sites": "SELECT DISTINCT site_id FROM audits WHERE site_id IS NOT NULL ORDER BY site_id",
+    "engineers": """
+        SELECT DISTINCT u.full_name
+        FROM users u
+        WHERE u.full_name IS NOT NULL
+          AND EXISTS (SELECT 1 FROM audits a WHERE a.user_id = u.telegram_id)
+        ORDER BY u.full_name
+    """,
+}
+
+AUDIT_LIST_QUERY = """
+SELECT a.id          AS audit_id,
+       u.full_name   AS full_name,
+       a.site_id     AS site_id,
+       a.timestamp   AS timestamp
+FROM audits a
+JOIN users u ON u.telegram_id = a.user_id
+WHERE a.timestamp >= :start AND a.timestamp < :end
+"""
+
+AUDIT_RESPONSES_QUERY = """
+SELECT category AS "Category", keyword AS "Keyword", question AS "Question", response AS "Response"
+FROM response_details
+WHERE audit_id = :audit_id
+ORDER BY id
+"""
+
+
+def latest_audit_id(engine) -> int:
+    """Highest audit id; a primary-key lookup used to detect new audits cheaply."""
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM audits")).scalar()
+
+
+def load_filter_options(engine) -> dict:
+    """Distinct templates, sites and engineers plus the audit date range, for the sidebar."""
+    with engine.connect() as conn:
+        options = {
+            name: [row[0] for row in conn.execute(text(query))]
+            for name, query in FILTER_OPTION_QUERIES.items()
+        }
+        first, last = conn.execute(text("SELECT MIN(timestamp), MAX(timestamp) FROM audits")).one()
+    options["min_date"] = pd.to_datetime(first).date() if first else None
+    options["max_date"] = pd.to_datetime(last).date() if last else None
+    return options
+
+
+def load_audit_list(engine, start_date, end_date, title=None, site_id=None, full_name=None) -> pd.DataFrame:
+    """audit_id, full_name, site_id and timestamp of matching audits, newest first."""
+    query = AUDIT_LIST_QUERY
+    params = {
+        "start": start_date.isoformat(),
+        # Inclusive end date; compares against the indexed column instead of DATE(timestamp)
+        "end": (end_date + timedelta(days=1)).isoformat(),
+    }
+    if title is not None:
+        query += " AND a.title = :title"
+        params["title"] = title
+    if site_id is not None:
+        query += " AND a.site_id = :site_id"
+        params["site_id"] = site_id
+    if full_name is not None:
+        query += " AND u.full_name = :full_name"
+        params["full_name"] = full_name
+    query += " ORDER BY a.timestamp DESC"
+
+    with engine.connect() as conn:
+        audits = pd.read_sql_query(text(query), conn, params=params)
+    audits["timestamp"] = pd.to_datetime(audits["timestamp"])
+    return audits
+
+
+def load_audit_responses(engine, audit_id: int) -> pd.DataFrame:
+    """Category, Keyword, Question and Response of one audit in question order."""
+    with engine.connect() as conn:
+        return pd.read_sql_query(text(AUDIT_RESPONSES_QUERY), conn, params={"audit_id": audit_id})
@@ -3,8 +3,12 @@ import os
 import json
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, MessageHandler, filters, CommandHandler
-from utils.audit_parser import parse_audit_pdf_openai
-from utils.template_manager import get_available_templates, set_active_template, get_active_template, get_template_info
+from utils.audit_parser import parse_audit_pdf_openai_async
+from utils.template_manager import (
+    get_available_templates, set_active_template, get_active_template,
+    get_active_template_filename, get_template_info
+)
+from utils.workers import get_worker_metrics
 
 ADMIN_IDS = [6015506522]  # replace with real admin Telegram IDs
 
@@ -29,13 +33,20 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
     file_path = os.path.join("uploads", document.file_name)
     await file.download_to_drive(file_path)
 
-    await update.message.reply_text("🔄 Processing file with OpenAI... this may take a moment.")
-    checklist = parse_audit_pdf_openai(file_path)
+    status_message = await update.message.reply_text("🔄 Processing file with OpenAI... this may take a moment.")
+
+    async def report_progress(text):
+        await status_message.edit_text(text)
+
+    # Extraction runs in a worker and the OpenAI call is async, so other users keep auditing
+    checklist = await parse_audit_pdf_openai_async(file_path, progress=report_progress)
 
     if not checklist:
-        await update.message.reply_text("❌ Failed to process audit. Try again.")
+        await status_message.edit_text("❌ Failed to process audit. Try again.")
         return
 
+    await status_message.edit_text("✅ Checklist generated.")
+
     # ✅ Store checklist temporarily and ask for a name
     context.user_data["pending_checklist"] = checklist
     await update.message.reply_text("✏️ Please enter a name for this audit template:")
@@ -84,19 +95,7 @@ async def list_templates(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # Get current active template
-    active_template = get_active_template()
-    active_filename = None
-    if active_template:
-        # Find the filename of the active template
-        for template in templates:
-            try:
-                with open(template['filepath'], 'r', encoding='utf-8') as f:
-                    template_data = json.load(f)
-                    if template_data.get('template_name') == active_template.get('template_name'):
-                        active_filename = template['filename']
-                        break
-            except:
-                continue
+    active_filename = get_active_template_filename()
 
     message = "📋 **Available Templates:**\n\n"
     for template in templates:
@@ -172,3 +171,19 @@ async def current_template(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "Use `/list_templates` to see all available templates.",
         parse_mode="Markdown"
     )
+
+async def worker_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show queue depth and job latency of the background worker pools."""
+    user_id = update.effective_user.id
+    if not is_admin(user_id):
+        await update.message.reply_text("⛔ You are not authorized to view worker statistics.")
+        return
+
+    message = "⚙️ Worker pools:\n\n"
+    for m in get_worker_metrics():
+        message += (
+            f"{m['name']}: queued {m['queue_depth']} | running {m['running']}\n"
+            f"   done {m['completed']} | failed {m['failed']} | pool restarts {m['restarts']}\n"
+            f"   latency p50 {m['latency_p50']:.2f}s | p99 {m['latency_p99']:.2f}s\n\n"
+        )
+    await update.message.reply_text(message)
@@ -1,94 +1,126 @@
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+import asyncio
+import logging
+from datetime import datetime
+from telegram import Update
 from telegram.ext import ContextTypes
-from utils.template_loader import load_template
-from utils.pdf_generator import generate_pdf
-from database.db import upsert_user, create_audit, save_responses
+from utils.template_loader import load_compiled_template
+from utils.template_manager import get_compiled_template
+from utils.session_store import create_session_store, get_answer, set_answer, decode_answers
+from utils.pdf_generator import render_report
+from database.db import persist_completed_audit
+from utils.workers import io_pool, cpu_pool
 from database.models import Session , init_db
 
 
-# In-memory user state
-user_states = {}
+logger = logging.getLogger(__name__)
 
-def get_flat_questions(template):
-    return [q for cat in template["categories"] for q in cat["questions"]]
+# Per-user audit state; references the template by version and keeps answers as option codes
+session_store = create_session_store()
+
+# Users whose finished audit is being saved right now. Kept in process memory rather than
+# in the session, so a restart mid-save cannot leave a session stuck in this state
+submitting_users = set()
+
+# Seconds between sweeps for abandoned audit sessions
+EVICTION_INTERVAL = 600
+
+async def evict_expired_sessions():
+    """Background loop that drops audit sessions idle for longer than their TTL."""
+    while True:
+        await asyncio.sleep(EVICTION_INTERVAL)
+        removed = session_store.evict_expired()
+        if removed:
+            logger.info(f"Evicted {removed} expired audit sessions")
 
 async def start_audit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    user_states[user_id] = {"awaiting_name": True}
+    session_store.save(user_id, {"awaiting_name": True})
     await update.message.reply_text("👷 Please enter your full name:")
 
-def build_question_keyboard(question, selected_answer, current_index, total_questions):
-    option_buttons = [
-        InlineKeyboardButton(
-            f"{'✅ ' if opt == selected_answer else ''}{opt}",
-            callback_data=f"answer:{opt}"
-        ) for opt in question["options"]
-    ]
-
-    nav_buttons = []
-    if current_index > 0:
-        nav_buttons.append(InlineKeyboardButton("⬅️ Previous", callback_data="nav:prev"))
-
-    if current_index < total_questions - 1:
-        if selected_answer:
-            nav_buttons.append(InlineKeyboardButton("➡️ Next", callback_data="nav:next"))
-    else:
-        # Always show the generate button on the last question
-        if selected_answer:
-            nav_buttons.append(InlineKeyboardButton("Generate Report", callback_data="generate"))
-
-
-    return InlineKeyboardMarkup([
-        option_buttons,
-        nav_buttons
-    ])
-
-async def send_next_question(update, context, user_id):
-    state = user_states[user_id]
-    flat_questions = get_flat_questions(state["template"])
+async def send_next_question(update, context, user_id, state):
+    compiled = get_compiled_template(state["template_version"])
     index = state["current_index"]
 
-    if index >= len(flat_questions):
+    if compiled is None:
+        # The template was changed on disk since this audit started
+        session_store.delete(user_id)
+        await context.bot.send_message(chat_id=user_id, text="Session expired. Please /start again.")
+        return
+
+    if index >= len(compiled):
+        if user_id in submitting_users:
+            # A previous click is already saving this audit
+            return
+        responses = decode_answers(state, compiled)
+
         # Save responses to DB
         full_name = state.get("full_name", str(user_id))
         site_id = state.get("site_id", "Unknown")
         template_name = state.get("template_name", "Unknown Template")  # ✅ Get template name
         
-        upsert_user(user_id, full_name, site_id)
-        
-        # ✅ Pass template title when creating audit
-        audit_id = create_audit(
-            telegram_id=user_id, 
-            site_id=site_id,
-            title=template_name  # ✅ KEY FIX: Store template name
-        )
-        save_responses(audit_id, state["template"], state["responses"])
+        # User, audit (with template title) and responses are written in one transaction,
+        # in a worker thread so other users' callbacks keep being answered. The session is
+        # kept until the audit is written, so a failed write can be retried
+        completed_at = datetime.utcnow()
+        submitting_users.add(user_id)
+        try:
+            audit_id = await io_pool.run(
+                persist_completed_audit,
+                telegram_id=user_id,
+                full_name=full_name,
+                site_id=site_id,
+                template=compiled.template,
+                responses=responses,
+                title=template_name,
+                timestamp=completed_at
+            )
+        except Exception:
+            logger.exception(f"Saving the audit of user {user_id} failed")
+            state["current_index"] = len(compiled) - 1
+            session_store.save(user_id, state)
+            await context.bot.send_message(
+                chat_id=user_id,
+                text="❌ The audit could not be saved. Your answers are kept, press Generate Report to try again."
+            )
+            await send_next_question(update, context, user_id, state)
+            return
+        finally:
+            submitting_users.discard(user_id)
+        session_store.delete(user_id)
 
         await context.bot.send_message(chat_id=user_id, text="✅ Audit complete! Generating PDF...")
-        pdf_path = generate_pdf(
-            username=full_name,
-            template=state["template"],
-            responses=state["responses"],
-            site_id=site_id
-        )
+        try:
+            # Rendered into the report cache under the same key as the bulk export uses, so later
+            # downloads of this audit reuse the file; any file already there is stale and replaced
+            pdf_path = await cpu_pool.run(
+                render_report,
+                audit_id=audit_id,
+                username=full_name,
+                template=compiled.template,
+                responses=responses,
+                site_id=site_id,
+                timestamp=str(completed_at)[:16],
+                version=compiled.version,
+                overwrite=True
+            )
+        except Exception:
+            logger.exception(f"Rendering the report of audit {audit_id} failed")
+            await context.bot.send_message(
+                chat_id=user_id,
+                text="⚠️ The audit was saved, but the PDF report could not be generated. Use /start to start a new audit."
+            )
+            return
+        filename = f"audit_{full_name.replace(' ', '_')}_{site_id}_{audit_id}.pdf"
         with open(pdf_path, "rb") as pdf_file:
-            await context.bot.send_document(chat_id=user_id, document=pdf_file)
+            await context.bot.send_document(chat_id=user_id, document=pdf_file, filename=filename)
         await context.bot.send_message(chat_id=user_id, text="Use /start to start a new audit.")
-        user_states.pop(user_id, None)
         return
 
-    q = flat_questions[index]
-    selected_answer = state["responses"][index] if index < len(state["responses"]) else None
-    total_questions = len(flat_questions)
-
-    keyboard = build_question_keyboard(
-        question=q,
-        selected_answer=selected_answer,
-        current_index=index,
-        total_questions=total_questions
-    )
-
-    question_text = f"Q{index + 1} of {total_questions}: {q['question_en']}\n\n {q['question_ru']}"
+    # Question text and keyboards are prebuilt once per template
+    q = compiled.questions[index]
+    selected_answer = get_answer(state, compiled, index)
+    keyboard = compiled.keyboard(index, selected_answer)
+    question_text = q.text
 
     try:
         if "last_message_id" in state:
@@ -98,6 +130,7 @@ async def send_next_question(update, context, user_id):
                 text=question_text,
                 reply_markup=keyboard
             )
+            session_store.save(user_id, state)
             return
     except Exception:
         try:
@@ -107,50 +140,53 @@ async def send_next_question(update, context, user_id):
 
     msg = await context.bot.send_message(chat_id=user_id, text=question_text, reply_markup=keyboard)
     state["last_message_id"] = msg.message_id
+    session_store.save(user_id, state)
 
 async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
+    user_id = query.from_user.id
+    if user_id in submitting_users:
+        # The audit is being saved; answers can no longer change
+        await query.answer("Saving…")
+        return
     await query.answer()
 
-    user_id = query.from_user.id
-    state = user_states.get(user_id)
-    if not state:
+    state = session_store.get(user_id)
+    if not state or "template_version" not in state:
         await query.edit_message_text("Session expired. Please /start again.")
         return
 
     data = query.data
     index = state["current_index"]
-    flat_questions = get_flat_questions(state["template"])
 
     if data.startswith("answer:"):
         answer = data.split("answer:")[1]
+        compiled = get_compiled_template(state["template_version"])
 
-        if len(state["responses"]) <= index:
-            state["responses"] += [None] * (index - len(state["responses"]) + 1)
-
-        state["responses"][index] = answer
+        if compiled is not None and index < len(compiled):
+            set_answer(state, compiled, index, answer)
         state["current_index"] += 1
-        await send_next_question(query, context, user_id)
+        await send_next_question(query, context, user_id, state)
 
     elif data == "nav:next":
         state["current_index"] += 1
-        await send_next_question(query, context, user_id)
+        await send_next_question(query, context, user_id, state)
 
     elif data == "nav:prev":
         if index > 0:
             state["current_index"] -= 1
-            await send_next_question(query, context, user_id)
+            await send_next_question(query, context, user_id, state)
         else:
             await query.answer("This is the first question.", show_alert=True)
 
     elif data == "generate":
         state["current_index"] += 1
-        await send_next_question(query, context, user_id)
+        await send_next_question(query, context, user_id, state)
 
 async def handle_response(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     message = update.message.text.strip()
-    state = user_states.get(user_id)
+    state = session_store.get(user_id)
 
     if not state:
         await update.message.reply_text("Session expired. Please /start again.")
@@ -160,6 +196,7 @@ async def handle_response(update: Update, context: ContextTypes.DEFAULT_TYPE):
         state["full_name"] = message
         state["awaiting_name"] = False
         state["awaiting_site_id"] = True
+        session_store.save(user_id, state)
         await update.message.reply_text("📍 Now enter the Site ID:")
         return
 
@@ -167,21 +204,22 @@ async def handle_response(update: Update, context: ContextTypes.DEFAULT_TYPE):
         state["site_id"] = message
         state["awaiting_site_id"] = False
 
-        # ✅ Load template and extract template name
-        template = load_template()
-        template_name = template.get("template_name", "Unknown Template")  # ✅ KEY FIX
+        # ✅ Load the compiled template and extract template name
+        compiled = load_compiled_template()
+        template_name = compiled.name  # ✅ KEY FIX
         
         state.update({
-            "template": template,
+            "template_version": compiled.version,
             "template_name": template_name,  # ✅ Store template name in state
             "current_index": 0,
-            "responses": []
+            "answers": bytearray(len(compiled))
         })
+        session_store.save(user_id, state)
 
         await update.message.reply_text(
             f"✅ Thanks, {state['full_name']}!\n📄 Starting audit for Site ID: {state['site_id']}\n📋 Template: {template_name}"
         )
-        await send_next_question(update, context, user_id)
+        await send_next_question(update, context, user_id, state)
         return
 
     await update.message.reply_text("Please use the buttons to respond.")
\ No newline at end of file
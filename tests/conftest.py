@@ -0,0 +1,173 @@
+# tests/conftest.py
+# Tests run from the project root: python -m pytest
+# The dashboard modules import their siblings by bare name (from models import ...),
+# so database/ is put on sys.path next to the project root.
+import json
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "database")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# Multiplies the row counts of the benchmark tests; the defaults run in seconds
+BENCH_SCALE = float(os.getenv("BENCH_SCALE", "1"))
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Empty SafetyHub database in tmp_path; database.models and database.db are pointed at it."""
+    from database import models, db as db_module
+
+    engine = models.create_sqlite_engine(str(tmp_path / "safetyhub.db"))
+    session_factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(models, "engine", engine)
+    monkeypatch.setattr(models, "Session", session_factory)
+    monkeypatch.setattr(db_module, "Session", session_factory)
+    monkeypatch.setattr(db_module, "_template_question_cache", {})
+    monkeypatch.setattr(db_module, "_answer_code_cache", {})
+    models.init_db()
+    yield engine
+    engine.dispose()
+
+
+def make_history(engine, audits, questions=50, users=50, sites=15, titles=("Site Risk Assessment",),
+                 answered=1.0, days=365, seed=0):
+    """Insert random audits through executemany; returns the number of responses.
+
+    answered is the share of each audit's questions that get a response row.
+    """
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    answers = [1, 1, 1, 2, 3]  # Yes-heavy, like real audits
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (telegram_id, full_name, site_id) VALUES (:id, :name, :site)"), [
+            {"id": 1000 + i, "name": f"Engineer {i:03}", "site": f"SITE-{i % sites:03}"} for i in range(users)
+        ])
+        question_ids = {}
+        for title in titles:
+            version_id = conn.execute(
+                text("INSERT INTO template_versions (version, title, created_at) VALUES (:v, :t, :c)"),
+                {"v": f"test:{title}", "t": title, "c": start}
+            ).lastrowid
+            conn.execute(text("""
+                INSERT INTO questions (template_version_id, question_index, category, question, question_ru, keyword)
+                VALUES (:tv, :i, :category, :question, :question, :keyword)
+            """), [
+                {"tv": version_id, "i": i, "category": f"Category {i // 10}",
+                 "question": f"Question {i}?", "keyword": f"keyword_{i}"}
+                for i in range(questions)
+            ])
+            ids = conn.execute(
+                text("SELECT id FROM questions WHERE template_version_id = :tv ORDER BY question_index"),
+                {"tv": version_id}
+            ).scalars().all()
+            question_ids[title] = (version_id, ids)
+
+        audit_rows = []
+        for _ in range(audits):
+            title = rng.choice(titles)
+            audit_rows.append({
+                "user_id": 1000 + rng.randrange(users),
+                "site_id": f"SITE-{rng.randrange(sites):03}",
+                "title": title,
+                "tv": question_ids[title][0],
+                "ts": start + timedelta(minutes=rng.randrange(days * 24 * 60)),
+            })
+        conn.execute(text("""
+            INSERT INTO audits (user_id, site_id, title, template_version_id, timestamp)
+            VALUES (:user_id, :site_id, :title, :tv, :ts)
+        """), audit_rows)
+
+        response_rows = []
+        audit_ids = conn.execute(text("SELECT id, title FROM audits ORDER BY id")).all()
+        for audit_id, title in audit_ids:
+            for question_id in question_ids[title][1]:
+                if answered >= 1.0 or rng.random() < answered:
+                    response_rows.append({"a": audit_id, "q": question_id, "ans": rng.choice(answers)})
+        conn.execute(text("INSERT INTO responses (audit_id, question_id, answer) VALUES (:a, :q, :ans)"),
+                     response_rows)
+    return len(response_rows)
+
+
+class OpenAIStub:
+    """Local chat-completions server standing in for the OpenAI API.
+
+    Requests are answered with replies[n] (the last one repeats), after
+    delays[n] seconds if given; stream=true requests get one SSE chunk per word.
+    """
+
+    def __init__(self):
+        self.replies = ["Stub answer"]
+        self.delays = []
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                n = len(stub.requests)
+                stub.requests.append(body)
+                if n < len(stub.delays):
+                    time.sleep(stub.delays[n])
+                reply = stub.replies[min(n, len(stub.replies) - 1)]
+                try:
+                    if body.get("stream"):
+                        self._stream(body, reply)
+                    else:
+                        self._complete(body, reply)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The client gave up waiting
+
+            def _complete(self, body, reply):
+                payload = json.dumps({
+                    "id": "stub", "object": "chat.completion", "created": 0, "model": body["model"],
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": reply}}],
+                    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, body, reply):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for word in reply.split(" "):
+                    chunk = {"id": "stub", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                             "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.write(b"data: [DONE]\n\n")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}/v1"
+
+
+@pytest.fixture
+def openai_stub(monkeypatch):
+    """A running OpenAIStub; OPENAI_BASE_URL and OPENAI_API_KEY point new clients at it."""
+    stub = OpenAIStub()
+    thread = threading.Thread(target=stub.server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("OPENAI_BASE_URL", stub.base_url)
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    yield stub
+    stub.server.shutdown()
+    stub.server.server_close()
@@ -0,0 +1,115 @@
+import random
+
+import pandas as pd
+
+from ai_context import (
+    MESSAGE_OVERHEAD_TOKENS, build_data_context, build_messages, count_tokens, rank_compliance, system_prompt
+)
+
+SYSTEM = "You are SafetyBot. Data context: 1,200 audits, 91.5% compliance."
+
+
+def conversation(turns):
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"Question {i}: which sites missed the harness check? " * (1 + i % 3)})
+        history.append({"role": "assistant", "content": f"Answer {i}: SITE-003 and SITE-011 missed it. " * (2 + i % 5)})
+    return history
+
+
+def prompt_tokens(messages):
+    return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def compliance(engineers, seed=0):
+    """A compliance_table-shaped frame for the given number of engineers."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(engineers):
+        audits = rng.randint(1, 60)
+        responses = audits * 12
+        yes = rng.randint(responses // 2, responses)
+        rows.append({"full_name": f"Engineer {i:05}", "audits": audits, "responses": responses, "yes": yes})
+    table = pd.DataFrame(rows, columns=["full_name", "audits", "responses", "yes"]).set_index("full_name")
+    table = table.astype("int64")
+    table["compliance_rate"] = table["yes"] / table["responses"] * 100
+    return table
+
+
+def test_history_is_trimmed_oldest_first_to_fit_the_budget():
+    history = conversation(40)
+    budget = 600
+
+    messages, used = build_messages(SYSTEM, history, budget)
+    assert used == prompt_tokens(messages) <= budget
+    assert messages[0] == {"role": "system", "content": SYSTEM}
+    kept = messages[1:]
+    assert 0 < len(kept) < len(history)
+    # The newest messages are kept, in order, and the next older one would not have fitted
+    assert kept == history[-len(kept):]
+    dropped = history[-len(kept) - 1]
+    assert used + count_tokens(dropped["content"]) + MESSAGE_OVERHEAD_TOKENS > budget
+
+
+def test_short_history_is_sent_whole():
+    history = conversation(3)
+    messages, used = build_messages(SYSTEM, history, budget=100_000)
+    assert messages[1:] == history
+    assert used == prompt_tokens(messages)
+
+
+def test_system_prompt_and_latest_message_are_never_dropped():
+    question = {"role": "user", "content": "Summarise every finding. " * 400}
+    history = conversation(5) + [question]
+
+    messages, used = build_messages(SYSTEM, history, budget=50)
+    assert messages == [{"role": "system", "content": SYSTEM}, question]
+    assert used > 50
+
+    messages, _ = build_messages(SYSTEM, [], budget=1)
+    assert messages == [{"role": "system", "content": SYSTEM}]
+
+
+def test_rank_compliance_caps_thousands_of_engineers():
+    table = compliance(5000)
+    ranked = rank_compliance(table, top_n=10, best_n=3)
+
+    assert ranked["count"] == 5000
+    assert len(ranked["most_issues"]) == 10
+    assert len(ranked["best"]) == 3
+    assert ranked["not_listed"] == 5000 - 13
+    assert ranked["median_compliance"] == f"{table['compliance_rate'].median():.1f}%"
+
+    # Most non-compliant answers first, then the best rates among the rest
+    issues = (table["responses"] - table["yes"]).sort_values(ascending=False, kind="stable")
+    assert list(ranked["most_issues"]) == list(issues.index[:10])
+    assert set(ranked["best"]).isdisjoint(ranked["most_issues"])
+    rest = table.drop(list(ranked["most_issues"]))
+    best = rest.sort_values(["compliance_rate", "audits"], ascending=False).head(3)
+    assert list(ranked["best"]) == list(best.index)
+    assert ranked["best"][best.index[0]] == {"compliance": f"{best['compliance_rate'].iloc[0]:.1f}%",
+                                              "audits": int(best["audits"].iloc[0])}
+
+
+def test_rank_compliance_of_small_and_empty_tables():
+    ranked = rank_compliance(compliance(5), top_n=10, best_n=3)
+    assert len(ranked["most_issues"]) == 5
+    assert ranked["best"] == {}
+    assert ranked["not_listed"] == 0
+
+    empty = rank_compliance(compliance(0))
+    assert empty == {"count": 0, "median_compliance": None, "most_issues": {}, "best": {}, "not_listed": 0}
+
+
+def test_context_size_does_not_grow_with_the_fleet():
+    counts = pd.DataFrame({"Yes": [90, 80], "No": [5, 15], "N/A": [5, 5]}, index=["helmet", "harness"])
+    percent = counts.div(counts.sum(axis=1), axis=0) * 100
+
+    def prompt_for(engineers):
+        context = build_data_context("Site Risk Assessment", "2025-01-01", "2025-12-31", engineers * 10, counts,
+                                     percent, compliance(50, seed=1), compliance(engineers), top_n=10)
+        return count_tokens(system_prompt(context))
+
+    small, large = prompt_for(100), prompt_for(5000)
+    # Only the totals differ: a few digits, not thousands of names
+    assert abs(large - small) < 20
@@ -0,0 +1,123 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from conftest import make_history
+from queries import ROLLUP_RESPONSES, ResponseStore, load_rollups, sum_rollups
+
+duckdb = pytest.importorskip("duckdb")
+
+FILTERS = {
+    "everything": dict(start_date=date(2020, 1, 1), end_date=date(2030, 1, 1)),
+    "template": dict(title="Checklist B", start_date=date(2020, 1, 1), end_date=date(2030, 1, 1)),
+    "template, site and dates": dict(title="Checklist A", site_id="SITE-003",
+                                     start_date=date(2025, 3, 1), end_date=date(2025, 8, 15)),
+    "engineer": dict(full_name="Engineer 007", start_date=date(2025, 2, 1), end_date=date(2025, 11, 30)),
+}
+
+
+@pytest.fixture(scope="module")
+def history(tmp_path_factory):
+    """(engine, database path): 1,500 audits of two templates with some unanswered questions."""
+    from database import models
+
+    path = str(tmp_path_factory.mktemp("analytics") / "safetyhub.db")
+    engine = models.create_sqlite_engine(path)
+    original = models.engine
+    models.engine = engine
+    try:
+        models.init_db()
+        make_history(engine, 1500, questions=12, users=20, titles=("Checklist A", "Checklist B"), answered=0.9)
+        models.rebuild_rollups()
+    finally:
+        models.engine = original
+    yield engine, path
+    engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def store(history):
+    store = ResponseStore(history[0])
+    store.refresh()
+    return store
+
+
+@pytest.fixture(scope="module", params=["parquet", "sqlite"])
+def analytics(request, history, tmp_path_factory):
+    from analytics import DuckDBAnalytics, write_snapshot
+
+    engine, path = history
+    if request.param == "parquet":
+        source = str(tmp_path_factory.mktemp("snapshot") / "snapshot.parquet")
+        pytest.importorskip("pyarrow")
+        write_snapshot(engine, source)
+    else:
+        source = path
+    try:
+        return DuckDBAnalytics(source)
+    except duckdb.IOException as e:
+        # INSTALL sqlite downloads the extension unless it is already installed
+        pytest.skip(f"DuckDB sqlite extension unavailable: {str(e).splitlines()[0]}")
+
+
+def pandas_stats(engine, store, title=None, site_id=None, full_name=None, start_date=None, end_date=None):
+    """The dashboard's default path: rollups for the counts, the response frame for the engineer metrics."""
+    rollups = load_rollups(engine, start_date, end_date, title=title, site_id=site_id, full_name=full_name)
+    df = store.select(title, site_id, full_name, start_date, end_date)
+
+    by_engineer = df.groupby("full_name", observed=True)
+    engineer_metrics = by_engineer.agg(total_audits=("Audit ID", "nunique"), sites_visited=("site_id", "nunique"))
+    engineer_metrics["unique_sites"] = [sorted(sites) for sites in by_engineer["site_id"].unique()]
+    engineer_metrics = engineer_metrics.reset_index()
+    engineer_metrics["full_name"] = engineer_metrics["full_name"].astype(str)
+
+    visits = df.groupby(["full_name", "site_id"], observed=True).size().reset_index(name="visits")
+    visits = visits.astype({"full_name": str, "site_id": str})
+
+    return {
+        "keyword counts": sum_rollups(rollups, ["Keyword"]),
+        "site counts": sum_rollups(rollups, ["site_id", "Keyword"]),
+        "engineer counts": sum_rollups(rollups, ["full_name", "Keyword"]),
+        "monthly": rollups.groupby(rollups["day"].dt.to_period("M"))[ROLLUP_RESPONSES].sum(),
+        "engineer metrics": engineer_metrics.sort_values("full_name").reset_index(drop=True),
+        "site visits": visits.sort_values(["full_name", "site_id"]).reset_index(drop=True),
+    }
+
+
+def duckdb_stats(analytics, **filters):
+    (keyword_counts, _), (site_counts, _) = analytics.filtered_stats(**filters), analytics.site_stats(**filters)
+    engineer_metrics, visits, engineer_counts, _ = analytics.engineer_stats(**filters)
+    engineer_metrics["unique_sites"] = engineer_metrics["unique_sites"].map(sorted)
+    return {
+        "keyword counts": keyword_counts,
+        "site counts": site_counts,
+        "engineer counts": engineer_counts,
+        "monthly": analytics.monthly(**filters),
+        "engineer metrics": engineer_metrics,
+        "site visits": visits,
+    }
+
+
+@pytest.mark.parametrize("name", FILTERS)
+def test_duckdb_matches_pandas(history, store, analytics, name):
+    expected = pandas_stats(history[0], store, **FILTERS[name])
+    actual = duckdb_stats(analytics, **FILTERS[name])
+    assert not expected["keyword counts"].empty
+
+    for frame in expected:
+        left, right = expected[frame], actual[frame]
+        if frame.endswith("counts") or frame == "monthly":
+            left = left.astype("int64")
+        pd.testing.assert_frame_equal(left, right, check_dtype=False, check_index_type=False,
+                                      check_names=False, obj=frame)
+
+
+def test_monthly_for_several_engineers(history, store, analytics):
+    names = ["Engineer 001", "Engineer 002"]
+    rollups = load_rollups(history[0], date(2020, 1, 1), date(2030, 1, 1))
+    rollups = rollups[rollups["full_name"].isin(names)]
+    expected = rollups.groupby(rollups["day"].dt.to_period("M"))[ROLLUP_RESPONSES].sum().astype("int64")
+
+    actual = analytics.monthly(full_names=names, start_date=date(2020, 1, 1), end_date=date(2030, 1, 1))
+    pd.testing.assert_frame_equal(expected, actual, check_names=False, check_index_type=False)
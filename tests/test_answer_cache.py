@@ -0,0 +1,128 @@
+from types import SimpleNamespace
+
+import pytest
+
+import answer_cache
+from answer_cache import SQLiteAnswerCache, answer_key, replay, stream_answer, write_stream
+
+SYSTEM = {"role": "system", "content": "Data context: 12 audits, 91.5% compliance"}
+QUESTION = {"role": "user", "content": "What are the top 3 safety issues?"}
+
+
+class FakePlaceholder:
+    def __init__(self):
+        self.shown = []
+
+    def markdown(self, text):
+        self.shown.append(text)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controls the cache's time.time(); starts at 1000 and advances 1 s per call unless set."""
+    now = [1000.0]
+
+    def tick():
+        now[0] += 1
+        return now[0]
+
+    monkeypatch.setattr(answer_cache, "time", SimpleNamespace(time=tick))
+    return now
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SQLiteAnswerCache(str(tmp_path / "ai_answers.db"), ttl=3600, max_entries=3)
+
+
+def test_key_covers_model_context_conversation_and_params():
+    key = answer_key("gpt-4o-mini", [SYSTEM, QUESTION], temperature=0.5, max_tokens=800)
+    # Equal content gives the same key, whatever the parameter order or object identity
+    assert key == answer_key("gpt-4o-mini", [dict(SYSTEM), dict(QUESTION)], max_tokens=800, temperature=0.5)
+
+    other_context = {"role": "system", "content": "Data context: 13 audits, 91.2% compliance"}
+    follow_up = [SYSTEM, QUESTION, {"role": "assistant", "content": "Helmets."}, {"role": "user", "content": "Why?"}]
+    variants = [
+        answer_key("gpt-4o", [SYSTEM, QUESTION], temperature=0.5, max_tokens=800),
+        answer_key("gpt-4o-mini", [other_context, QUESTION], temperature=0.5, max_tokens=800),
+        answer_key("gpt-4o-mini", follow_up, temperature=0.5, max_tokens=800),
+        answer_key("gpt-4o-mini", [SYSTEM, QUESTION], temperature=0.7, max_tokens=800),
+    ]
+    assert len({key, *variants}) == 5
+
+
+def test_hit_and_miss_counters(cache):
+    assert cache.get("a") is None
+    cache.put("a", "answer")
+    assert cache.get("a") == "answer"
+    assert cache.get("a") == "answer"
+    assert cache.stats() == {"entries": 1, "hits": 2, "misses": 1}
+
+
+def test_answers_expire_after_ttl(cache, clock):
+    cache.put("a", "answer")
+    clock[0] += 3600 - 10
+    assert cache.get("a") == "answer"
+    clock[0] += 20
+    assert cache.get("a") is None
+
+    # Expired rows are purged by the next write
+    cache.put("b", "answer")
+    assert cache.stats()["entries"] == 1
+
+
+def test_least_recently_used_answer_is_evicted(cache, clock):
+    for key in ("a", "b", "c"):
+        cache.put(key, key.upper())
+    assert cache.get("a") == "A"  # b is now the least recently used
+
+    cache.put("d", "D")
+    assert cache.stats()["entries"] == 3
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in ("a", "c", "d")] == ["A", "C", "D"]
+
+
+def test_zero_ttl_disables_the_cache(tmp_path):
+    cache = SQLiteAnswerCache(str(tmp_path / "ai_answers.db"), ttl=0)
+    cache.put("a", "answer")
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_replay_through_the_placeholder():
+    answer = "Focus on harness use at SITE-003, then lighting."
+    placeholder = FakePlaceholder()
+
+    assert write_stream(placeholder, replay(answer, chunk_chars=10)) == answer
+    assert placeholder.shown[-1] == answer
+    partial = placeholder.shown[:-1]
+    assert len(partial) == 5
+    assert all(text.endswith("▌") and answer.startswith(text[:-1]) for text in partial)
+    assert [len(text) for text in partial] == sorted(len(text) for text in partial)
+
+
+def test_round_trip_against_stub(openai_stub, cache):
+    from openai import OpenAI
+
+    client = OpenAI()  # base URL and key come from the environment
+    openai_stub.replies = ["Helmets are missing on two sites"]
+    messages = [SYSTEM, QUESTION]
+
+    first = write_stream(FakePlaceholder(), stream_answer(client, cache, "gpt-4o-mini", messages, temperature=0.5))
+    assert first.strip() == "Helmets are missing on two sites"
+    assert len(openai_stub.requests) == 1
+    assert openai_stub.requests[0]["messages"] == messages
+    assert openai_stub.requests[0]["temperature"] == 0.5
+
+    placeholder = FakePlaceholder()
+    second = write_stream(placeholder, stream_answer(client, cache, "gpt-4o-mini", messages, temperature=0.5))
+    assert second == first
+    assert len(openai_stub.requests) == 1  # served from the cache
+    assert len(placeholder.shown) > 1  # shown through the same streaming path
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1}
+
+    # A follow-up in the same conversation is a different key
+    write_stream(FakePlaceholder(), stream_answer(
+        client, cache, "gpt-4o-mini", messages + [{"role": "user", "content": "And lighting?"}], temperature=0.5
+    ))
+    assert len(openai_stub.requests) == 2
@@ -0,0 +1,226 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import ROOT
+
+# The handler module creates its session store on import
+os.environ.setdefault("SESSION_BACKEND", "memory")
+
+from handlers import audit  # noqa: E402
+from utils import template_manager  # noqa: E402
+from utils.compiled_template import CompiledTemplate  # noqa: E402
+from utils.session_store import encode_answer  # noqa: E402
+from utils.workers import WorkerPool  # noqa: E402
+
+# p99 of button callbacks answered while audits are being saved and rendered
+CALLBACK_P99_BUDGET = float(os.getenv("CALLBACK_P99_BUDGET", "0.25"))
+
+CONCURRENT_COMPLETIONS = 50
+CLICKS_PER_ENGINEER = 100
+
+
+class FakeBot:
+    def __init__(self):
+        self.messages = []
+        self.documents = []
+        self._next_id = 1
+
+    async def send_message(self, chat_id, text, reply_markup=None):
+        self.messages.append((chat_id, text))
+        self._next_id += 1
+        return SimpleNamespace(message_id=self._next_id)
+
+    async def send_document(self, chat_id, document, filename):
+        self.documents.append((chat_id, filename, len(document.read())))
+
+    async def edit_message_text(self, chat_id, message_id, text, reply_markup=None):
+        pass
+
+    async def delete_message(self, chat_id, message_id):
+        pass
+
+
+class FakeQuery:
+    def __init__(self, user_id, data):
+        self.from_user = SimpleNamespace(id=user_id)
+        self.data = data
+        self.answers = []
+
+    async def answer(self, text=None, **kwargs):
+        self.answers.append(text)
+
+    async def edit_message_text(self, text):
+        pass
+
+
+@pytest.fixture
+def compiled(monkeypatch):
+    with open(os.path.join(ROOT, "templates", "template1_full_bilingual.json"), encoding="utf-8") as f:
+        compiled = CompiledTemplate(json.load(f))
+    monkeypatch.setitem(template_manager._compiled_by_version, compiled.version, compiled)
+    return compiled
+
+
+@pytest.fixture
+def pools(tmp_path, monkeypatch):
+    """Fresh worker pools writing the report cache under tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    io_pool = WorkerPool("io", max_workers=4, max_queue=256)
+    cpu_pool = WorkerPool("cpu", max_workers=2, max_queue=64, use_processes=True)
+    monkeypatch.setattr(audit, "io_pool", io_pool)
+    monkeypatch.setattr(audit, "cpu_pool", cpu_pool)
+    yield io_pool, cpu_pool
+    io_pool.shutdown()
+    cpu_pool.shutdown()
+
+
+def finished_state(compiled, answer="Yes"):
+    answers = bytearray(encode_answer(q.options, answer) for q in compiled.questions)
+    return {
+        "full_name": "Test Engineer",
+        "site_id": "SITE-001",
+        "template_name": compiled.name,
+        "template_version": compiled.version,
+        "current_index": len(compiled),
+        "answers": answers,
+        "last_message_id": 1,
+    }
+
+
+def complete(user_id, state, bot):
+    audit.session_store.save(user_id, state)
+    context = SimpleNamespace(bot=bot)
+    return audit.send_next_question(None, context, user_id, audit.session_store.get(user_id))
+
+
+def test_failed_write_keeps_the_session(db, compiled, pools, monkeypatch):
+    def failing_persist(**kwargs):
+        raise RuntimeError("database is locked")
+
+    bot = FakeBot()
+    persist = audit.persist_completed_audit
+    monkeypatch.setattr(audit, "persist_completed_audit", failing_persist)
+    asyncio.run(complete(1, finished_state(compiled), bot))
+
+    state = audit.session_store.get(1)
+    assert state is not None
+    assert 1 not in audit.submitting_users
+    assert state["current_index"] == len(compiled) - 1
+    assert any("could not be saved" in text for _, text in bot.messages)
+    assert not bot.documents
+
+    # Generate Report again once the database is writable
+    monkeypatch.setattr(audit, "persist_completed_audit", persist)
+    state["current_index"] += 1
+    asyncio.run(audit.send_next_question(None, SimpleNamespace(bot=bot), 1, state))
+    assert audit.session_store.get(1) is None
+    assert len(bot.documents) == 1
+
+
+def test_clicks_during_a_save_are_answered(db, compiled, pools, monkeypatch):
+    release = threading.Event()
+    persist = audit.persist_completed_audit
+
+    def slow_persist(**kwargs):
+        release.wait(5)
+        return persist(**kwargs)
+
+    bot = FakeBot()
+    monkeypatch.setattr(audit, "persist_completed_audit", slow_persist)
+
+    async def scenario():
+        saving = asyncio.create_task(complete(1, finished_state(compiled), bot))
+        while 1 not in audit.submitting_users:
+            await asyncio.sleep(0.01)
+
+        # Nothing about the save in progress is stored with the session: a restart
+        # mid-save leaves an ordinary session at the end of the audit
+        assert audit.session_store.get(1) == finished_state(compiled)
+
+        query = FakeQuery(1, "generate")
+        await audit.button_click(SimpleNamespace(callback_query=query), SimpleNamespace(bot=bot))
+        release.set()
+        await saving
+        return query
+
+    query = asyncio.run(scenario())
+    assert query.answers == ["Saving…"]
+    assert audit.submitting_users == set()
+    assert audit.session_store.get(1) is None
+    assert len(bot.documents) == 1
+
+
+def _crash():
+    os._exit(1)
+
+
+def _square(x):
+    return x * x
+
+
+def test_broken_process_pool_is_replaced():
+    pool = WorkerPool("cpu-test", max_workers=1, max_queue=4, use_processes=True)
+
+    async def scenario():
+        with pytest.raises(BrokenProcessPool):
+            await pool.run(_crash)
+        return await pool.run(_square, 7)
+
+    try:
+        assert asyncio.run(scenario()) == 49
+        assert pool.metrics()["restarts"] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_callback_p99_under_concurrent_completions(db, compiled, pools):
+    """50 audits are saved and rendered while other engineers keep navigating their audits."""
+    bot = FakeBot()
+    navigating = range(10_000, 10_020)
+
+    async def navigate(user_id):
+        # Clicks are due every 10 ms; a click's latency runs from when it was due, so time the
+        # event loop spends blocked elsewhere counts against it
+        loop = asyncio.get_running_loop()
+        due = loop.time()
+        latencies = []
+        for i in range(CLICKS_PER_ENGINEER):
+            due += 0.01
+            await asyncio.sleep(max(0.0, due - loop.time()))
+            query = FakeQuery(user_id, "nav:next" if i % 2 == 0 else "nav:prev")
+            await audit.button_click(SimpleNamespace(callback_query=query), SimpleNamespace(bot=bot))
+            latencies.append(loop.time() - due)
+        return latencies
+
+    async def scenario():
+        for user_id in navigating:
+            state = finished_state(compiled)
+            state["current_index"] = 0
+            audit.session_store.save(user_id, state)
+
+        async def finish(user_id):
+            # Audits are submitted one every 10 ms while the others navigate
+            await asyncio.sleep(user_id * 0.01)
+            await complete(user_id, finished_state(compiled), bot)
+
+        navigation = [asyncio.create_task(navigate(user_id)) for user_id in navigating]
+        await asyncio.gather(*(finish(user_id) for user_id in range(1, CONCURRENT_COMPLETIONS + 1)))
+        results = await asyncio.gather(*navigation)
+        return [latency for latencies in results for latency in latencies]
+
+    started = time.perf_counter()
+    latencies = sorted(asyncio.run(scenario()))
+    seconds = time.perf_counter() - started
+
+    p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+    print(f"\n{CONCURRENT_COMPLETIONS} completions in {seconds:.2f}s; "
+          f"{len(latencies)} callbacks, p50 {latencies[len(latencies) // 2] * 1000:.1f}ms, p99 {p99 * 1000:.1f}ms")
+    assert len(bot.documents) == CONCURRENT_COMPLETIONS
+    assert p99 < CALLBACK_P99_BUDGET
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import os
+import time
+
+import pytest
+
+from conftest import BENCH_SCALE
+from utils import audit_parser
+from utils.workers import WorkerPool
+
+pytest.importorskip("pdfplumber")
+pytest.importorskip("openai")
+
+CHECKLIST = {
+    "template_name": "Site Safety Audit Checklist",
+    "categories": [{"name": "PPE", "questions": [{
+        "keyword": "helmet/каска", "question_en": "Are helmets worn?", "question_ru": "Носят ли каски?",
+        "response": "", "options": ["Yes", "No", "N/A"],
+    }]}],
+}
+
+
+def make_pdf(path, pages, lines_per_page=30):
+    """A text PDF of the given number of pages, written with reportlab."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    pdf = canvas.Canvas(str(path), pagesize=A4)
+    for page in range(pages):
+        for line in range(lines_per_page):
+            pdf.drawString(40, 800 - line * 24, f"Page {page + 1} rule {line + 1}: wear a helmet and a harness at height.")
+        pdf.showPage()
+    pdf.save()
+    return str(path)
+
+
+@pytest.fixture
+def parser(openai_stub, tmp_path, monkeypatch):
+    """audit_parser with fresh clients pointed at the stub, a fresh worker pool and its caches under tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(audit_parser, "_clients", {})
+    monkeypatch.setattr(audit_parser, "OPENAI_TIMEOUT", 0.5)
+    monkeypatch.setattr(audit_parser, "OPENAI_MAX_RETRIES", 2)
+    pool = WorkerPool("parser-test", max_workers=1, max_queue=4)
+    monkeypatch.setattr(audit_parser, "io_pool", pool)
+    openai_stub.replies = [json.dumps(CHECKLIST)]
+    yield openai_stub
+    pool.shutdown()
+
+
+def test_checklist_from_pdf(parser, tmp_path):
+    pdf_path = make_pdf(tmp_path / "guidelines.pdf", pages=2)
+
+    assert asyncio.run(audit_parser.parse_audit_pdf_openai_async(pdf_path)) == CHECKLIST
+    assert len(parser.requests) == 1
+    request = parser.requests[0]
+    assert request["response_format"] == {"type": "json_object"}
+    assert "Page 2 rule 30" in request["messages"][-1]["content"]
+
+
+def test_timeout_is_retried(parser):
+    # The first request outlives the 0.5 s client timeout; the retry is answered at once
+    parser.delays = [2.0]
+
+    assert asyncio.run(audit_parser.process_text_with_openai_async("Wear a helmet on site.")) == CHECKLIST
+    assert len(parser.requests) == 2
+
+
+def test_progress_arrives_in_order_while_the_loop_keeps_running(parser, tmp_path):
+    pdf_path = make_pdf(tmp_path / "guidelines.pdf", pages=3)
+    parser.delays = [0.5]
+
+    async def scenario():
+        ticks = 0
+        done = asyncio.Event()
+
+        async def ticker():
+            nonlocal ticks
+            while not done.is_set():
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        updates = []
+
+        async def progress(message):
+            updates.append((message, ticks))
+
+        ticking = asyncio.create_task(ticker())
+        result = await audit_parser.parse_audit_pdf_openai_async(pdf_path, progress=progress)
+        finished_at = ticks
+        done.set()
+        await ticking
+        return result, updates, finished_at
+
+    result, updates, finished_at = asyncio.run(scenario())
+    assert result == CHECKLIST
+    assert [message.split()[1] for message, _ in updates] == ["Extracting", "Extracted"]
+    # Other coroutines ran during extraction and during the 0.5 s API call
+    assert updates[1][1] > updates[0][1]
+    assert finished_at - updates[1][1] >= 20
+
+
+def test_extraction_benchmark(tmp_path):
+    """Serial vs page-parallel extraction and a cache hit; BENCH_SCALE multiplies the 300 pages."""
+    pages = max(1, int(300 * BENCH_SCALE))
+    pdf_path = make_pdf(tmp_path / "guidelines.pdf", pages=pages, lines_per_page=4)
+    workers = max(2, audit_parser.PDF_EXTRACT_WORKERS)
+
+    def timed(**kwargs):
+        started = time.perf_counter()
+        text = audit_parser.extract_text_from_pdf(pdf_path, **kwargs)
+        return text, time.perf_counter() - started
+
+    serial, serial_seconds = timed(cache_dir=str(tmp_path / "serial"), workers=1)
+    parallel, parallel_seconds = timed(cache_dir=str(tmp_path / "parallel"), workers=workers)
+    cached, cached_seconds = timed(cache_dir=str(tmp_path / "parallel"), workers=workers)
+
+    print(f"\n{pages} pages: serial {serial_seconds:.2f}s, {workers} workers {parallel_seconds:.2f}s, "
+          f"cache hit {cached_seconds:.3f}s")
+    assert f"Page {pages} rule 4" in serial
+    assert parallel == serial
+    assert cached == serial
+    assert cached_seconds < serial_seconds / 10
+    # Page ranges only run side by side when there is more than one core
+    if (os.cpu_count() or 1) >= 2:
+        assert parallel_seconds < serial_seconds
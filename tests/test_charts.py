@@ -0,0 +1,125 @@
+import os
+import time
+
+import pytest
+
+from conftest import BENCH_SCALE
+
+matplotlib = pytest.importorskip("matplotlib")
+matplotlib.use("Agg")
+
+import pandas as pd
+import matplotlib.pyplot as plt
+
+import charts
+from charts import FigureCache
+
+# Megabytes of RSS growth allowed over the chart benchmark
+CHART_RSS_BUDGET_MB = float(os.getenv("CHART_RSS_BUDGET_MB", "40"))
+
+MONTHLY = pd.DataFrame(
+    {"Yes": [82.0, 85.5, 90.1, 88.7], "No": [12.0, 10.5, 7.4, 8.3], "N/A": [6.0, 4.0, 2.5, 3.0]},
+    index=pd.period_range("2025-01", periods=4, freq="M"),
+)
+
+
+def draw_trend():
+    """Like the dashboard's performance trend chart."""
+    fig, ax = plt.subplots(figsize=(10, 4))
+    MONTHLY["Yes"].plot(kind="line", marker="o", ax=ax, color="green")
+    ax.set_ylabel("Compliance Rate (%)")
+    return fig
+
+
+def draw_breakdown():
+    """Like the dashboard's response breakdown bars."""
+    fig, ax = plt.subplots(figsize=(10, 3))
+    MONTHLY.plot(kind="barh", stacked=True, ax=ax)
+    ax.set_xlabel("Responses (%)")
+    return fig
+
+
+def rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def test_hits_skip_the_draw():
+    cache = FigureCache(max_entries=4)
+    calls = []
+
+    def draw():
+        calls.append(1)
+        return draw_trend()
+
+    png = cache.get_or_render(("trend", "SITE-001"), draw)
+    assert png.startswith(b"\x89PNG")
+    assert cache.get_or_render(("trend", "SITE-001"), draw) == png
+    assert cache.get_or_render(("trend", "SITE-001"), draw) == png
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (1, 2, 1)
+    assert stats["bytes"] == len(png)
+
+
+def test_least_recently_used_chart_is_evicted():
+    cache = FigureCache(max_entries=2)
+    cache.get_or_render("a", draw_trend)
+    cache.get_or_render("b", draw_breakdown)
+    cache.get_or_render("a", draw_trend)  # b is now the least recently used
+
+    cache.get_or_render("c", draw_trend)
+    assert cache.stats()["entries"] == 2
+    assert (cache.hits, cache.misses) == (1, 3)
+
+    cache.get_or_render("a", draw_trend)
+    cache.get_or_render("c", draw_trend)
+    assert (cache.hits, cache.misses) == (3, 3)
+    cache.get_or_render("b", draw_breakdown)
+    assert (cache.hits, cache.misses) == (3, 4)
+
+
+def test_figures_are_closed_after_rendering(monkeypatch):
+    plt.close("all")
+    cache = FigureCache()
+    cache.get_or_render("trend", draw_trend)
+    cache.get_or_render("breakdown", draw_breakdown)
+    assert plt.get_fignums() == []
+
+    # Also when saving the PNG fails
+    def broken_png(fig):
+        raise ValueError("cannot save")
+
+    monkeypatch.setattr(charts, "figure_png", broken_png)
+    with pytest.raises(ValueError):
+        cache.get_or_render("failing", draw_trend)
+    assert plt.get_fignums() == []
+    assert cache.stats()["entries"] == 2
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="needs /proc to read RSS")
+def test_chart_memory_benchmark(monkeypatch):
+    """1,000 cache lookups; each chart state is asked for four times in a row, as on reruns.
+
+    BENCH_SCALE multiplies the lookups. The resolution is lowered so the draws stay quick;
+    a figure left open by the draw path would still add its full size to RSS.
+    """
+    monkeypatch.setattr(charts, "FIGURE_DPI", 50)
+    cache = FigureCache(max_entries=16)
+    lookups = max(4, int(1000 * BENCH_SCALE))
+
+    # Fonts, tick locators and the PNG writer are loaded by the first draws
+    for key in range(8):
+        cache.get_or_render(("warm-up", key), draw_trend if key % 2 else draw_breakdown)
+    before = rss_bytes()
+    started = time.perf_counter()
+    for i in range(lookups):
+        state = i // 4
+        cache.get_or_render(("chart", state), draw_trend if state % 2 else draw_breakdown)
+    seconds = time.perf_counter() - started
+    growth_mb = (rss_bytes() - before) / 1e6
+
+    print(f"\n{lookups} chart lookups ({cache.misses - 8} draws) in {seconds:.2f}s, RSS growth {growth_mb:.1f} MB")
+    assert plt.get_fignums() == []
+    assert cache.stats()["entries"] == 16
+    assert growth_mb < CHART_RSS_BUDGET_MB
@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from conftest import make_history
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def test_chunk_writer_accepts_all_null_columns(tmp_path):
+    from pull_csv import ParquetChunkWriter
+
+    path = tmp_path / "export.parquet"
+    writer = ParquetChunkWriter(str(path))
+    writer.write(pd.DataFrame({"audit_id": [1, 1], "site_id": ["SITE-1", "SITE-1"],
+                               "keyword": ["helmet", "harness"], "response": ["Yes", "No"]}))
+    # Older audits without a site, and a chunk without any answers
+    writer.write(pd.DataFrame({"audit_id": [2, 2], "site_id": [None, None],
+                               "keyword": ["helmet", "harness"], "response": [None, None]}))
+    writer.close()
+
+    df = pq.read_table(path).to_pandas()
+    assert len(df) == 4
+    assert df["site_id"].isna().tolist() == [False, False, True, True]
+
+
+def test_snapshot_accepts_all_null_chunks(db, tmp_path):
+    from analytics import write_snapshot
+
+    rows = make_history(db, 40, questions=5)
+    with db.begin() as conn:
+        conn.execute(text("UPDATE audits SET site_id = NULL, title = NULL WHERE id > 20"))
+
+    path = tmp_path / "snapshot.parquet"
+    assert write_snapshot(db, str(path), chunk_size=25) == rows
+
+    df = pq.read_table(path).to_pandas()
+    assert len(df) == rows
+    assert df["site_id"].isna().sum() == df["title"].isna().sum() == 100
+    assert str(df["timestamp"].dtype).startswith("datetime64")
@@ -0,0 +1,89 @@
+import json
+import sys
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from conftest import make_history
+
+
+def add_audits(engine, count):
+    """Copies of the first audits, answered Yes to every question; returns the highest audit id."""
+    with engine.begin() as conn:
+        last = conn.execute(text("SELECT MAX(id) FROM audits")).scalar()
+        conn.execute(text("""
+            INSERT INTO audits (user_id, site_id, title, template_version_id, timestamp)
+            SELECT user_id, site_id, title, template_version_id, timestamp FROM audits ORDER BY id LIMIT :n
+        """), {"n": count})
+        conn.execute(text("""
+            INSERT INTO responses (audit_id, question_id, answer)
+            SELECT a.id, q.id, 1 FROM audits a JOIN questions q ON q.template_version_id = a.template_version_id
+            WHERE a.id > :last
+        """), {"last": last})
+        return conn.execute(text("SELECT MAX(id) FROM audits")).scalar()
+
+
+@pytest.fixture
+def pull(db, tmp_path, monkeypatch):
+    """Runs pull_csv's command line against the test database; the state file lives in tmp_path."""
+    import pull_csv
+
+    monkeypatch.setattr(pull_csv, "engine", db)
+    monkeypatch.setattr(pull_csv, "STATE_PATH", str(tmp_path / "export_state.json"))
+    make_history(db, 10, questions=3, titles=("Checklist A", "Checklist B"))
+
+    def run(*argv):
+        monkeypatch.setattr(sys, "argv", ["pull_csv.py", *argv])
+        pull_csv.main()
+
+    return run
+
+
+def state(tmp_path):
+    with open(tmp_path / "export_state.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_since_last_appends_only_new_audits(db, pull, tmp_path):
+    output = tmp_path / "weekly.csv"
+    pull("--since-last", "--output", str(output))
+    assert len(pd.read_csv(output)) == 30
+    assert state(tmp_path) == {str(output): 10}
+
+    last = add_audits(db, 4)
+    pull("--since-last", "--output", str(output))
+    df = pd.read_csv(output)
+    assert len(df) == 42
+    assert df["audit_id"].tolist() == sorted(df["audit_id"])
+    assert df["audit_id"].nunique() == last == 14
+    assert state(tmp_path) == {str(output): 14}
+
+    # Nothing new: the file is left as it is
+    pull("--since-last", "--output", str(output))
+    assert len(pd.read_csv(output)) == 42
+
+
+def test_filtered_export_clears_the_watermark(db, pull, tmp_path):
+    output = tmp_path / "weekly.csv"
+    pull("--since-last", "--output", str(output))
+    add_audits(db, 4)
+
+    pull("--template", "Checklist A", "--output", str(output))
+    filtered = pd.read_csv(output)
+    assert 0 < len(filtered) < 42
+    assert str(output) not in state(tmp_path)
+
+    # The next incremental run rewrites the file with every audit instead of appending to the subset
+    pull("--since-last", "--output", str(output))
+    df = pd.read_csv(output)
+    assert len(df) == 42
+    assert df["audit_id"].nunique() == 14
+    assert state(tmp_path) == {str(output): 14}
+
+
+def test_since_last_rejects_filters(pull, tmp_path, capsys):
+    with pytest.raises(SystemExit):
+        pull("--since-last", "--start", "2025-01-01", "--output", str(tmp_path / "weekly.csv"))
+    assert "cannot be combined" in capsys.readouterr().err
+    assert not (tmp_path / "weekly.csv").exists()
@@ -0,0 +1,74 @@
+import os
+import time
+
+import pandas as pd
+from sqlalchemy import text
+
+from conftest import BENCH_SCALE, make_history
+from queries import CATEGORICAL_COLUMNS, RESPONSES_QUERY, RESPONSE_COLUMNS, ResponseStore, load_responses_frame
+
+# Seconds allowed per million response rows for the cold dashboard load
+LOAD_BUDGET_PER_MILLION = float(os.getenv("LOAD_BUDGET_PER_MILLION", "3.0"))
+
+
+def reference_frame(engine, since_audit_id=0):
+    """The response frame read row by row through the plain audits ⋈ users ⋈ responses join."""
+    with engine.connect() as conn:
+        df = pd.read_sql_query(text(RESPONSES_QUERY), conn, params={"since_audit_id": since_audit_id})
+    df["Timestamp"] = pd.to_datetime(df["Timestamp"])
+    for col in CATEGORICAL_COLUMNS:
+        df[col] = df[col].astype("category")
+    return df
+
+
+def test_load_responses_frame_matches_join(db):
+    make_history(db, 300, questions=12, titles=("Checklist A", "Checklist B"), answered=0.7)
+
+    for since_audit_id in (0, 120):
+        df = load_responses_frame(db, since_audit_id=since_audit_id, chunk_size=500)
+        assert list(df.columns) == RESPONSE_COLUMNS
+        pd.testing.assert_frame_equal(df, reference_frame(db, since_audit_id))
+
+
+def test_load_responses_frame_empty(db):
+    df = load_responses_frame(db)
+    assert df.empty
+    assert list(df.columns) == RESPONSE_COLUMNS
+
+
+def test_response_store_refresh_is_incremental(db):
+    make_history(db, 50, questions=10)
+    store = ResponseStore(db)
+    assert store.refresh() == 500
+    assert store.refresh() == 0
+
+    # A copy of the first audit arrives after the initial load
+    with db.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO audits (user_id, site_id, title, template_version_id, timestamp)
+            SELECT user_id, site_id, title, template_version_id, timestamp FROM audits WHERE id = 1
+        """))
+        conn.execute(text("""
+            INSERT INTO responses (audit_id, question_id, answer)
+            SELECT (SELECT MAX(id) FROM audits), question_id, answer FROM responses WHERE audit_id = 1
+        """))
+    assert store.refresh() == 10
+    assert store.watermark == 51
+    pd.testing.assert_frame_equal(
+        store.df.sort_values(["Audit ID", "Keyword"]).reset_index(drop=True),
+        reference_frame(db).sort_values(["Audit ID", "Keyword"]).reset_index(drop=True),
+        check_categorical=False,
+    )
+
+
+def test_load_responses_frame_benchmark(db):
+    """Cold load of the dashboard frame; BENCH_SCALE=5 runs the 1M-row case."""
+    rows = make_history(db, int(4000 * BENCH_SCALE), questions=50)
+
+    started = time.perf_counter()
+    df = load_responses_frame(db)
+    seconds = time.perf_counter() - started
+
+    assert len(df) == rows
+    print(f"\nload_responses_frame: {rows} rows in {seconds:.2f}s ({rows / seconds:,.0f} rows/s)")
+    assert seconds < LOAD_BUDGET_PER_MILLION * max(rows, 1) / 1_000_000 + 0.5
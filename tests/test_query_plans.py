@@ -0,0 +1,69 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+from conftest import make_history
+from export_reports import build_audits_query
+from queries import AUDIT_LIST_QUERY, AUDIT_RESPONSES_QUERY, FRAME_AUDITS_QUERY, FRAME_RESPONSES_QUERY, ROLLUP_QUERY
+
+# The hot queries of the dashboard, the bot and the report export, with typical parameters.
+# None of them may read audits or responses front to back.
+HOT_QUERIES = {
+    "audit responses": (AUDIT_RESPONSES_QUERY, {"audit_id": 42}),
+    "audit list by template and dates": (
+        AUDIT_LIST_QUERY + " AND a.title = :title ORDER BY a.timestamp DESC",
+        {"start": "2025-03-01", "end": "2025-04-01", "title": "Checklist A"},
+    ),
+    "audit list by site and dates": (
+        AUDIT_LIST_QUERY + " AND a.site_id = :site_id ORDER BY a.timestamp DESC",
+        {"start": "2025-03-01", "end": "2025-04-01", "site_id": "SITE-003"},
+    ),
+    "rollup day range": (ROLLUP_QUERY, {"start_date": "2025-03-01", "end_date": "2025-03-31"}),
+    "rollup day range by template": (
+        ROLLUP_QUERY + " AND cr.title = :title",
+        {"start_date": "2025-03-01", "end_date": "2025-03-31", "title": "Checklist A"},
+    ),
+    "watermark audits": (FRAME_AUDITS_QUERY, {"since_audit_id": 1900}),
+    "watermark responses": (FRAME_RESPONSES_QUERY.replace("?", ":since_audit_id"), {"since_audit_id": 1900}),
+    "latest audit id": ("SELECT COALESCE(MAX(id), 0) FROM audits", {}),
+    "export audits": build_audits_query(start=date(2025, 3, 1), end=date(2025, 3, 31), template="Checklist A"),
+}
+
+
+# Names a scan of audits or responses shows up under in EXPLAIN QUERY PLAN, aliases included
+SCANNED_TABLES = {"audits", "a", "responses", "r"}
+
+
+def table_scans(conn, sql, params):
+    plan = [row[-1] for row in conn.execute(text("EXPLAIN QUERY PLAN " + str(sql)), params)]
+    return plan, [step for step in plan if step.split()[:1] == ["SCAN"] and step.split()[1] in SCANNED_TABLES]
+
+
+@pytest.fixture(scope="module", params=[False, True], ids=["fresh", "analyzed"])
+def history(request, tmp_path_factory):
+    """2,000 audits, planned without statistics and after ANALYZE (PRAGMA optimize gathers them over time)."""
+    from database import models
+
+    engine = models.create_sqlite_engine(str(tmp_path_factory.mktemp("plans") / "safetyhub.db"))
+    original = models.engine
+    models.engine = engine
+    try:
+        models.init_db()
+        make_history(engine, 2000, questions=20, titles=("Checklist A", "Checklist B"))
+        models.rebuild_rollups()
+        if request.param:
+            with engine.begin() as conn:
+                conn.execute(text("ANALYZE"))
+    finally:
+        models.engine = original
+    yield engine
+    engine.dispose()
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_queries_use_indexes(history, name):
+    sql, params = HOT_QUERIES[name]
+    with history.connect() as conn:
+        plan, scans = table_scans(conn, sql, params)
+    assert not scans, f"{name}: {plan}"
@@ -0,0 +1,102 @@
+import json
+import os
+import time
+
+import pytest
+from sqlalchemy import text
+
+from conftest import BENCH_SCALE, ROOT, make_history
+from utils.compiled_template import template_version
+from utils.pdf_generator import get_cached_report, render_report
+
+# Minimum reports rendered per second, per template size
+RENDER_BUDGETS = {
+    12: float(os.getenv("RENDERS_PER_SECOND_12", "10")),
+    500: float(os.getenv("RENDERS_PER_SECOND_500", "1")),
+}
+
+
+def large_template(questions, per_category=10):
+    return {
+        "template_name": f"Generated {questions}",
+        "categories": [
+            {"name": f"Category {c}", "questions": [
+                {"keyword": f"keyword_{c}_{i}", "question_en": f"Question {c}.{i}?", "question_ru": f"Вопрос {c}.{i}?",
+                 "options": ["Yes", "No", "N/A"]}
+                for i in range(per_category)
+            ]}
+            for c in range(questions // per_category)
+        ],
+    }
+
+
+def template_with(questions):
+    if questions == 12:
+        with open(os.path.join(ROOT, "templates", "template1_full_bilingual.json"), encoding="utf-8") as f:
+            return json.load(f)
+    return large_template(questions)
+
+
+def test_reports_are_keyed_by_audit_timestamp(tmp_path):
+    template = template_with(12)
+    first = render_report(1, "Engineer A", template, ["Yes"] * 12, timestamp="2025-01-01 10:00", cache_dir=str(tmp_path))
+    assert render_report(1, "Engineer A", template, ["Yes"] * 12, timestamp="2025-01-01 10:00",
+                         cache_dir=str(tmp_path)) == first
+
+    # Audit ids restart after the database is recreated; a new audit 1 must not get the old file
+    second = render_report(1, "Engineer B", template, ["No"] * 12, timestamp="2026-05-01 09:30", cache_dir=str(tmp_path))
+    assert second != first
+    assert get_cached_report(1, template_version(template), "2026-05-01 09:30", str(tmp_path)) == second
+    assert get_cached_report(1, template_version(template), "2026-05-02 09:30", str(tmp_path)) is None
+
+
+def test_overwrite_replaces_a_cached_report(tmp_path):
+    template = template_with(12)
+    path = render_report(1, "Engineer A", template, ["Yes"] * 12, timestamp="2025-01-01 10:00", cache_dir=str(tmp_path))
+    with open(path, "wb") as f:
+        f.write(b"stale")
+
+    assert render_report(1, "Engineer A", template, ["Yes"] * 12, timestamp="2025-01-01 10:00",
+                         cache_dir=str(tmp_path), overwrite=True) == path
+    with open(path, "rb") as f:
+        assert f.read(5) == b"%PDF-"
+
+
+@pytest.mark.parametrize("questions", sorted(RENDER_BUDGETS))
+def test_render_benchmark(tmp_path, questions):
+    """Cold renders per second; BENCH_SCALE multiplies the number of reports."""
+    template = template_with(questions)
+    answers = (["Yes", "No", "N/A", "Yes"] * questions)[:questions]
+    reports = max(1, int((20 if questions == 12 else 3) * BENCH_SCALE))
+
+    # The first render registers the font and builds the template layout
+    render_report(0, "Warm Up", template, answers, timestamp="2025-01-01 00:00", cache_dir=str(tmp_path))
+    started = time.perf_counter()
+    for audit_id in range(1, reports + 1):
+        render_report(audit_id, "Test Engineer", template, answers, timestamp="2025-01-01 10:00", cache_dir=str(tmp_path))
+    seconds = time.perf_counter() - started
+
+    rate = reports / seconds
+    print(f"\n{questions}-question template: {reports} reports in {seconds:.2f}s ({rate:.1f} reports/s)")
+    assert rate >= RENDER_BUDGETS[questions]
+
+
+def test_export_jobs_place_answers_by_question(db, monkeypatch):
+    from database import export_reports
+
+    monkeypatch.setattr(export_reports, "engine", db)
+    make_history(db, 3, questions=5)
+    with db.begin() as conn:
+        # A legacy audit that never got a row for its second question
+        conn.execute(text("""
+            DELETE FROM responses WHERE audit_id = 1 AND question_id =
+                (SELECT q.id FROM questions q JOIN audits a ON a.template_version_id = q.template_version_id
+                 WHERE a.id = 1 AND q.question_index = 1)
+        """))
+        stored = dict(conn.execute(text(
+            "SELECT question_index, response FROM response_details WHERE audit_id = 1"
+        )).all())
+
+    job = next(job for job in export_reports.iter_report_jobs() if job["audit_id"] == 1)
+    assert job["responses"] == [stored.get(i, "N/A") for i in range(5)]
+    assert job["responses"][1] == "N/A"
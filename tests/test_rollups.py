@@ -0,0 +1,106 @@
+from datetime import date
+
+import pandas as pd
+from sqlalchemy import text
+
+from conftest import make_history
+from queries import ROLLUP_RESPONSES, load_responses_frame, load_rollups, rollups_from_responses
+
+KEYS = ["title", "site_id", "full_name", "Keyword", "day"]
+
+TEMPLATE = {
+    "template_name": "Site Risk Assessment",
+    "categories": [
+        {"name": "PPE", "questions": [
+            {"keyword": "helmet", "question_en": "Helmets worn?", "question_ru": "Каски?", "options": ["Yes", "No", "N/A"]},
+            {"keyword": "harness", "question_en": "Harness used?", "question_ru": "Страховка?", "options": ["Yes", "No", "N/A"]},
+        ]},
+        {"name": "Site", "questions": [
+            {"keyword": "lighting", "question_en": "Lighting adequate?", "question_ru": "Освещение?", "options": ["Yes", "No", "N/A"]},
+        ]},
+    ],
+}
+
+
+def all_rollups(engine):
+    rollups = load_rollups(engine, date(2000, 1, 1), date(2100, 1, 1))
+    return rollups.sort_values(KEYS).reset_index(drop=True)
+
+
+def rollup_count(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT COUNT(*) FROM compliance_rollups")).scalar()
+
+
+def test_init_db_rebuilds_missing_rollups(db):
+    from database.models import init_db
+
+    make_history(db, 200, questions=8, titles=("A", "B"), answered=0.8)
+    assert rollup_count(db) == 0
+
+    init_db()
+    assert rollup_count(db) > 0
+
+    expected = rollups_from_responses(load_responses_frame(db)).sort_values(KEYS).reset_index(drop=True)
+    pd.testing.assert_frame_equal(all_rollups(db), expected, check_dtype=False)
+
+
+def test_init_db_keeps_existing_rollups(db):
+    from database.models import init_db
+
+    make_history(db, 20, questions=5)
+    init_db()
+    with db.begin() as conn:
+        conn.execute(text("UPDATE compliance_rollups SET yes_count = yes_count + 100 WHERE id = 1"))
+    init_db()
+    with db.connect() as conn:
+        assert conn.execute(text("SELECT yes_count FROM compliance_rollups WHERE id = 1")).scalar() >= 100
+
+
+def test_completed_audits_update_rollups_like_a_rebuild(db):
+    from database.db import persist_completed_audit
+    from database.models import rebuild_rollups
+
+    persist_completed_audit(1, "Engineer A", "SITE-1", TEMPLATE, ["Yes", "No", "N/A"], title="Site Risk Assessment")
+    persist_completed_audit(1, "Engineer A", "SITE-1", TEMPLATE, ["Yes", "Yes"], title="Site Risk Assessment")
+    persist_completed_audit(2, "Engineer B", "SITE-2", TEMPLATE, ["No", "No", "Yes"], title="Site Risk Assessment")
+    incremental = all_rollups(db)
+    assert incremental[ROLLUP_RESPONSES].to_numpy().sum() == 9
+
+    rebuild_rollups()
+    pd.testing.assert_frame_equal(all_rollups(db), incremental)
+
+
+def test_questions_without_a_keyword_share_one_rollup_row(db):
+    from database.db import persist_completed_audit
+    from database.models import init_db, rebuild_rollups
+
+    template = {"template_name": "Site Risk Assessment", "categories": [{"name": "PPE", "questions": [
+        TEMPLATE["categories"][0]["questions"][0],
+        {"question_en": "Anything else?", "question_ru": "Что-то еще?", "options": ["Yes", "No", "N/A"]},
+    ]}]}
+    for answers in (["Yes", "No"], ["Yes", "Yes"], ["No", "N/A"]):
+        persist_completed_audit(1, "Engineer A", "SITE-1", template, answers, title="Site Risk Assessment")
+
+    incremental = all_rollups(db)
+    assert len(incremental) == 2
+    row = incremental[incremental["Keyword"] == ""].iloc[0]
+    assert (row["Yes"], row["No"], row["N/A"]) == (1, 1, 1)
+
+    rebuild_rollups()
+    pd.testing.assert_frame_equal(all_rollups(db), incremental)
+
+    # Rollups written before keywords were coalesced (into a nullable column) are rebuilt by init_db
+    with db.begin() as conn:
+        schema = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'compliance_rollups'")).scalar()
+        conn.execute(text("ALTER TABLE compliance_rollups RENAME TO current_rollups"))
+        conn.execute(text(schema.replace("keyword VARCHAR NOT NULL", "keyword VARCHAR")))
+        conn.execute(text("INSERT INTO compliance_rollups SELECT * FROM current_rollups"))
+        conn.execute(text("DROP TABLE current_rollups"))
+        conn.execute(text("UPDATE compliance_rollups SET keyword = NULL WHERE keyword = ''"))
+        conn.execute(text("""
+            INSERT INTO compliance_rollups (title, site_id, user_id, keyword, day, yes_count, no_count, na_count)
+            SELECT title, site_id, user_id, NULL, day, 0, 0, 1 FROM compliance_rollups WHERE keyword IS NULL
+        """))
+    init_db()
+    pd.testing.assert_frame_equal(all_rollups(db), incremental)
@@ -0,0 +1,37 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+# Seconds allowed for a cold `import bot`
+IMPORT_BUDGET = float(os.getenv("IMPORT_BUDGET", "3.0"))
+
+# Loaded on first use (or by the warm-up after polling starts), never by the import
+LAZY_MODULES = ["openai", "pdfplumber", "keybert", "sentence_transformers", "pytesseract", "pdf2image"]
+
+IMPORT_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import bot
+print(json.dumps({
+    "seconds": time.perf_counter() - started,
+    "loaded": [name for name in %r if name in sys.modules],
+}))
+"""
+
+
+def test_import_bot_is_lazy_and_fast():
+    # A fresh interpreter, so modules imported by other tests do not count
+    env = dict(os.environ, SESSION_BACKEND="memory", WARM_UP_IMPORTS="1")
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT % (LAZY_MODULES,)],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+
+    print(f"\nimport bot: {report['seconds']:.2f}s")
+    assert report["loaded"] == []
+    assert report["seconds"] < IMPORT_BUDGET
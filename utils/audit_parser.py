@@ -2,52 +2,163 @@
 import os
 import json
 import re
+import hashlib
 import logging
-import pdfplumber
-from openai import OpenAI
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from dotenv import load_dotenv
+from utils.workers import io_pool
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# OPENAI_BASE_URL (read by the client) can point these at a local stub server
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "120"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
 
+# Pages extracted per worker job, and worker processes per document
+PDF_PAGES_PER_JOB = 25
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
 
-def extract_text_from_pdf(pdf_path: str):
-    """Extracts text from a PDF using pdfplumber only (no OCR)."""
-    extracted_text = ""
+# Cleaned text of uploaded PDFs, one file per content hash
+PDF_TEXT_CACHE_DIR = os.path.join("exports", "pdf_text")
+
+WHITESPACE_RE = re.compile(r'\s+')
+SYMBOL_RE = re.compile(r'[^\w\s.?]')
+
+# openai and pdfplumber are only needed for admin uploads; they are imported
+# and the clients created on first use (or by warm_up) to keep bot startup fast
+_clients = {}
+
+
+def get_client():
+    if "sync" not in _clients:
+        from openai import OpenAI
+        _clients["sync"] = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _clients["sync"]
+
+
+def get_async_client():
+    if "async" not in _clients:
+        from openai import AsyncOpenAI
+        _clients["async"] = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            timeout=OPENAI_TIMEOUT,
+            max_retries=OPENAI_MAX_RETRIES
+        )
+    return _clients["async"]
+
+
+def warm_up():
+    """Import the upload dependencies and create the clients ahead of the first upload."""
+    import pdfplumber  # noqa: F401
+    get_client()
+    get_async_client()
+
+
+def _extract_page_range(pdf_path: str, start: int, stop: int) -> list:
+    """Text of pages [start, stop), one string per page ('' for pages without text)."""
+    import pdfplumber
+
+    texts = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages[start:stop]:
+            texts.append(page.extract_text() or "")
+            # Drop the parsed page objects; pdfplumber otherwise keeps every page in memory
+            page.close()
+    return texts
+
+
+def iter_page_texts(pdf_path: str, workers: int = PDF_EXTRACT_WORKERS, pages_per_job: int = PDF_PAGES_PER_JOB):
+    """Yield the text of every page in order, extracting page ranges in a process pool.
+
+    Documents of a single range, or workers=1, are extracted in this process.
+    """
+    import pdfplumber
+
+    with pdfplumber.open(pdf_path) as pdf:
+        page_count = len(pdf.pages)
+    logger.info(f"📄 Found {page_count} pages in PDF")
+
+    ranges = [(start, min(start + pages_per_job, page_count)) for start in range(0, page_count, pages_per_job)]
+    if workers <= 1 or len(ranges) <= 1:
+        for start, stop in ranges:
+            yield from _extract_page_range(pdf_path, start, stop)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as executor:
+        # map yields in page order as ranges finish, so cleaning starts before the last range is done
+        for texts in executor.map(_extract_page_range, repeat(pdf_path), *zip(*ranges)):
+            yield from texts
+
+
+def clean_page_text(text: str) -> str:
+    text = WHITESPACE_RE.sub(" ", text.strip())
+    return SYMBOL_RE.sub(" ", text)
+
+
+def pdf_text_cache_path(pdf_path: str, cache_dir: str = PDF_TEXT_CACHE_DIR) -> str:
+    digest = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return os.path.join(cache_dir, f"{digest.hexdigest()}.txt")
+
+
+def extract_text_from_pdf(pdf_path: str, cache_dir: str = PDF_TEXT_CACHE_DIR, workers: int = PDF_EXTRACT_WORKERS):
+    """Extracts text from a PDF using pdfplumber only (no OCR).
+
+    The cleaned text is cached by the file's SHA-256, so uploading the same
+    document again skips extraction. workers is passed to iter_page_texts.
+    """
     logger.info(f"🔍 Starting PDF text extraction: {pdf_path}")
 
+    cache_path = pdf_text_cache_path(pdf_path, cache_dir)
+    if os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            extracted_text = f.read()
+        logger.info(f"📦 Using cached text ({len(extracted_text)} characters)")
+        return extracted_text
+
+    pages = []
+    empty_pages = 0
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            logger.info(f"📄 Found {len(pdf.pages)} pages in PDF")
-            for i, page in enumerate(pdf.pages, start=1):
-                text = page.extract_text()
-                if text:
-                    logger.info(f"✅ Page {i}: extracted {len(text)} characters")
-                    extracted_text += text + "\n"
-                else:
-                    logger.warning(f"⚠️ Page {i}: no text found")
+        for text in iter_page_texts(pdf_path, workers):
+            text = clean_page_text(text)
+            if text:
+                pages.append(text)
+            else:
+                empty_pages += 1
     except Exception as e:
         logger.error(f"❌ pdfplumber failed: {e}")
         return ""
 
-    # Clean text
-    extracted_text = re.sub(r'\s+', ' ', extracted_text)
-    extracted_text = re.sub(r'[^\w\s.?]', ' ', extracted_text)
+    if empty_pages:
+        logger.warning(f"⚠️ {empty_pages} pages without text")
+    extracted_text = " ".join(pages).strip()
 
     logger.info(f"📊 Total text length: {len(extracted_text)} characters")
     if len(extracted_text) < 20:
         logger.warning("⚠️ Very little text was extracted. The PDF may be scanned (image-only).")
+        return extracted_text
 
-    return extracted_text.strip()
+    # Write to a temporary name so a concurrent upload never reads a partial file
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(extracted_text)
+        os.replace(tmp_path, cache_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return extracted_text
 
 
-def process_text_with_openai(full_text: str):
-    """Send extracted text to OpenAI for checklist generation."""
-    logger.info(f"🤖 Sending {len(full_text)} characters to OpenAI...")
+def build_checklist_messages(full_text: str):
+    """Chat messages asking the model to turn guideline text into a checklist."""
     prompt = f"""
 Convert the following safety guidelines text into a structured JSON safety audit checklist.
 
@@ -77,13 +188,19 @@ OUTPUT REQUIREMENTS:
   ]
 }}
 """
+    return [
+        {"role": "system", "content": "You are a safety audit expert. Convert safety guidelines into structured audit checklists. Return ONLY JSON."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def process_text_with_openai(full_text: str):
+    """Send extracted text to OpenAI for checklist generation."""
+    logger.info(f"🤖 Sending {len(full_text)} characters to OpenAI...")
     try:
-        response = client.chat.completions.create(
+        response = get_client().chat.completions.create(
             model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a safety audit expert. Convert safety guidelines into structured audit checklists. Return ONLY JSON."},
-                {"role": "user", "content": prompt}
-            ],
+            messages=build_checklist_messages(full_text),
             temperature=0.1,
             response_format={"type": "json_object"}
         )
@@ -101,3 +218,46 @@ def parse_audit_pdf_openai(pdf_path: str):
         logger.error("❌ No text could be extracted from PDF")
         return None
     return process_text_with_openai(full_text)
+
+
+async def process_text_with_openai_async(full_text: str):
+    """Async variant of process_text_with_openai with request timeout and retries."""
+    logger.info(f"🤖 Sending {len(full_text)} characters to OpenAI (async)...")
+    try:
+        response = await get_async_client().chat.completions.create(
+            model="gpt-4o-mini",
+            messages=build_checklist_messages(full_text),
+            temperature=0.1,
+            response_format={"type": "json_object"}
+        )
+        result = response.choices[0].message.content
+        logger.info(f"✅ Received OpenAI response ({len(result)} characters)")
+        return json.loads(result)
+    except Exception as e:
+        logger.error(f"❌ OpenAI processing failed: {e}")
+        return None
+
+
+async def parse_audit_pdf_openai_async(pdf_path: str, progress=None):
+    """Extract text off the event loop, then build the checklist with the async client.
+
+    progress is an optional coroutine function called with a status message
+    before each stage.
+    """
+    async def report(message):
+        if progress is not None:
+            try:
+                await progress(message)
+            except Exception as e:
+                logger.warning(f"⚠️ Progress update failed: {e}")
+
+    await report("📄 Extracting text from the document...")
+    # A thread of the IO pool drives the extraction; iter_page_texts starts its own page-range
+    # processes, so running it in the CPU pool would hold a report-rendering slot as well
+    full_text = await io_pool.run(extract_text_from_pdf, pdf_path)
+    if not full_text:
+        logger.error("❌ No text could be extracted from PDF")
+        return None
+
+    await report(f"🤖 Extracted {len(full_text)} characters. Generating checklist with OpenAI...")
+    return await process_text_with_openai_async(full_text)
@@ -0,0 +1,111 @@
+# utils/compiled_template.py
+import hashlib
+import json
+from typing import Dict, NamedTuple, Optional, Tuple
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+
+class CompiledQuestion(NamedTuple):
+    index: int
+    category_index: int
+    category: str
+    keyword: str
+    question_en: str
+    question_ru: str
+    options: Tuple[str, ...]
+    text: str  # message text shown to the auditor
+
+
+class CategoryBounds(NamedTuple):
+    name: str
+    start: int  # index of the first question
+    end: int    # index one past the last question
+
+
+def template_version(template: Dict) -> str:
+    """Short content hash identifying a template's exact questions and options."""
+    canonical = json.dumps(template, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:12]
+
+
+def build_question_keyboard(question, selected_answer, current_index, total_questions):
+    option_buttons = [
+        InlineKeyboardButton(
+            f"{'✅ ' if opt == selected_answer else ''}{opt}",
+            callback_data=f"answer:{opt}"
+        ) for opt in question["options"]
+    ]
+
+    nav_buttons = []
+    if current_index > 0:
+        nav_buttons.append(InlineKeyboardButton("⬅️ Previous", callback_data="nav:prev"))
+
+    if current_index < total_questions - 1:
+        if selected_answer:
+            nav_buttons.append(InlineKeyboardButton("➡️ Next", callback_data="nav:next"))
+    else:
+        # Always show the generate button on the last question
+        if selected_answer:
+            nav_buttons.append(InlineKeyboardButton("Generate Report", callback_data="generate"))
+
+
+    return InlineKeyboardMarkup([
+        option_buttons,
+        nav_buttons
+    ])
+
+
+class CompiledTemplate:
+    """Immutable, flattened form of a template for O(1) question navigation.
+
+    Holds one CompiledQuestion per question in audit order, the question
+    range of each category and, per question, a keyboard for every possible
+    selected answer (None meaning unanswered). The source template dict is
+    kept for persistence and report rendering.
+    """
+
+    __slots__ = ("template", "name", "version", "questions", "categories", "_keyboards")
+
+    def __init__(self, template: Dict):
+        self.template = template
+        self.name = template.get("template_name", "Unknown Template")
+        self.version = template_version(template)
+
+        flat = []
+        categories = []
+        for category_index, cat in enumerate(template["categories"]):
+            start = len(flat)
+            for q in cat["questions"]:
+                flat.append((category_index, cat["name"], q))
+            categories.append(CategoryBounds(cat["name"], start, len(flat)))
+
+        total = len(flat)
+        questions = []
+        keyboards = []
+        for index, (category_index, category, q) in enumerate(flat):
+            questions.append(CompiledQuestion(
+                index=index,
+                category_index=category_index,
+                category=category,
+                keyword=q["keyword"],
+                question_en=q["question_en"],
+                question_ru=q["question_ru"],
+                options=tuple(q["options"]),
+                text=f"Q{index + 1} of {total}: {q['question_en']}\n\n {q['question_ru']}"
+            ))
+            keyboards.append({
+                answer: build_question_keyboard(q, answer, index, total)
+                for answer in (None, *q["options"])
+            })
+
+        self.questions = tuple(questions)
+        self.categories = tuple(categories)
+        self._keyboards = tuple(keyboards)
+
+    def __len__(self):
+        return len(self.questions)
+
+    def keyboard(self, index: int, selected_answer: Optional[str]) -> InlineKeyboardMarkup:
+        """Prebuilt keyboard for a question with the given answer selected."""
+        keyboards = self._keyboards[index]
+        return keyboards.get(selected_answer, keyboards[None])
@@ -9,92 +9,279 @@ from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from datetime import datetime
 import os
+from utils.compiled_template import template_version
 
-# Register a Unicode font that supports Cyrillic (DejaVuSans is commonly used)
+# Unicode font that supports Cyrillic (DejaVuSans is commonly used); registered on first render
 FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
 
-if not os.path.exists(FONT_PATH):
-    raise FileNotFoundError("DejaVuSans.ttf not found. Please add it to a 'fonts' folder.")
+# Rendered reports, one file per (template version, audit id, audit timestamp); audits never
+# change once saved, and the timestamp keeps a recreated database's reused ids from hitting old files
+REPORT_CACHE_DIR = os.path.join("exports", "reports")
 
-pdfmetrics.registerFont(TTFont("DejaVuSans", FONT_PATH))
+TABLE_HEADER = ["#", "Category", "Question", "Response"]
+COLUMN_WIDTHS = [1.2*cm, 8*cm, 25*cm, 4*cm]
+
+# Per-category layout: the category is the title row of its table, so its column is folded into the question
+CATEGORY_TABLE_HEADER = ["#", "Question", "Response"]
+CATEGORY_COLUMN_WIDTHS = [1.2*cm, 33*cm, 4*cm]
+
+# Templates with more questions than this are rendered one table per category;
+# the single spanned table cannot break a category across pages and its layout
+# cost grows quickly with the row count
+CATEGORY_LAYOUT_THRESHOLD = 150
+
+# Longest table emitted in the per-category layout; longer categories are split
+CATEGORY_CHUNK_ROWS = 100
+
+ANSWER_COLORS = {"Yes": colors.green, "No": colors.red}
+
+BASE_TABLE_STYLE = [
+    ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+    ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
+    ("ALIGN", (0, 0), (-1, -1), "LEFT"),
+    ("FONTNAME", (0, 0), (-1, -1), "DejaVuSans"),
+    ("FONTSIZE", (0, 0), (-1, -1), 10),
+    ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
+    ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+]
+
+# Row 0 is the category title spanning the table, row 1 the column header; both repeat on every page
+CATEGORY_TABLE_STYLE = [
+    ("SPAN", (0, 0), (-1, 0)),
+    ("FONTSIZE", (0, 0), (-1, 0), 12),
+    ("BOTTOMPADDING", (0, 0), (-1, 0), 6),
+    ("BACKGROUND", (0, 1), (-1, 1), colors.lightgrey),
+    ("TEXTCOLOR", (0, 1), (-1, 1), colors.black),
+    ("ALIGN", (0, 0), (-1, -1), "LEFT"),
+    ("FONTNAME", (0, 0), (-1, -1), "DejaVuSans"),
+    ("FONTSIZE", (0, 1), (-1, -1), 10),
+    ("BOTTOMPADDING", (0, 1), (-1, 1), 8),
+    ("GRID", (0, 1), (-1, -1), 0.5, colors.grey),
+]
+
+# Paragraph styles, built on first render and shared by every report in the process
+_styles = {}
+
+# Static table rows and style commands per template version
+_layout_cache = {}
+_category_layout_cache = {}
+
+
+def register_fonts():
+    if "DejaVuSans" in pdfmetrics.getRegisteredFontNames():
+        return
+    if not os.path.exists(FONT_PATH):
+        raise FileNotFoundError("DejaVuSans.ttf not found. Please add it to a 'fonts' folder.")
+    pdfmetrics.registerFont(TTFont("DejaVuSans", FONT_PATH))
+
+
+def get_styles():
+    if not _styles:
+        register_fonts()
+        base_styles = getSampleStyleSheet()
+        _styles["body"] = ParagraphStyle(name='Cyrillic',
+                                         fontName='DejaVuSans',
+                                         fontSize=12,
+                                         leading=15)
+        _styles["title"] = ParagraphStyle(name='CyrillicTitle',
+                                          parent=base_styles['Title'],
+                                          fontName='DejaVuSans',
+                                          fontSize=20,
+                                          spaceAfter=12)
+    return _styles
+
+
+def get_template_layout(template: dict, version: str = None):
+    """(rows, style commands) for a template, without the answers.
+
+    Rows are [number, category, question] in audit order; the category cell
+    is only filled on the first row of each category and spans the rest.
+    """
+    version = version or template_version(template)
+    layout = _layout_cache.get(version)
+    if layout is not None:
+        return layout
+
+    rows = []
+    table_style = list(BASE_TABLE_STYLE)
+    for category in template["categories"]:
+        first_row = len(rows) + 1
+        for i, q in enumerate(category["questions"]):
+            rows.append([str(len(rows) + 1), category["name"] if i == 0 else "", q["question_en"]])
+        last_row = len(rows)
+        if last_row >= first_row:
+            table_style.append(("SPAN", (1, first_row), (1, last_row)))
+            table_style.append(("VALIGN", (1, first_row), (1, last_row), "MIDDLE"))
+
+    layout = (rows, table_style)
+    _layout_cache[version] = layout
+    return layout
+
+
+def get_category_layout(template: dict, version: str = None):
+    """[(category, first question index, rows), ...] with at most CATEGORY_CHUNK_ROWS rows each.
+
+    Rows are [number, question]; a category longer than the chunk size
+    appears as several consecutive chunks.
+    """
+    version = version or template_version(template)
+    layout = _category_layout_cache.get(version)
+    if layout is not None:
+        return layout
+
+    layout = []
+    question_index = 0
+    for category in template["categories"]:
+        questions = category["questions"]
+        for start in range(0, len(questions), CATEGORY_CHUNK_ROWS):
+            chunk = questions[start:start + CATEGORY_CHUNK_ROWS]
+            rows = [[str(question_index + i + 1), q["question_en"]] for i, q in enumerate(chunk)]
+            layout.append((category["name"], question_index, rows))
+            question_index += len(chunk)
+
+    _category_layout_cache[version] = layout
+    return layout
 
-def generate_pdf(username: str, template: dict, responses: list, site_id: str = "Unknown", timestamp: str = None, output_dir: str = "exports") -> str:
-    os.makedirs(output_dir, exist_ok=True)
-    if not timestamp:
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    filename = f"audit_{username.replace(' ', '_')}_{site_id}_{timestamp}.pdf"
-    file_path = os.path.join(output_dir, filename)
+
+def answer_color_commands(answers: list, first_row: int = 1, column: int = 3):
+    """TEXTCOLOR commands for the response column, one per run of equally coloured answers."""
+    commands = []
+    run_start = first_row
+    run_color = None
+    for row, answer in enumerate(answers, start=first_row):
+        color = ANSWER_COLORS.get(answer, colors.grey)
+        if color is not run_color:
+            if run_color is not None:
+                commands.append(("TEXTCOLOR", (column, run_start), (column, row - 1), run_color))
+            run_start, run_color = row, color
+    if run_color is not None:
+        commands.append(("TEXTCOLOR", (column, run_start), (column, first_row + len(answers) - 1), run_color))
+    return commands
+
+
+def _single_table(template, answers, version):
+    rows, static_style = get_template_layout(template, version)
+    data = [TABLE_HEADER] + [row + [answer] for row, answer in zip(rows, answers)]
+    table = Table(data, colWidths=COLUMN_WIDTHS)
+    table.setStyle(TableStyle(static_style + answer_color_commands(answers)))
+    yield table
+
+
+def _category_tables(template, answers, version):
+    """One table per category chunk, created as the document consumes them."""
+    for category, first_index, rows in get_category_layout(template, version):
+        chunk_answers = answers[first_index:first_index + len(rows)]
+        data = [[category, "", ""], CATEGORY_TABLE_HEADER] + [row + [answer] for row, answer in zip(rows, chunk_answers)]
+        table = Table(data, colWidths=CATEGORY_COLUMN_WIDTHS, repeatRows=2, spaceBefore=0.4*cm)
+        table.setStyle(TableStyle(CATEGORY_TABLE_STYLE + answer_color_commands(chunk_answers, first_row=2, column=2)))
+        yield table
+
+
+class FlowableStream(list):
+    """Story list for doc.build that pulls flowables from an iterator as they are consumed.
+
+    doc.build deletes flowables from the front of the list as it places them,
+    so only a few pending flowables (plus the page being laid out) exist at once.
+    """
+
+    LOOKAHEAD = 2
+
+    def __init__(self, head, source):
+        super().__init__(head)
+        self._source = iter(source)
+        self._fill()
+
+    def _fill(self):
+        while self._source is not None and len(self) < self.LOOKAHEAD:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._source = None
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._fill()
+
+
+def build_report(file_path: str, username: str, template: dict, responses: list, site_id: str, timestamp: str,
+                 version: str = None, layout: str = "auto"):
+    """Render a report to file_path.
+
+    layout is "single" (one table, categories as spanned cells), "categories"
+    (a table per category with a repeating header) or "auto", which picks
+    "categories" for templates above CATEGORY_LAYOUT_THRESHOLD questions.
+    """
+    styles = get_styles()
+    question_count = sum(len(category["questions"]) for category in template["categories"])
+    if layout == "auto":
+        layout = "categories" if question_count > CATEGORY_LAYOUT_THRESHOLD else "single"
 
     doc = SimpleDocTemplate(file_path, pagesize=landscape(A3),
                             rightMargin=2*cm, leftMargin=2*cm,
                             topMargin=2*cm, bottomMargin=2*cm)
 
-    # Styles
-    base_styles = getSampleStyleSheet()
-    base_styles.add(ParagraphStyle(name='Cyrillic',
-                                    fontName='DejaVuSans',
-                                    fontSize=12,
-                                    leading=15))
-    title_style = ParagraphStyle(name='CyrillicTitle',
-                                 parent=base_styles['Title'],
-                                 fontName='DejaVuSans',
-                                 fontSize=20,
-                                 spaceAfter=12)
-
     elements = []
 
     # Header
-    elements.append(Paragraph("Site Risk Assessment Report", title_style))
+    elements.append(Paragraph("Site Risk Assessment Report", styles["title"]))
     elements.append(Spacer(1, 0.5*cm))
-    elements.append(Paragraph(f"<b>Assessor:</b> Eng. {username}", base_styles['Cyrillic']))
-    elements.append(Paragraph(f"<b>Site ID:</b> {site_id}", base_styles['Cyrillic']))
-    elements.append(Paragraph(f"<b>Date:</b> {timestamp}", base_styles['Cyrillic']))
+    elements.append(Paragraph(f"<b>Assessor:</b> Eng. {username}", styles["body"]))
+    elements.append(Paragraph(f"<b>Site ID:</b> {site_id}", styles["body"]))
+    elements.append(Paragraph(f"<b>Date:</b> {timestamp}", styles["body"]))
     elements.append(Spacer(1, 0.7*cm))
 
-    # Table headers with row number
-    data = [["#", "Category", "Question", "Response"]]
-    table_style = [
-        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-        ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-        ("ALIGN", (0, 0), (-1, -1), "LEFT"),
-        ("FONTNAME", (0, 0), (-1, -1), "DejaVuSans"),
-        ("FONTSIZE", (0, 0), (-1, -1), 10),
-        ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
-        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-    ]
-
-    row_idx = 1
-    question_counter = 1
+    answers = [responses[i] if i < len(responses) else "N/A" for i in range(question_count)]
+    tables = _category_tables if layout == "categories" else _single_table
 
-    for category in template["categories"]:
-        questions = category["questions"]
-        rowspan = len(questions)
+    doc.build(FlowableStream(elements, tables(template, answers, version)))
+    return file_path
 
-        for i, q in enumerate(questions):
-            response_index = question_counter - 1
-            answer = responses[response_index] if response_index < len(responses) else "N/A"
 
-            text_color = (
-                colors.green if answer == "Yes"
-                else colors.red if answer == "No"
-                else colors.grey
-            )
+def generate_pdf(username: str, template: dict, responses: list, site_id: str = "Unknown", timestamp: str = None, output_dir: str = "exports") -> str:
+    os.makedirs(output_dir, exist_ok=True)
+    if not timestamp:
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    filename = f"audit_{username.replace(' ', '_')}_{site_id}_{timestamp}.pdf"
+    file_path = os.path.join(output_dir, filename)
+    return build_report(file_path, username, template, responses, site_id, timestamp)
+
+
+def report_cache_path(audit_id: int, version: str, timestamp: str, cache_dir: str = REPORT_CACHE_DIR) -> str:
+    # Legacy and dummy versions look like "legacy:<title>"; keep them usable as directory names
+    directory = version.replace(":", "_").replace("/", "_")
+    stamp = str(timestamp).replace(" ", "_").replace(":", "-")
+    return os.path.join(cache_dir, directory, f"audit_{audit_id}_{stamp}.pdf")
+
 
-            if i == 0:
-                data.append([str(question_counter), category["name"], q["question_en"], answer])
-                table_style.append(("SPAN", (1, row_idx), (1, row_idx + rowspan - 1)))
-                table_style.append(("VALIGN", (1, row_idx), (1, row_idx + rowspan - 1), "MIDDLE"))
-            else:
-                data.append([str(question_counter), "", q["question_en"], answer])
+def get_cached_report(audit_id: int, version: str, timestamp: str, cache_dir: str = REPORT_CACHE_DIR):
+    """Path of an already rendered report, or None."""
+    path = report_cache_path(audit_id, version, timestamp, cache_dir)
+    return path if os.path.exists(path) else None
 
-            table_style.append(("TEXTCOLOR", (3, row_idx), (3, row_idx), text_color))
 
-            row_idx += 1
-            question_counter += 1
+def render_report(audit_id: int, username: str, template: dict, responses: list, site_id: str = "Unknown",
+                  timestamp: str = None, version: str = None, cache_dir: str = REPORT_CACHE_DIR,
+                  overwrite: bool = False) -> str:
+    """Render a saved audit's report into the report cache, or return the cached file.
+
+    overwrite renders even if the file exists, for a report that must reflect
+    the audit just saved.
+    """
+    version = version or template_version(template)
+    if not timestamp:
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    file_path = report_cache_path(audit_id, version, timestamp, cache_dir)
+    if not overwrite and os.path.exists(file_path):
+        return file_path
 
-    table = Table(data, colWidths=[1.2*cm, 8*cm, 25*cm, 4*cm])
-    table.setStyle(TableStyle(table_style))
-    elements.append(table)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
 
-    doc.build(elements)
+    # Render to a temporary name so a concurrent reader never sees a partial file
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    try:
+        build_report(tmp_path, username, template, responses, site_id, timestamp, version)
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
     return file_path
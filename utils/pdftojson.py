@@ -3,12 +3,16 @@ import json
 import os
 import unicodedata
 import pdfplumber
-from pdf2image import convert_from_path
-import pytesseract
-from keybert import KeyBERT
 
-# --- Initialize KeyBERT (unsupervised keyword extractor) ---
-kw_model = KeyBERT()
+# --- KeyBERT (unsupervised keyword extractor), loaded on first use: the model takes seconds to load ---
+_kw_model = None
+
+def get_kw_model():
+    global _kw_model
+    if _kw_model is None:
+        from keybert import KeyBERT
+        _kw_model = KeyBERT()
+    return _kw_model
 
 # --- Helpers ---
 def slugify(text: str) -> str:
@@ -28,7 +32,7 @@ def normalize_answer(ans: str) -> str:
 def extract_keyword(question: str) -> str:
     """Use KeyBERT to extract 1-2 word keyword from the question."""
     try:
-        keywords = kw_model.extract_keywords(
+        keywords = get_kw_model().extract_keywords(
             question, 
             keyphrase_ngram_range=(1, 2), 
             stop_words='english',
@@ -71,6 +75,8 @@ def parse_audit_pdf(pdf_path: str):
     # If nothing useful → OCR
     if not checklist:
         print("[!] No text found. Running OCR...")
+        from pdf2image import convert_from_path
+        import pytesseract
         images = convert_from_path(pdf_path)
         for img in images:
             text = pytesseract.image_to_string(img)
@@ -0,0 +1,134 @@
+# utils/session_store.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+# Abandoned audits are dropped after this many seconds without activity
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(24 * 3600)))
+
+# "sqlite" keeps in-flight audits across restarts, "memory" does not
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite")
+SESSION_DB_PATH = os.path.join(os.path.dirname(__file__), "../database/audit_sessions.db")
+
+# Answers are stored as one byte per question: 0 = unanswered, i + 1 = options[i]
+ANSWERS_KEY = "answers"
+
+
+def encode_answer(options, answer) -> int:
+    return options.index(answer) + 1 if answer in options else 0
+
+
+def get_answer(state: Dict, compiled, index: int) -> Optional[str]:
+    code = state[ANSWERS_KEY][index]
+    return compiled.questions[index].options[code - 1] if code else None
+
+
+def set_answer(state: Dict, compiled, index: int, answer: str):
+    state[ANSWERS_KEY][index] = encode_answer(compiled.questions[index].options, answer)
+
+
+def decode_answers(state: Dict, compiled) -> list:
+    """Answer strings up to the last answered question (None for gaps)."""
+    answers = [get_answer(state, compiled, i) for i in range(len(compiled))]
+    while answers and answers[-1] is None:
+        answers.pop()
+    return answers
+
+
+class InMemorySessionStore:
+    """Audit sessions in a dict; lost on restart."""
+
+    def __init__(self, ttl: int = SESSION_TTL):
+        self.ttl = ttl
+        self._sessions = {}
+
+    def get(self, user_id: int) -> Optional[Dict]:
+        item = self._sessions.get(user_id)
+        if item is None:
+            return None
+        state, updated_at = item
+        if time.time() - updated_at > self.ttl:
+            del self._sessions[user_id]
+            return None
+        return state
+
+    def save(self, user_id: int, state: Dict):
+        self._sessions[user_id] = (state, time.time())
+
+    def delete(self, user_id: int):
+        self._sessions.pop(user_id, None)
+
+    def evict_expired(self) -> int:
+        cutoff = time.time() - self.ttl
+        expired = [uid for uid, (_, updated_at) in self._sessions.items() if updated_at < cutoff]
+        for uid in expired:
+            del self._sessions[uid]
+        return len(expired)
+
+
+class SQLiteSessionStore:
+    """Audit sessions in a SQLite table so in-flight audits survive a restart.
+
+    Scalar fields are stored as JSON and the answer codes as a BLOB.
+    """
+
+    def __init__(self, path: str = SESSION_DB_PATH, ttl: int = SESSION_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS audit_sessions (
+                user_id INTEGER PRIMARY KEY,
+                data TEXT NOT NULL,
+                answers BLOB,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_audit_sessions_updated_at ON audit_sessions (updated_at)")
+
+    def get(self, user_id: int) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, answers, updated_at FROM audit_sessions WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        data, answers, updated_at = row
+        if time.time() - updated_at > self.ttl:
+            self.delete(user_id)
+            return None
+        state = json.loads(data)
+        if answers is not None:
+            state[ANSWERS_KEY] = bytearray(answers)
+        return state
+
+    def save(self, user_id: int, state: Dict):
+        data = {k: v for k, v in state.items() if k != ANSWERS_KEY}
+        answers = state.get(ANSWERS_KEY)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO audit_sessions (user_id, data, answers, updated_at) VALUES (?, ?, ?, ?)",
+                (user_id, json.dumps(data), bytes(answers) if answers is not None else None, time.time())
+            )
+
+    def delete(self, user_id: int):
+        with self._lock:
+            self._conn.execute("DELETE FROM audit_sessions WHERE user_id = ?", (user_id,))
+
+    def evict_expired(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM audit_sessions WHERE updated_at < ?", (time.time() - self.ttl,)
+            )
+        return cursor.rowcount
+
+
+def create_session_store():
+    if SESSION_BACKEND == "memory":
+        return InMemorySessionStore()
+    return SQLiteSessionStore()
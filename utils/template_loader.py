@@ -2,20 +2,27 @@
 
 import json
 import os
-from .template_manager import get_active_template, initialize_default_template
+from .template_manager import get_active_template, get_active_compiled_template, initialize_default_template
 
 def load_template():
     """Load the currently active template."""
 
-    # Initialize default template if none is active
-    initialize_default_template()
-
     template = get_active_template()
+    if template is None:
+        # Initialize default template if none is active
+        initialize_default_template()
+        template = get_active_template()
+
     if template is None:
         raise FileNotFoundError("No active template found. Please contact an administrator.")
 
     return template
 
+def load_compiled_template():
+    """Load the compiled form of the currently active template."""
+    load_template()
+    return get_active_compiled_template()
+
 def load_keywords_from_template(json_path='template1_full_bilingual.json'):
     with open(json_path, 'r', encoding='utf-8') as f:
         data = json.load(f)
@@ -2,57 +2,150 @@
 import os
 import json
 from typing import List, Dict, Optional
+from .compiled_template import CompiledTemplate
 
 TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "../templates")
 ACTIVE_TEMPLATE_FILE = os.path.join(os.path.dirname(__file__), "../templates/active_template.json")
 
+# Parsed template files keyed by path: ((mtime_ns, size), entry)
+_template_cache: Dict[str, tuple] = {}
+
+# Active template filename keyed by the stamp of ACTIVE_TEMPLATE_FILE
+_active_cache: Dict = {"stamp": None, "filename": None}
+
+# Compiled templates by version, so audit sessions can reference them by id
+_compiled_by_version: Dict[str, CompiledTemplate] = {}
+
+def _file_stamp(path: str) -> tuple:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+def _load_template_file(filepath: str) -> Optional[Dict]:
+    """Parse a template file once and reuse it until its mtime or size changes.
+
+    Returns {'data', 'categories_count', 'questions_count', 'compiled'}; the
+    parsed data is shared between callers and must not be mutated.
+    """
+    try:
+        stamp = _file_stamp(filepath)
+    except FileNotFoundError:
+        _template_cache.pop(filepath, None)
+        return None
+
+    cached = _template_cache.get(filepath)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    with open(filepath, 'r', encoding='utf-8') as f:
+        template_data = json.load(f)
+
+    categories = template_data.get('categories', [])
+    entry = {
+        'data': template_data,
+        'categories_count': len(categories),
+        'questions_count': sum(len(cat.get('questions', [])) for cat in categories),
+        'compiled': None,  # built on first use by get_active_compiled_template
+    }
+    _template_cache[filepath] = (stamp, entry)
+    return entry
+
+def _build_info(filename: str, filepath: str, entry: Dict) -> Dict:
+    return {
+        'filename': filename,
+        'name': entry['data'].get('template_name', filename),
+        'categories_count': entry['categories_count'],
+        'questions_count': entry['questions_count'],
+        'filepath': filepath
+    }
+
 def get_available_templates() -> List[Dict]:
     """Get list of all available templates with metadata."""
     templates = []
     if not os.path.exists(TEMPLATES_DIR):
         return templates
 
-    for filename in os.listdir(TEMPLATES_DIR):
-        if filename.endswith('.json') and not filename.startswith('active_template'):
-            filepath = os.path.join(TEMPLATES_DIR, filename)
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    template_data = json.load(f)
-
-                # Extract basic info
-                template_info = {
-                    'filename': filename,
-                    'name': template_data.get('template_name', filename),
-                    'categories_count': len(template_data.get('categories', [])),
-                    'questions_count': sum(len(cat.get('questions', []))
-                                         for cat in template_data.get('categories', [])),
-                    'filepath': filepath
-                }
-                templates.append(template_info)
-            except (json.JSONDecodeError, KeyError):
-                # Skip invalid template files
-                continue
+    filenames = [f for f in os.listdir(TEMPLATES_DIR)
+                 if f.endswith('.json') and not f.startswith('active_template')]
+
+    # Forget templates that were removed from disk
+    present = {os.path.join(TEMPLATES_DIR, f) for f in filenames}
+    for stale in set(_template_cache) - present:
+        del _template_cache[stale]
+
+    for filename in filenames:
+        filepath = os.path.join(TEMPLATES_DIR, filename)
+        try:
+            entry = _load_template_file(filepath)
+        except (json.JSONDecodeError, KeyError, AttributeError):
+            # Skip invalid template files
+            continue
+        if entry:
+            templates.append(_build_info(filename, filepath, entry))
 
     return templates
 
+def get_active_template_filename() -> Optional[str]:
+    """Filename of the active template, re-read only when the config file changes."""
+    try:
+        stamp = _file_stamp(ACTIVE_TEMPLATE_FILE)
+    except FileNotFoundError:
+        return None
+
+    if _active_cache["stamp"] != stamp:
+        try:
+            with open(ACTIVE_TEMPLATE_FILE, 'r', encoding='utf-8') as f:
+                filename = json.load(f).get('active_template')
+        except (json.JSONDecodeError, AttributeError):
+            filename = None
+        _active_cache.update(stamp=stamp, filename=filename)
+
+    return _active_cache["filename"]
+
 def get_active_template() -> Optional[Dict]:
     """Get the currently active template."""
-    if not os.path.exists(ACTIVE_TEMPLATE_FILE):
+    template_filename = get_active_template_filename()
+    if not template_filename:
         return None
 
     try:
-        with open(ACTIVE_TEMPLATE_FILE, 'r', encoding='utf-8') as f:
-            active_data = json.load(f)
-            template_filename = active_data.get('active_template')
-
-            if template_filename:
-                template_path = os.path.join(TEMPLATES_DIR, template_filename)
-                if os.path.exists(template_path):
-                    with open(template_path, 'r', encoding='utf-8') as f:
-                        return json.load(f)
-    except (json.JSONDecodeError, KeyError, FileNotFoundError):
-        pass
+        entry = _load_template_file(os.path.join(TEMPLATES_DIR, template_filename))
+    except (json.JSONDecodeError, KeyError):
+        return None
 
+    return entry['data'] if entry else None
+
+def get_active_compiled_template() -> Optional[CompiledTemplate]:
+    """Compiled form of the active template, built once per parsed file."""
+    template_filename = get_active_template_filename()
+    if not template_filename:
+        return None
+
+    try:
+        entry = _load_template_file(os.path.join(TEMPLATES_DIR, template_filename))
+    except (json.JSONDecodeError, KeyError):
+        return None
+    if not entry:
+        return None
+
+    return _compile_entry(entry)
+
+def _compile_entry(entry: Dict) -> CompiledTemplate:
+    if entry['compiled'] is None:
+        entry['compiled'] = CompiledTemplate(entry['data'])
+        _compiled_by_version[entry['compiled'].version] = entry['compiled']
+    return entry['compiled']
+
+def get_compiled_template(version: str) -> Optional[CompiledTemplate]:
+    """Compiled template with the given version, or None if no template on disk matches."""
+    compiled = _compiled_by_version.get(version)
+    if compiled is not None:
+        return compiled
+
+    # e.g. after a restart: compile the templates on disk until one matches
+    for info in get_available_templates():
+        entry = _load_template_file(info['filepath'])
+        if entry and _compile_entry(entry).version == version:
+            return entry['compiled']
     return None
 
 def set_active_template(template_filename: str) -> bool:
@@ -73,6 +166,8 @@ def set_active_template(template_filename: str) -> bool:
     try:
         with open(ACTIVE_TEMPLATE_FILE, 'w', encoding='utf-8') as f:
             json.dump(active_config, f, indent=2)
+        # Explicit activation invalidates the cached filename even if the stamp looks unchanged
+        _active_cache.update(stamp=None, filename=None)
         return True
     except Exception:
         return False
@@ -83,24 +178,17 @@ def get_template_info(filename: str) -> Optional[Dict]:
         filename += '.json'
 
     filepath = os.path.join(TEMPLATES_DIR, filename)
-    if not os.path.exists(filepath):
-        return None
 
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            template_data = json.load(f)
-
-        return {
-            'filename': filename,
-            'name': template_data.get('template_name', filename),
-            'categories': template_data.get('categories', []),
-            'categories_count': len(template_data.get('categories', [])),
-            'questions_count': sum(len(cat.get('questions', []))
-                                 for cat in template_data.get('categories', [])),
-            'filepath': filepath
-        }
-    except (json.JSONDecodeError, KeyError):
+        entry = _load_template_file(filepath)
+    except (json.JSONDecodeError, KeyError, AttributeError):
         return None
+    if not entry:
+        return None
+
+    info = _build_info(filename, filepath, entry)
+    info['categories'] = entry['data'].get('categories', [])
+    return info
 
 def initialize_default_template():
     """Initialize with a default template if none is active."""
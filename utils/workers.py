@@ -0,0 +1,138 @@
+# utils/workers.py
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, BrokenExecutor
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+# Number of recent job latencies kept for percentile metrics
+LATENCY_WINDOW = 1000
+
+
+class WorkerPool:
+    """Runs blocking jobs in an executor so handlers never block the event loop.
+
+    At most max_queue jobs may be queued or running at once; further callers
+    wait asynchronously for a slot, which keeps memory bounded under bursts.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, use_processes: bool = False):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.use_processes = use_processes
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._restarts = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def _get_executor(self):
+        # Created on first use so importing the module does not fork processes
+        with self._lock:
+            if self._executor is None:
+                if self.use_processes:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix=f"safetyhub-{self.name}"
+                    )
+            return self._executor
+
+    def _discard_executor(self, executor):
+        # A crashed worker process breaks the whole ProcessPoolExecutor; drop it so the next job starts a fresh one
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self._restarts += 1
+        logger.warning(f"{self.name} worker pool is broken; starting a new one for the next job")
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) in the pool and return its result."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_queue)
+
+        submitted = time.perf_counter()
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+
+        self._running += 1
+        executor = self._get_executor()
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+            self._completed += 1
+            return result
+        except BrokenExecutor:
+            self._failed += 1
+            self._discard_executor(executor)
+            raise
+        except Exception:
+            self._failed += 1
+            raise
+        finally:
+            self._running -= 1
+            self._slots.release()
+            self._latencies.append(time.perf_counter() - submitted)
+
+    def metrics(self) -> Dict:
+        """Queue depth, throughput counters and job latency percentiles (seconds)."""
+        latencies = sorted(self._latencies)
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        return {
+            "name": self.name,
+            "queue_depth": self._waiting + max(0, self._running - self.max_workers),
+            "running": min(self._running, self.max_workers),
+            "completed": self._completed,
+            "failed": self._failed,
+            "restarts": self._restarts,
+            "latency_p50": percentile(0.50),
+            "latency_p99": percentile(0.99),
+        }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+CPU_COUNT = os.cpu_count() or 1
+
+# Database writes: short, IO-bound jobs
+io_pool = WorkerPool("io", max_workers=4, max_queue=256)
+
+# PDF rendering: CPU-bound ReportLab builds, run in separate processes
+cpu_pool = WorkerPool("cpu", max_workers=max(1, CPU_COUNT - 1), max_queue=64, use_processes=True)
+
+
+def get_worker_metrics():
+    return [io_pool.metrics(), cpu_pool.metrics()]
+
+
+async def shutdown_workers(application=None):
+    """Application post_shutdown hook: wait for in-flight jobs and stop the pools."""
+    for pool in (io_pool, cpu_pool):
+        logger.info(f"Stopping {pool.name} worker pool: {pool.metrics()}")
+        pool.shutdown()